@@ -7,6 +7,8 @@ import { useProviderStatus } from './hooks/useProviderStatus';
 import { useCurrentUser } from './hooks/useCurrentUser';
 import { useRoomMembers } from './hooks/useRoomMembers';
 import { useRoomsContext } from './context/RoomsContext';
+import { useRoomEvents } from './hooks/useRoomEvents';
+import { useHubEvents } from './hooks/useHubEvents';
 import ChatRoomList from './ChatRoomList';
 import { ErrorToasts } from './components/ErrorToasts';
 import { ConnectionsPanel } from './components/ConnectionsPanel';
@@ -200,35 +202,64 @@ const ChatOpsConsoleStable = () => {
         }
     }, [activeView, refreshRooms]);
 
+    // Transform DB messages to UI format: {id, thread_id, user_id, sender, text, timestamp} → {id, role, authorTag, text, createdAt}
+    const toUiMessage = (msg) => ({
+        id: `msg-${msg.id}`,
+        role: msg.sender === 'CC' ? 'user' : 'assistant',
+        authorTag: msg.sender || 'TL',
+        text: msg.text,
+        createdAt: msg.timestamp,
+    });
+
+    // Move the read cursor for the room being viewed (bulk endpoint, one room here)
+    const markRoomRead = (roomId, messageId) => {
+        if (!roomId) return;
+        fetch('/api/rooms/read', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ rooms: [{ room_id: roomId, message_id: messageId ?? null }] }),
+        }).catch(err => console.warn('Failed to mark room read:', err));
+    };
+
+    const loadRoomMessages = async (roomId) => {
+        if (!roomId) return;
+        try {
+            const res = await fetch(`/api/rooms/${roomId}/messages?limit=50`);
+            if (!res.ok) throw new Error(`HTTP ${res.status}`);
+            const dbMessages = await res.json();
+            setMessages(dbMessages.map(toUiMessage));
+            if (dbMessages.length) markRoomRead(roomId, dbMessages[dbMessages.length - 1].id);
+        } catch (err) {
+            console.error('Failed to load room messages:', err);
+            pushError('Could not load room messages');
+        }
+    };
+
     // Load messages when active room changes
     useEffect(() => {
-        if (!activeRoomId) return;
-
-        const loadRoomMessages = async () => {
-            try {
-                const res = await fetch(`/api/rooms/${activeRoomId}/messages?limit=50`);
-                if (!res.ok) throw new Error(`HTTP ${res.status}`);
-                const dbMessages = await res.json();
-
-                // Transform DB messages to UI format: {id, thread_id, user_id, sender, text, timestamp} → {id, role, authorTag, text, createdAt}
-                const uiMessages = dbMessages.map(msg => ({
-                    id: `msg-${msg.id}`,
-                    role: msg.sender === 'CC' ? 'user' : 'assistant',
-                    authorTag: msg.sender || 'TL',
-                    text: msg.text,
-                    createdAt: msg.timestamp,
-                }));
-
-                setMessages(uiMessages);
-            } catch (err) {
-                console.error('Failed to load room messages:', err);
-                pushError('Could not load room messages');
-            }
-        };
-
-        loadRoomMessages();
+        loadRoomMessages(activeRoomId);
     }, [activeRoomId]);
 
+    // Give a locally-added message its server id; drop it if the live event already delivered it
+    const adoptServerId = (localId, serverId) => {
+        if (!serverId) return;
+        const id = `msg-${serverId}`;
+        setMessages(prev => prev.some(m => m.id === id)
+            ? prev.filter(m => m.id !== localId)
+            : prev.map(m => m.id === localId ? { ...m, id } : m));
+    };
+
+    // Live room events replace polling; after a reconnect, reload to catch up
+    useRoomEvents(activeRoomId, (evt) => {
+        if (evt.type === 'new_message') {
+            const incoming = toUiMessage(evt.data);
+            setMessages(prev => prev.some(m => m.id === incoming.id) ? prev : [...prev, incoming]);
+            markRoomRead(evt.room_id, evt.data.id);
+        } else if (['room_updated', 'member_added', 'member_removed', 'room_deleted'].includes(evt.type)) {
+            if (refreshRooms) refreshRooms();
+        }
+    }, () => loadRoomMessages(activeRoomId));
+
     // Resolve API base dynamically on mount then trigger initial fetches
     useEffect(() => {
         (async () => {
@@ -241,8 +272,24 @@ const ChatOpsConsoleStable = () => {
             refreshLogs();
         })();
     }, []);
+    // The user count follows presence events and the tailnet summary follows peer
+    // events; host metrics and logs change continuously and stay polled
+    useHubEvents(['presence_changed'], (evt) => {
+        if (typeof evt.data?.total === 'number') setUserCount(evt.data.total);
+    }, () => refreshUserCount());
+    // One network map can change several peers at once: refetch once per burst
+    const tailnetRefreshTimer = useRef(null);
+    const scheduleTailnetRefresh = () => {
+        if (tailnetRefreshTimer.current) return;
+        tailnetRefreshTimer.current = setTimeout(() => {
+            tailnetRefreshTimer.current = null;
+            refreshTailnetStats();
+        }, 500);
+    };
+    useEffect(() => () => clearTimeout(tailnetRefreshTimer.current), []);
+    useHubEvents(['peer_added', 'peer_removed', 'peer_online', 'peer_offline'], scheduleTailnetRefresh, scheduleTailnetRefresh);
     useEffect(() => {
-        const interval = setInterval(() => { refreshTailnetStats(); refreshSystemSummary(); refreshUserCount(); refreshLogs(); }, 30000);
+        const interval = setInterval(() => { refreshSystemSummary(); refreshLogs(); }, 30000);
         return () => clearInterval(interval);
     }, []);
 
@@ -343,7 +390,7 @@ const ChatOpsConsoleStable = () => {
         } catch (e) { setLogs([]); }
     };
 
-    const sendMessageToBackend = async (text) => {
+    const sendMessageToBackend = async (text, onDelta) => {
         let effectiveProvider = provider;
         if (provider === 'openai' && !openaiKey) effectiveProvider = 'ollama';
         let selectedModel = effectiveProvider === 'openai' ? openaiModel : ollamaModel;
@@ -353,11 +400,37 @@ const ChatOpsConsoleStable = () => {
             provider: effectiveProvider,
             temperature: temp,
             thread_id: activeRoomId, // Include room ID for persistence
-            config: effectiveProvider === 'openai' ? { api_key: openaiKey || undefined, model: selectedModel } : { base_url: ollamaUrl, model: selectedModel }
+            config: effectiveProvider === 'openai' ? { api_key: openaiKey || undefined, model: selectedModel } : { base_url: ollamaUrl, model: selectedModel },
+            stream: 'ndjson' // tokens arrive as they are generated; final line carries the full reply
         };
         const res = await fetch('/api/chat/chat', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload) });
         if (!res.ok) throw new Error(`HTTP ${res.status}`);
-        return res.json();
+        if (!res.body || !res.body.getReader) return res.json();
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let final = null;
+        const handleLine = (line) => {
+            if (!line.trim()) return;
+            const evt = JSON.parse(line);
+            if (evt.type === 'token') onDelta && onDelta(evt.delta);
+            else if (evt.type === 'done') final = evt;
+            else if (evt.type === 'error') throw new Error(evt.detail || `HTTP ${evt.status}`);
+        };
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let nl;
+            while ((nl = buffer.indexOf('\n')) >= 0) {
+                handleLine(buffer.slice(0, nl));
+                buffer = buffer.slice(nl + 1);
+            }
+        }
+        handleLine(buffer);
+        if (!final) throw new Error('Chat stream ended without a reply');
+        return final;
     };
 
     const handleSend = async () => {
@@ -401,12 +474,30 @@ const ChatOpsConsoleStable = () => {
                 body: JSON.stringify({ text })
             });
             if (!persistRes.ok) throw new Error(`Failed to persist user message: HTTP ${persistRes.status}`);
+            const persisted = await persistRes.json();
+            adoptServerId(userMsg.id, persisted.id);
 
             // Send to chat endpoint (assistant reply will be auto-persisted via thread_id)
-            const reply = await sendMessageToBackend(text);
+            // Show the reply as it streams in, then settle on the final text
+            const assistantId = crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`;
+            let started = false;
+            const onDelta = (delta) => {
+                if (!started) {
+                    started = true;
+                    setMessages(prev => [...prev, { id: assistantId, role: 'assistant', authorTag: 'TL', text: delta, createdAt: new Date().toISOString() }]);
+                } else {
+                    setMessages(prev => prev.map(m => m.id === assistantId ? { ...m, text: m.text + delta } : m));
+                }
+            };
+            const reply = await sendMessageToBackend(text, onDelta);
             const assistantText = getDisplayText(reply);
-            const assistantMsg = { id: crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`, role: 'assistant', authorTag: 'TL', text: assistantText, createdAt: new Date().toISOString() };
-            setMessages(prev => [...prev, assistantMsg]);
+            if (started) {
+                setMessages(prev => prev.map(m => m.id === assistantId ? { ...m, text: assistantText } : m));
+            } else {
+                const assistantMsg = { id: assistantId, role: 'assistant', authorTag: 'TL', text: assistantText, createdAt: new Date().toISOString() };
+                setMessages(prev => [...prev, assistantMsg]);
+            }
+            adoptServerId(assistantId, reply.message_id);
             setAiRequestCount(prev => {
                 const next = prev + 1; localStorage.setItem('theLocal.aiRequestCount', String(next)); return next;
             });
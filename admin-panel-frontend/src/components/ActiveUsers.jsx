@@ -1,4 +1,5 @@
 import React, { useState, useEffect } from 'react';
+import { useHubEvents } from '../hooks/useHubEvents';
 import { Users, Wifi, WifiOff, Smartphone, Monitor, Tablet, Shield, UserCog, User as UserIcon, Clock, Edit2, Save, X, RefreshCw } from 'lucide-react';
 
 const ActiveUsers = () => {
@@ -10,6 +11,8 @@ const ActiveUsers = () => {
     const [editingUser, setEditingUser] = useState(null);
     const [editForm, setEditForm] = useState({});
     const [currentUser, setCurrentUser] = useState(null);
+    // Re-renders the "last seen" labels every minute without refetching
+    const [, setClock] = useState(0);
 
     // Fetch current user to determine admin status
     const fetchCurrentUser = async () => {
@@ -63,17 +66,32 @@ const ActiveUsers = () => {
         fetchActiveUsers();
         sendHeartbeat(); // Initial heartbeat
 
-        // Refresh every 10 seconds
-        const refreshInterval = setInterval(fetchActiveUsers, 10000);
         // Send heartbeat every 30 seconds to stay online
         const heartbeatInterval = setInterval(sendHeartbeat, 30000);
 
         return () => {
-            clearInterval(refreshInterval);
             clearInterval(heartbeatInterval);
         };
     }, []);
 
+    useEffect(() => {
+        const clockInterval = setInterval(() => setClock(c => c + 1), 60000);
+        return () => clearInterval(clockInterval);
+    }, []);
+
+    // Same labels as the backend, from lastActive (UTC) so they stay current between fetches
+    const lastSeenLabel = (user) => {
+        if (!user.lastActive) return user.lastSeen;
+        const minutes = Math.floor((Date.now() - new Date(`${user.lastActive}Z`).getTime()) / 60000);
+        if (minutes < 1) return 'Just now';
+        if (minutes < 60) return `${minutes}m ago`;
+        if (minutes < 1440) return `${Math.floor(minutes / 60)}h ago`;
+        return `${Math.floor(minutes / 1440)}d ago`;
+    };
+
+    // The list only changes when someone comes online, goes offline or is added/removed
+    useHubEvents(['presence_changed'], () => fetchActiveUsers(), () => fetchActiveUsers());
+
     const startEdit = (user) => {
         setEditingUser(user.id);
         setEditForm({
@@ -322,7 +340,7 @@ const ActiveUsers = () => {
 
                                         <div className="flex items-center gap-2 text-xs justify-end">
                                             <Clock className="w-3.5 h-3.5 text-slate-500 shrink-0" />
-                                            <span className="text-slate-400">{user.lastSeen}</span>
+                                            <span className="text-slate-400">{lastSeenLabel(user)}</span>
                                         </div>
 
                                         <div className="col-span-2 flex items-center gap-2 mt-1">
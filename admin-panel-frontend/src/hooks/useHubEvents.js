@@ -0,0 +1,72 @@
+// admin-panel-frontend/src/hooks/useHubEvents.js
+import { useEffect, useRef } from 'react';
+
+/**
+ * Hub-wide events over the /ws hub (presence_changed, provider_status,
+ * peer_online, ...: messages without a room_id). Every component using this
+ * hook shares one socket, opened with the first listener and closed with the
+ * last. Calls onEvent({ type, data }) for the listed types; onReconnect fires
+ * after a reconnect so callers can refetch what they may have missed.
+ */
+const listeners = new Set();
+let socket = null;
+let retryDelay = 1000;
+let retryTimer = null;
+let hasConnected = false;
+
+function connect() {
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const ws = new WebSocket(`${protocol}://${window.location.host}/ws`);
+    socket = ws;
+
+    ws.onopen = () => {
+        retryDelay = 1000;
+        if (hasConnected) listeners.forEach(l => l.onReconnect && l.onReconnect());
+        hasConnected = true;
+    };
+    ws.onmessage = (evt) => {
+        let msg;
+        try { msg = JSON.parse(evt.data); } catch (_) { return; }
+        if (msg.room_id !== undefined || !msg.type) return;
+        listeners.forEach(l => { if (l.types.includes(msg.type)) l.onEvent(msg); });
+    };
+    ws.onclose = () => {
+        if (socket !== ws) return;
+        socket = null;
+        if (!listeners.size) return;
+        retryTimer = setTimeout(() => { retryTimer = null; connect(); }, retryDelay);
+        retryDelay = Math.min(retryDelay * 2, 30000);
+    };
+}
+
+export function useHubEvents(types, onEvent, onReconnect) {
+    const onEventRef = useRef(onEvent);
+    const onReconnectRef = useRef(onReconnect);
+    onEventRef.current = onEvent;
+    onReconnectRef.current = onReconnect;
+    const key = types.join(',');
+
+    useEffect(() => {
+        const listener = {
+            types: key.split(','),
+            onEvent: (msg) => onEventRef.current && onEventRef.current(msg),
+            onReconnect: () => onReconnectRef.current && onReconnectRef.current(),
+        };
+        listeners.add(listener);
+        if (!socket && !retryTimer) connect();
+        return () => {
+            listeners.delete(listener);
+            if (listeners.size) return;
+            clearTimeout(retryTimer);
+            retryTimer = null;
+            hasConnected = false;
+            if (socket) {
+                const ws = socket;
+                socket = null;
+                ws.close();
+            }
+        };
+    }, [key]);
+}
+
+export default useHubEvents;
@@ -1,6 +1,7 @@
 // Hook: useProviderStatus
-// Handles provider meta labeling/color and polling health endpoint.
-import { useEffect, useMemo } from 'react';
+// Handles provider meta labeling/color and the health endpoint.
+import { useCallback, useEffect, useMemo } from 'react';
+import { useHubEvents } from './useHubEvents';
 
 const getApiBase = () => {
     const hostname = window.location.hostname;
@@ -24,30 +25,27 @@ export function useProviderStatus({ provider, openaiKey, ollamaUrl, lastChatOk,
         }
     }, [provider, openaiKey, lastChatOk, ollamaStatus]);
 
-    // Poll health endpoint every 20s for lightweight status updates.
-    useEffect(() => {
-        let cancelled = false;
-        const poll = async () => {
-            try {
-                const res = await fetch(`${API_BASE}/api/chat/health?ollama_url=${encodeURIComponent(ollamaUrl)}`);
-                if (!res.ok) return;
-                const data = await res.json();
-                const openaiStatus = data.providerStatuses?.openai;
-                const ollamaStat = data.providerStatuses?.ollama;
-                if (cancelled) return;
-                if (openaiStatus === 'ok' && lastChatOk == null) setLastChatOk(true);
-                if (openaiStatus === 'key-missing') setLastChatOk(false);
-                if (ollamaStat === 'ok') setOllamaStatus('online');
-                else if (ollamaStat === 'offline') setOllamaStatus('offline');
-                else if (ollamaStat === 'error') setOllamaStatus(null);
-            } catch (_) {
-                // swallow temporary network errors
-            }
-        };
-        poll();
-        const id = setInterval(poll, 20000);
-        return () => { cancelled = true; clearInterval(id); };
+    // Health is read once, then again only when the backend reports a provider
+    // going up or down (provider_status over the hub) or after a reconnect.
+    const checkHealth = useCallback(async () => {
+        try {
+            const res = await fetch(`${API_BASE}/api/chat/health?ollama_url=${encodeURIComponent(ollamaUrl)}`);
+            if (!res.ok) return;
+            const data = await res.json();
+            const openaiStatus = data.providerStatuses?.openai;
+            const ollamaStat = data.providerStatuses?.ollama;
+            if (openaiStatus === 'ok' && lastChatOk == null) setLastChatOk(true);
+            if (openaiStatus === 'key-missing') setLastChatOk(false);
+            if (ollamaStat === 'ok') setOllamaStatus('online');
+            else if (ollamaStat === 'offline') setOllamaStatus('offline');
+            else if (ollamaStat === 'error') setOllamaStatus(null);
+        } catch (_) {
+            // swallow temporary network errors
+        }
     }, [ollamaUrl, lastChatOk, setLastChatOk, setOllamaStatus]);
 
+    useEffect(() => { checkHealth(); }, [ollamaUrl]);
+    useHubEvents(['provider_status'], checkHealth, checkHealth);
+
     return providerMeta;
 }
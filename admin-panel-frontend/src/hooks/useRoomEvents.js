@@ -0,0 +1,74 @@
+// admin-panel-frontend/src/hooks/useRoomEvents.js
+import { useEffect, useRef, useState } from 'react';
+
+/**
+ * Subscribe to real-time events for one room over the /ws hub.
+ * Calls onEvent({ type, room_id, data }) for new_message, member_added,
+ * room_updated and room_deleted. Reconnects with backoff and re-subscribes;
+ * onReconnect fires after a reconnect so callers can catch up on missed events.
+ */
+export function useRoomEvents(roomId, onEvent, onReconnect) {
+    const [connected, setConnected] = useState(false);
+    const socketRef = useRef(null);
+    const roomRef = useRef(roomId);
+    const onEventRef = useRef(onEvent);
+    const onReconnectRef = useRef(onReconnect);
+
+    onEventRef.current = onEvent;
+    onReconnectRef.current = onReconnect;
+
+    // One socket for the lifetime of the component
+    useEffect(() => {
+        let closed = false;
+        let retryDelay = 1000;
+        let retryTimer = null;
+        let hasConnected = false;
+
+        const connect = () => {
+            const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+            const ws = new WebSocket(`${protocol}://${window.location.host}/ws`);
+            socketRef.current = ws;
+
+            ws.onopen = () => {
+                retryDelay = 1000;
+                setConnected(true);
+                if (roomRef.current) ws.send(JSON.stringify({ type: 'subscribe', room_id: roomRef.current }));
+                if (hasConnected && onReconnectRef.current) onReconnectRef.current();
+                hasConnected = true;
+            };
+            ws.onmessage = (evt) => {
+                let msg;
+                try { msg = JSON.parse(evt.data); } catch (_) { return; }
+                if (msg.room_id !== undefined && msg.room_id !== roomRef.current) return;
+                if (onEventRef.current) onEventRef.current(msg);
+            };
+            ws.onclose = () => {
+                setConnected(false);
+                if (closed) return;
+                retryTimer = setTimeout(connect, retryDelay);
+                retryDelay = Math.min(retryDelay * 2, 30000);
+            };
+        };
+
+        connect();
+        return () => {
+            closed = true;
+            clearTimeout(retryTimer);
+            if (socketRef.current) socketRef.current.close();
+        };
+    }, []);
+
+    // Move the subscription when the active room changes
+    useEffect(() => {
+        const previous = roomRef.current;
+        roomRef.current = roomId;
+        const ws = socketRef.current;
+        if (!ws || ws.readyState !== WebSocket.OPEN) return;
+        if (previous && previous !== roomId) ws.send(JSON.stringify({ type: 'unsubscribe', room_id: previous }));
+        if (roomId) ws.send(JSON.stringify({ type: 'subscribe', room_id: roomId }));
+    }, [roomId]);
+
+    return connected;
+}
+
+export default useRoomEvents;
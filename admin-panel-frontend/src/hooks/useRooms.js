@@ -20,21 +20,23 @@ export function useRooms() {
             }
             const data = await res.json();
 
-            // Fetch member counts for each room
-            const roomsWithMembers = await Promise.all(
-                (data || []).map(async (room) => {
-                    try {
-                        const membersRes = await fetch(`/api/rooms/${room.id}/members`);
-                        if (membersRes.ok) {
-                            const members = await membersRes.json();
-                            return { ...room, memberCount: members.length };
-                        }
-                    } catch (err) {
-                        console.error(`Failed to fetch members for room ${room.id}:`, err);
+            // Member counts for every room in one batched request
+            let membersByRoom = {};
+            if (data && data.length > 0) {
+                try {
+                    const ids = data.map((room) => room.id).join(',');
+                    const membersRes = await fetch(`/api/rooms/members?room_ids=${ids}`);
+                    if (membersRes.ok) {
+                        membersByRoom = await membersRes.json();
                     }
-                    return { ...room, memberCount: 0 };
-                })
-            );
+                } catch (err) {
+                    console.error('Failed to fetch room members:', err);
+                }
+            }
+            const roomsWithMembers = (data || []).map((room) => ({
+                ...room,
+                memberCount: (membersByRoom[room.id] || []).length,
+            }));
 
             setRooms(roomsWithMembers);
 
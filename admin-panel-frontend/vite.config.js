@@ -18,6 +18,18 @@ export default defineConfig({
           });
         },
       },
+      // Real-time room events (WebSocket hub)
+      '/ws': {
+        target: 'ws://localhost:8000',
+        ws: true,
+        changeOrigin: false,
+        configure: (proxy, options) => {
+          // Same client-IP forwarding as /api so Tailscale identity resolves per device
+          proxy.on('proxyReqWs', (proxyReq, req, socket) => {
+            proxyReq.setHeader('X-Forwarded-For', req.socket.remoteAddress);
+          });
+        },
+      },
     },
   }
 });
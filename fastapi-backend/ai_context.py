@@ -0,0 +1,125 @@
+"""
+Real-time system context for AI responses.
+
+The context string is rebuilt by a background asyncio task every
+AI_CONTEXT_TTL seconds (default 30). Chat requests only read the cached
+string - no loopback HTTP, no subprocess and no sleeps on the request path.
+Network state comes from the shared Tailscale status cache, host metrics
+from the metrics sampler's latest sample.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from metrics_sampler import metrics_sampler
+from tailscale_state import tailscale_state
+
+logger = logging.getLogger(__name__)
+
+
+def format_ai_context(network_data: dict, system_data: dict) -> str:
+    """Render network and system snapshots as the AI system-prompt context block"""
+    context_parts = []
+
+    # Network context
+    if network_data.get("status") == "ok":
+        devices = network_data.get("devices", [])
+        online_devices = [d for d in devices if d.get("online")]
+        primary_hub = next((d for d in devices if d.get("role") == "primary-hub"), None)
+        dev_hub = next((d for d in devices if d.get("role") == "dev-hub"), None)
+        clients = [d for d in online_devices if d.get("role") == "client"]
+
+        context_parts.append(f"NETWORK: {len(online_devices)} devices online (total: {len(devices)})")
+        if primary_hub:
+            status = "online" if primary_hub.get("online") else "offline"
+            context_parts.append(f"  - Primary Hub ({primary_hub.get('name')}): {status}")
+        if dev_hub:
+            status = "online" if dev_hub.get("online") else "offline"
+            context_parts.append(f"  - Dev Hub ({dev_hub.get('name')}): {status}")
+        if clients:
+            context_parts.append(f"  - Clients online: {', '.join(d.get('name', 'unknown') for d in clients)}")
+    else:
+        context_parts.append(f"NETWORK: Tailscale not available ({network_data.get('error', 'unknown error')})")
+
+    # System context
+    if system_data:
+        context_parts.append(f"SYSTEM: CPU {system_data.get('cpu', 'N/A')}%, Memory {system_data.get('memory', 'N/A')}%, Disk {system_data.get('disk', 'N/A')}%")
+
+    # Storage context (placeholder for future expansion)
+    context_parts.append("STORAGE: D:\\ drive accessible via local file system")
+
+    return "\n".join(context_parts)
+
+
+def collect_system_snapshot() -> dict:
+    """CPU/memory/disk percentages from the latest metrics sample ({} before the first one)"""
+    sample = metrics_sampler.latest()
+    if sample is None:
+        return {}
+    return {"cpu": sample.cpu, "memory": sample.memory, "disk": sample.disk}
+
+
+class AIContextProvider:
+    """Keeps the AI context snapshot fresh in the background"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("AI_CONTEXT_TTL", "30"))
+        self._context = "CONTEXT: system snapshot not collected yet"
+        self._network: dict = {}
+        self._system: dict = {}
+        self._updated_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def get_context(self) -> str:
+        """Return the latest context string (never blocks)"""
+        return self._context
+
+    @property
+    def age_seconds(self) -> Optional[float]:
+        """Seconds since the last successful refresh, or None if never refreshed"""
+        if self._updated_at is None:
+            return None
+        return time.monotonic() - self._updated_at
+
+    async def refresh(self):
+        """Collect a new snapshot off the event loop and swap it in"""
+        try:
+            network = await tailscale_state.snapshot()
+        except Exception as e:
+            network = {"status": "error", "error": str(e)}
+        system = collect_system_snapshot()
+
+        self._network = network
+        self._system = system
+        self._context = format_ai_context(network, system)
+        self._updated_at = time.monotonic()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"AI context refresh failed: {e}")
+            await asyncio.sleep(self.ttl_seconds)
+
+    def start(self):
+        """Start the refresh loop (call from app startup)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the refresh loop (call from app shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Process-wide provider, started in main.lifespan
+context_provider = AIContextProvider()
@@ -0,0 +1,57 @@
+"""
+Alembic environment: runs migrations against database.engine (DATABASE_URL),
+with models.Base.metadata as the autogenerate target.
+"""
+
+from logging.config import fileConfig
+
+from alembic import context
+
+from database import Base, engine, DATABASE_URL, IS_SQLITE
+import models  # noqa: F401  (registers every table on Base.metadata)
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def include_name(name, type_, parent_names):
+    """Leave the FTS5 search table and its shadow tables (messages_fts_*) out of autogenerate"""
+    if type_ == "table" and name.startswith("messages_fts"):
+        return False
+    return True
+
+
+def run_migrations_offline():
+    """Emit the SQL to stdout (alembic upgrade head --sql)"""
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=IS_SQLITE,
+        include_name=include_name,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite cannot ALTER most constraints; batch mode rebuilds the table instead
+            render_as_batch=IS_SQLITE,
+            include_name=include_name,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
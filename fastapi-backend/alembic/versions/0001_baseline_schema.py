@@ -0,0 +1,274 @@
+"""Baseline schema
+
+Every table as of Phase 6B (rooms and room members, Tailscale devices).
+Adopts databases built by Base.metadata.create_all plus the one-off scripts
+(migrate_phase6b.py, migrate_tailscale_devices.py): tables that already exist
+are kept and only their missing columns are added.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _create_or_adopt(name, columns, constraints=(), indexes=()):
+    """Create `name`, or add whichever of `columns` an existing table lacks"""
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table(name):
+        present = {column["name"] for column in inspector.get_columns(name)}
+        for column in columns:
+            if column.name not in present:
+                op.add_column(name, column)
+        return
+    op.create_table(name, *columns, *constraints)
+    for index_name, index_columns, unique in indexes:
+        op.create_index(index_name, name, index_columns, unique=unique)
+
+
+def upgrade():
+    _create_or_adopt(
+        'users',
+        [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('handle', sa.String(length=50), nullable=False),
+            sa.Column('email', sa.String(length=100), nullable=False),
+            sa.Column('hashed_password', sa.String(length=255), nullable=False),
+            sa.Column('role', sa.String(length=20), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('devices', sa.Integer(), nullable=True),
+            sa.Column('ai_usage', sa.Integer(), nullable=True),
+            sa.Column('storage_used', sa.Float(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        ],
+        [sa.PrimaryKeyConstraint('id')],
+        [
+            ('ix_users_id', ['id'], False),
+            ('ix_users_handle', ['handle'], True),
+            ('ix_users_email', ['email'], True),
+        ],
+    )
+
+    _create_or_adopt(
+        'devices',
+        [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('device_name', sa.String(length=100), nullable=True),
+            sa.Column('device_type', sa.String(length=50), nullable=True),
+            sa.Column('ip_address', sa.String(length=50), nullable=True),
+            sa.Column('user_agent', sa.String(length=500), nullable=True),
+            sa.Column('last_active', sa.DateTime(), nullable=True),
+            sa.Column('first_seen', sa.DateTime(), nullable=True),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            # Tailscale integration (was migrate_tailscale_devices.py)
+            sa.Column('tailscale_ip', sa.String(length=50), nullable=True),
+            sa.Column('tailscale_hostname', sa.String(length=100), nullable=True),
+            sa.Column('is_tailscale_device', sa.Boolean(), nullable=True, server_default=sa.text('0')),
+        ],
+        [
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id'),
+        ],
+        [
+            ('ix_devices_id', ['id'], False),
+            ('ix_devices_tailscale_ip', ['tailscale_ip'], True),
+        ],
+    )
+
+    _create_or_adopt(
+        'invites',
+        [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('code', sa.String(length=50), nullable=False),
+            sa.Column('uses', sa.Integer(), nullable=True),
+            sa.Column('max_uses', sa.Integer(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('created_by', sa.Integer(), nullable=True),
+        ],
+        [
+            sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+            sa.PrimaryKeyConstraint('id'),
+        ],
+        [
+            ('ix_invites_id', ['id'], False),
+            ('ix_invites_code', ['code'], True),
+        ],
+    )
+
+    _create_or_adopt(
+        'threads',
+        [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('type', sa.String(length=20), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('avatar', sa.String(length=50), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            # Phase 6 / 6B room settings and metrics (was migrate_phase6b.py)
+            sa.Column('ai_enabled', sa.Boolean(), nullable=True, server_default=sa.text('1')),
+            sa.Column('notifications_enabled', sa.Boolean(), nullable=True, server_default=sa.text('1')),
+            sa.Column('self_destruct_at', sa.DateTime(), nullable=True),
+            sa.Column('total_messages', sa.Integer(), nullable=True, server_default=sa.text('0')),
+            sa.Column('total_ai_requests', sa.Integer(), nullable=True, server_default=sa.text('0')),
+            sa.Column('last_activity_at', sa.DateTime(), nullable=True),
+        ],
+        [
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id'),
+        ],
+        [('ix_threads_id', ['id'], False)],
+    )
+
+    _create_or_adopt(
+        'messages',
+        [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('thread_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('sender', sa.String(length=100), nullable=False),
+            sa.Column('text', sa.Text(), nullable=False),
+            sa.Column('timestamp', sa.DateTime(), nullable=True),
+        ],
+        [
+            sa.ForeignKeyConstraint(['thread_id'], ['threads.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id'),
+        ],
+        [('ix_messages_id', ['id'], False)],
+    )
+
+    _create_or_adopt(
+        'room_members',
+        [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('thread_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('role', sa.String(length=20), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        ],
+        [
+            sa.ForeignKeyConstraint(['thread_id'], ['threads.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+        ],
+        [('ix_room_members_id', ['id'], False)],
+    )
+
+    _create_or_adopt(
+        'connections',
+        [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('service', sa.String(length=50), nullable=False),
+            sa.Column('enabled', sa.Boolean(), nullable=True),
+            sa.Column('config', sa.Text(), nullable=True),
+            sa.Column('status', sa.String(length=50), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        ],
+        [
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('service'),
+        ],
+        [('ix_connections_id', ['id'], False)],
+    )
+
+    _create_or_adopt(
+        'cloud_storage_config',
+        [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('provider', sa.String(length=20), nullable=False),
+            sa.Column('bucket', sa.String(length=100), nullable=True),
+            sa.Column('region', sa.String(length=50), nullable=True),
+            sa.Column('access_key', sa.String(length=255), nullable=True),
+            sa.Column('secret_key', sa.String(length=255), nullable=True),
+            sa.Column('endpoint', sa.String(length=255), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        ],
+        [sa.PrimaryKeyConstraint('id')],
+        [('ix_cloud_storage_config_id', ['id'], False)],
+    )
+
+    _create_or_adopt(
+        'storage_files',
+        [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=255), nullable=False),
+            sa.Column('path', sa.String(length=500), nullable=False),
+            sa.Column('type', sa.String(length=20), nullable=True),
+            sa.Column('size', sa.String(length=50), nullable=True),
+            sa.Column('modified', sa.DateTime(), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+        ],
+        [
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id'),
+        ],
+        [('ix_storage_files_id', ['id'], False)],
+    )
+
+    _create_or_adopt(
+        'settings',
+        [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('key', sa.String(length=100), nullable=False),
+            sa.Column('value', sa.Text(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        ],
+        [
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('key'),
+        ],
+        [('ix_settings_id', ['id'], False)],
+    )
+
+    _create_or_adopt(
+        'system_logs',
+        [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('level', sa.String(length=20), nullable=True),
+            sa.Column('message', sa.Text(), nullable=True),
+            sa.Column('timestamp', sa.DateTime(), nullable=True),
+        ],
+        [sa.PrimaryKeyConstraint('id')],
+        [('ix_system_logs_id', ['id'], False)],
+    )
+
+    _create_or_adopt(
+        'notifications',
+        [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('type', sa.String(length=50), nullable=True),
+            sa.Column('title', sa.String(length=200), nullable=True),
+            sa.Column('message', sa.Text(), nullable=False),
+            sa.Column('read', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('from_user_id', sa.Integer(), nullable=True),
+        ],
+        [
+            sa.ForeignKeyConstraint(['from_user_id'], ['users.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id'),
+        ],
+        [('ix_notifications_id', ['id'], False)],
+    )
+
+
+def downgrade():
+    for name in (
+        'notifications', 'system_logs', 'settings', 'storage_files', 'cloud_storage_config',
+        'connections', 'room_members', 'messages', 'threads', 'invites', 'devices', 'users',
+    ):
+        op.drop_table(name)
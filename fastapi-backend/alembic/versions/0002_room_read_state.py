@@ -0,0 +1,49 @@
+"""Room read state
+
+Per-member read cursor and unread counter (see read_state.py).
+Existing members start with every current message marked as read.
+Replaces migrate_read_state.py.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    present = {column["name"] for column in sa.inspect(op.get_bind()).get_columns('room_members')}
+    added = False
+    if 'last_read_message_id' not in present:
+        op.add_column('room_members', sa.Column('last_read_message_id', sa.Integer(), nullable=True))
+        added = True
+    if 'unread_count' not in present:
+        op.add_column('room_members', sa.Column('unread_count', sa.Integer(), nullable=True, server_default=sa.text('0')))
+        added = True
+
+    if added:
+        # Start everyone caught up rather than with the whole history unread
+        op.execute(
+            """
+            UPDATE room_members
+            SET last_read_message_id = (
+                    SELECT MAX(id) FROM messages WHERE messages.thread_id = room_members.thread_id
+                ),
+                unread_count = 0
+            WHERE last_read_message_id IS NULL
+            """
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('room_members') as batch_op:
+        batch_op.drop_column('unread_count')
+        batch_op.drop_column('last_read_message_id')
@@ -0,0 +1,66 @@
+"""Hot-path indexes
+
+- messages(thread_id, id): keyset pagination of room history, last message per thread
+- room_members(user_id): "my rooms" and unread counts
+- room_members(thread_id, user_id) unique: membership checks; one row per member
+  (also serves per-room member lookups, so ix_room_members_thread_id is dropped)
+- devices(user_id, is_active, last_active): a user's latest active device
+- notifications(user_id, read): unread notifications per user
+Replaces migrate_message_indexes.py.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_messages_thread_id_id', 'messages', ['thread_id', 'id'], False),
+    ('ix_room_members_user_id', 'room_members', ['user_id'], False),
+    ('ux_room_members_thread_id_user_id', 'room_members', ['thread_id', 'user_id'], True),
+    ('ix_devices_user_id_is_active_last_active', 'devices', ['user_id', 'is_active', 'last_active'], False),
+    ('ix_notifications_user_id_read', 'notifications', ['user_id', 'read'], False),
+]
+
+
+def _index_names(table):
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    # Self-healing membership could race and insert the same member twice;
+    # keep the earliest row so the unique index can be built
+    op.execute(
+        """
+        DELETE FROM room_members
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM room_members GROUP BY thread_id, user_id
+        )
+        """
+    )
+
+    for index_name, table, columns, unique in INDEXES:
+        # Databases that ran the old index script already have some of these
+        if index_name not in _index_names(table):
+            op.create_index(index_name, table, columns, unique=unique)
+
+    if 'ix_room_members_thread_id' in _index_names('room_members'):
+        op.drop_index('ix_room_members_thread_id', table_name='room_members')
+
+    # Refresh planner statistics so the new indexes are picked up
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('ANALYZE')
+
+
+def downgrade():
+    op.create_index('ix_room_members_thread_id', 'room_members', ['thread_id'], unique=False)
+    for index_name, table, _columns, _unique in reversed(INDEXES):
+        op.drop_index(index_name, table_name=table)
@@ -0,0 +1,68 @@
+"""Full-text message search
+
+FTS5 index over messages.text (external content: the text is stored once, in
+messages), kept in sync by triggers on insert, delete and text updates.
+Existing messages are indexed by a rebuild. SQLite only; on other databases
+this revision is a no-op and search reports itself unavailable.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+TRIGGERS = {
+    'messages_fts_ai': """
+        CREATE TRIGGER messages_fts_ai AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+        END
+    """,
+    'messages_fts_ad': """
+        CREATE TRIGGER messages_fts_ad AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END
+    """,
+    'messages_fts_au': """
+        CREATE TRIGGER messages_fts_au AFTER UPDATE OF text ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+        END
+    """,
+}
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    # remove_diacritics 2: "cafe" finds "café"; prefix: indexes for 2 and 3
+    # character prefixes, the expensive ones in search-as-you-type
+    op.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            text,
+            content='messages',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        """
+    )
+    for name, ddl in TRIGGERS.items():
+        op.execute(f'DROP TRIGGER IF EXISTS {name}')
+        op.execute(ddl)
+    op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for name in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}')
+    op.execute('DROP TABLE IF EXISTS messages_fts')
@@ -0,0 +1,38 @@
+"""Metric history
+
+metric_points: tiered time-series buckets for host metrics and latencies
+(see metrics_store.py), primary key (series, resolution, bucket).
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'metric_points',
+        sa.Column('series', sa.String(length=200), nullable=False),
+        sa.Column('resolution', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('minimum', sa.Float(), nullable=False),
+        sa.Column('maximum', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('series', 'resolution', 'bucket'),
+    )
+    op.create_index('ix_metric_points_resolution_bucket', 'metric_points', ['resolution', 'bucket'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_metric_points_resolution_bucket', table_name='metric_points')
+    op.drop_table('metric_points')
@@ -5,6 +5,7 @@ Later phases will implement proper auth with headers/tokens.
 
 from sqlalchemy.orm import Session
 from models import User
+from auth.identity import resolve_cached
 
 
 def get_current_user(db: Session) -> User:
@@ -12,7 +13,18 @@ def get_current_user(db: Session) -> User:
     Get the current authenticated user.
     For now, always returns Chance (hardcoded).
     Future: Will read from JWT token or session.
+    Memoized per request and cached process-wide (see auth.identity).
     """
+    user, _ = resolve_cached(db, "default", lambda: (_lookup_default_user(db), None))
+
+    # If still no user, raise an error
+    if not user:
+        raise ValueError("No default user found. Please create a user with handle='@chance' or id=1")
+
+    return user
+
+
+def _lookup_default_user(db: Session):
     # Try to find user by handle @chance (from Phase 1 seeding)
     user = db.query(User).filter(User.handle == "@chance").first()
     
@@ -24,8 +36,4 @@ def get_current_user(db: Session) -> User:
     if not user:
         user = db.query(User).filter(User.id == 1).first()
     
-    # If still no user, raise an error
-    if not user:
-        raise ValueError("No default user found. Please create a user with handle='@chance' or id=1")
-    
     return user
@@ -0,0 +1,108 @@
+"""
+Identity resolution cache.
+
+Two layers:
+- a per-request memo stored on the request's Session (Session.info), so the
+  many get_current_user() calls inside one handler resolve the user once;
+- a short-TTL process-wide cache (IDENTITY_CACHE_TTL seconds, default 30) of
+  user ids keyed by client IP (and for the default user), so a cache hit
+  costs one primary-key lookup.
+
+Nothing here writes to the database; device activity goes through
+presence.presence_store.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import User
+
+_MEMO_PREFIX = "identity:"
+
+# Marker for "this IP resolved to nobody" in both layers
+_NO_USER = object()
+
+
+class IdentityCache:
+    """Process-wide TTL cache: key -> (user_id or None, device_id or None)"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("IDENTITY_CACHE_TTL", "30"))
+        self._entries: Dict[str, Tuple[Optional[int], Optional[int], float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Tuple[Optional[int], Optional[int]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            user_id, device_id, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return user_id, device_id
+
+    def put(self, key: str, user_id: Optional[int], device_id: Optional[int] = None):
+        with self._lock:
+            self._entries[key] = (user_id, device_id, time.monotonic() + self.ttl_seconds)
+
+    def invalidate(self, key: Optional[str] = None):
+        """Forget one key, or everything (e.g. after devices or users change)"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        return {"hits": self.hits, "misses": self.misses, "entries": size, "ttl_seconds": self.ttl_seconds}
+
+
+def resolve_cached(
+    db: Session,
+    key: str,
+    lookup: Callable[[], Tuple[Optional[User], Optional[int]]],
+) -> Tuple[Optional[User], Optional[int]]:
+    """
+    Resolve (user, device_id) for `key` through the request memo, then the
+    process cache, then `lookup()` (the uncached database lookup).
+    """
+    memo_key = _MEMO_PREFIX + key
+    memo = db.info.get(memo_key)
+    if memo is not None:
+        user, device_id = memo
+        return (None if user is _NO_USER else user), device_id
+
+    user = None
+    device_id = None
+    cached = identity_cache.get(key)
+    if cached is not None:
+        user_id, device_id = cached
+        if user_id is not None:
+            user = db.get(User, user_id)
+        if user_id is not None and user is None:
+            # User was deleted since it was cached
+            identity_cache.invalidate(key)
+            cached = None
+
+    if cached is None:
+        user, device_id = lookup()
+        identity_cache.put(key, user.id if user else None, device_id)
+
+    db.info[memo_key] = (user if user is not None else _NO_USER, device_id)
+    return user, device_id
+
+
+# Process-wide cache shared by auth.current_user and tailscale_auth
+identity_cache = IdentityCache()
@@ -0,0 +1,247 @@
+"""
+Conversation memory for AI chat in a thread.
+
+Each thread's recent turns are cached in process. A turn only reads the
+messages newer than the last one seen (one indexed range query), then the
+newest turns that fit the model's token budget are sent as history. Turns
+that fall out of the budget are folded into a running summary, one line per
+turn, so the model still sees what came earlier without an extra model call.
+
+The cache itself only folds what exceeds CHAT_HISTORY_MAX_TOKENS; a smaller
+budget (a small Ollama context, say) folds on a per-request copy, so it
+never costs a later request with a larger budget any history.
+
+Token counts are estimates (about four characters per token); providers
+report the real prompt size in their usage data.
+"""
+
+import asyncio
+import os
+import re
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Message
+
+# History sent per request, at most (smaller models get less, see history_budget)
+CHAT_HISTORY_MAX_TOKENS = int(os.getenv("CHAT_HISTORY_MAX_TOKENS", "3000"))
+# Size of the running summary of turns that no longer fit
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "400"))
+# Threads kept in memory (least recently used are dropped)
+CHAT_MEMORY_THREADS = int(os.getenv("CHAT_MEMORY_THREADS", "256"))
+# Messages read when a thread is first seen (older ones are not summarized)
+CHAT_HISTORY_LOAD = int(os.getenv("CHAT_HISTORY_LOAD", "200"))
+# Ollama truncates prompts to its num_ctx (not the model's full window)
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+
+# Room for the reply (matches max_tokens on the OpenAI calls)
+REPLY_RESERVE_TOKENS = 1000
+# Per-message framing overhead in chat formats
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Context windows by model-name prefix, longest prefix first
+OPENAI_CONTEXT_WINDOWS = (
+    ("gpt-4.1", 1047576),
+    ("gpt-4o", 128000),
+    ("gpt-4-turbo", 128000),
+    ("gpt-4", 8192),
+    ("gpt-3.5-turbo", 16385),
+)
+DEFAULT_CONTEXT_WINDOW = 4096
+
+# Senders of assistant messages (persist_assistant_message, legacy AI threads)
+ASSISTANT_SENDERS = {"TL", "bot"}
+
+SUMMARY_LINE_CHARS = 160
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast token estimate: about four characters per token for English text"""
+    return (len(text) + 3) // 4
+
+
+def message_tokens(text: str) -> int:
+    return estimate_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+
+
+def context_window(provider: str, model: str) -> int:
+    if provider == "ollama":
+        return OLLAMA_NUM_CTX
+    name = (model or "").lower()
+    for prefix, window in OPENAI_CONTEXT_WINDOWS:
+        if name.startswith(prefix):
+            return window
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def history_budget(provider: str, model: str, fixed_tokens: int) -> int:
+    """Tokens left for history after the system prompt, current message and reply"""
+    room = context_window(provider, model) - REPLY_RESERVE_TOKENS - fixed_tokens
+    return max(0, min(CHAT_HISTORY_MAX_TOKENS, room))
+
+
+def _summary_line(role: str, text: str) -> str:
+    text = _WHITESPACE.sub(" ", text).strip()
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS].rsplit(" ", 1)[0] + "…"
+    return f"- {'Assistant' if role == 'assistant' else 'User'}: {text}"
+
+
+class ThreadMemory:
+    """Cached turns and running summary of one thread"""
+
+    def __init__(self):
+        # (message_id, role, text, tokens), oldest first
+        self.turns: Deque[Tuple[int, str, str, int]] = deque()
+        self.turn_tokens = 0
+        self.summary: Deque[Tuple[str, int]] = deque()
+        self.summary_tokens = 0
+        self.summarized_turns = 0
+        self.omitted_turns = 0
+        self.last_message_id = 0
+        self.lock = asyncio.Lock()
+
+    def append(self, message_id: int, sender: str, text: str):
+        role = "assistant" if sender in ASSISTANT_SENDERS else "user"
+        tokens = message_tokens(text)
+        self.turns.append((message_id, role, text, tokens))
+        self.turn_tokens += tokens
+        self.last_message_id = max(self.last_message_id, message_id)
+
+    def fold_oldest(self):
+        """Move the oldest cached turn into the summary"""
+        _message_id, role, text, tokens = self.turns.popleft()
+        self.turn_tokens -= tokens
+        self.fold(role, text)
+
+    def trim(self, max_tokens: int):
+        """Fold the oldest cached turns until turns and summary fit in `max_tokens`"""
+        while self.turns and self.turn_tokens + self.summary_cost() > max_tokens:
+            self.fold_oldest()
+
+    def fork(self) -> "ThreadMemory":
+        """Copy of the summary (no turns) to fold into for a single request"""
+        view = ThreadMemory()
+        view.summary = deque(self.summary)
+        view.summary_tokens = self.summary_tokens
+        view.summarized_turns = self.summarized_turns
+        view.omitted_turns = self.omitted_turns
+        view.last_message_id = self.last_message_id
+        return view
+
+    def fold(self, role: str, text: str):
+        """Add a turn to the summary, dropping the oldest summary lines past its budget"""
+        line = _summary_line(role, text)
+        line_tokens = estimate_tokens(line) + 1
+        self.summary.append((line, line_tokens))
+        self.summary_tokens += line_tokens
+        self.summarized_turns += 1
+        while self.summary_tokens > CHAT_SUMMARY_MAX_TOKENS and len(self.summary) > 1:
+            _line, dropped = self.summary.popleft()
+            self.summary_tokens -= dropped
+            self.omitted_turns += 1
+
+    def summary_cost(self) -> int:
+        summary = self.summary_text()
+        return message_tokens(summary) if summary is not None else 0
+
+    def summary_text(self) -> Optional[str]:
+        if not self.summary:
+            return None
+        lines = ["Summary of the earlier conversation in this thread:"]
+        if self.omitted_turns:
+            lines.append(f"- ({self.omitted_turns} earlier messages omitted)")
+        lines.extend(line for line, _tokens in self.summary)
+        return "\n".join(lines)
+
+
+class ConversationMemory:
+    """Process-wide LRU of ThreadMemory, refreshed incrementally from the messages table"""
+
+    def __init__(self, max_threads: Optional[int] = None):
+        self.max_threads = max_threads if max_threads is not None else CHAT_MEMORY_THREADS
+        self._threads: "OrderedDict[int, ThreadMemory]" = OrderedDict()
+        self.counters = {"loads": 0, "refreshes": 0, "messages_read": 0, "evictions": 0}
+
+    def _get(self, thread_id: int) -> Tuple[ThreadMemory, bool]:
+        memory = self._threads.get(thread_id)
+        if memory is not None:
+            self._threads.move_to_end(thread_id)
+            return memory, False
+        memory = self._threads[thread_id] = ThreadMemory()
+        while len(self._threads) > self.max_threads:
+            self._threads.popitem(last=False)
+            self.counters["evictions"] += 1
+        return memory, True
+
+    async def _refresh(self, db: AsyncSession, thread_id: int, memory: ThreadMemory, is_new: bool):
+        """Read the messages added since the last turn (all recent ones for a new entry)"""
+        query = select(Message.id, Message.sender, Message.text).where(Message.thread_id == thread_id)
+        if not is_new:
+            query = query.where(Message.id > memory.last_message_id)
+        # Newest CHAT_HISTORY_LOAD at most, via ix_messages_thread_id_id
+        rows = (await db.execute(query.order_by(Message.id.desc()).limit(CHAT_HISTORY_LOAD))).all()
+        for message_id, sender, text in reversed(rows):
+            memory.append(message_id, sender, text or "")
+        self.counters["loads" if is_new else "refreshes"] += 1
+        self.counters["messages_read"] += len(rows)
+
+    async def window(self, db: AsyncSession, thread_id: int, budget: int, current_message: str = "") -> dict:
+        """
+        History for the next request in `thread_id`, within `budget` tokens
+        (summary included). A trailing user turn equal to `current_message` is
+        left out: the request sends that message itself.
+        Returns {"messages": [...], "history_turns", "history_tokens", "summarized_turns"}.
+        """
+        memory, is_new = self._get(thread_id)
+        async with memory.lock:
+            await self._refresh(db, thread_id, memory, is_new)
+            # The cache keeps what the largest budget can use; older turns
+            # are folded into its summary for good
+            memory.trim(CHAT_HISTORY_MAX_TOKENS)
+
+            turns = list(memory.turns)
+            if turns and turns[-1][1] == "user" and turns[-1][2].strip() == current_message.strip():
+                turns.pop()
+
+            # Keep the newest turns that fit next to the summary; fold the
+            # oldest into this request's copy of the summary until they do
+            view = memory.fork()
+            used = sum(tokens for _id, _role, _text, tokens in turns)
+            fold = 0
+            while fold < len(turns) and used + view.summary_cost() > budget:
+                _id, role, text, tokens = turns[fold]
+                used -= tokens
+                view.fold(role, text)
+                fold += 1
+
+            messages = []
+            summary_tokens = view.summary_cost()
+            if summary_tokens and used + summary_tokens <= budget:
+                messages.append({"role": "system", "content": view.summary_text()})
+            else:
+                # Budget smaller than the summary alone
+                summary_tokens = 0
+            messages.extend({"role": role, "content": text} for _id, role, text, _tokens in turns[fold:])
+            return {
+                "messages": messages,
+                "history_turns": len(turns) - fold,
+                "history_tokens": used + summary_tokens,
+                "summarized_turns": view.summarized_turns,
+            }
+
+    def forget(self, thread_id: int):
+        """Drop a thread's memory (thread deleted)"""
+        self._threads.pop(thread_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"threads": len(self._threads), **self.counters}
+
+
+# Process-wide memory, shared by the chat routes
+conversation_memory = ConversationMemory()
@@ -2,9 +2,12 @@
 Database configuration and session management
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 import os
 
@@ -17,14 +20,131 @@ db_path = os.getenv("DATABASE_URL", "sqlite:////app/data/admin_panel.db")
 os.makedirs("/app/data", exist_ok=True) if db_path.startswith("sqlite:////app/data") else None
 DATABASE_URL = db_path
 
-# Create engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+# Async driver for the same database, used by the async route handlers.
+# Derived from DATABASE_URL (sqlite -> aiosqlite, postgresql -> asyncpg) unless set explicitly.
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg"}
 
-# Create session factory
+
+def _async_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None or parsed.drivername == driver:
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+IS_SQLITE_MEMORY = IS_SQLITE and (":memory:" in DATABASE_URL or DATABASE_URL.rstrip("/") == "sqlite:")
+
+# SQLite profile applied to every new connection.
+# SQLITE_PROFILE=off keeps SQLite's defaults (rollback journal, synchronous=FULL).
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production").lower()
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB, so 64 MiB
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+# Pool sized for the threadpool that runs sync route handlers plus background flushers
+# (the async engine gets its own pool of the same size)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+def _engine_kwargs(is_async: bool = False) -> dict:
+    if IS_SQLITE:
+        connect_args = {
+            # Driver-level lock wait, in step with PRAGMA busy_timeout
+            "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,
+        }
+        if not is_async:
+            connect_args["check_same_thread"] = False
+        kwargs = {"connect_args": connect_args}
+        if IS_SQLITE_MEMORY:
+            # In-memory databases live in a single connection; keep SQLAlchemy's default pool
+            return kwargs
+        if is_async:
+            # aiosqlite defaults to NullPool (a new connection, and pragmas, per checkout)
+            kwargs["poolclass"] = AsyncAdaptedQueuePool
+    else:
+        kwargs = {"pool_pre_ping": True}
+    kwargs.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return kwargs
+
+
+# Create engines: sync for scripts, the threadpool and background jobs; async for async route handlers
+engine = create_engine(DATABASE_URL, **_engine_kwargs())
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_kwargs(is_async=True))
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    """Apply the SQLite profile to a raw DB-API connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        # busy_timeout first so the journal_mode switch itself waits for locks
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_PRAGMAS['busy_timeout']}")
+        if not IS_SQLITE_MEMORY:
+            cursor.execute(f"PRAGMA journal_mode = {SQLITE_PRAGMAS['journal_mode']}")
+            cursor.execute(f"PRAGMA mmap_size = {SQLITE_PRAGMAS['mmap_size']}")
+        cursor.execute(f"PRAGMA synchronous = {SQLITE_PRAGMAS['synchronous']}")
+        cursor.execute(f"PRAGMA cache_size = {SQLITE_PRAGMAS['cache_size']}")
+        cursor.execute(f"PRAGMA temp_store = {SQLITE_PRAGMAS['temp_store']}")
+    finally:
+        cursor.close()
+
+
+if IS_SQLITE and SQLITE_PROFILE != "off":
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+    # aiosqlite's connection adapter exposes the same cursor()/execute() interface
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+
+
+def describe_database() -> dict:
+    """Effective database settings, as reported by the database itself"""
+    report = {
+        "url": engine.url.render_as_string(hide_password=True),
+        "pool": engine.pool.__class__.__name__,
+        "pool_status": engine.pool.status(),
+        "async_url": async_engine.url.render_as_string(hide_password=True),
+    }
+    if IS_SQLITE:
+        report["profile"] = SQLITE_PROFILE
+        with engine.connect() as conn:
+            for pragma in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size", "temp_store"):
+                report[pragma] = conn.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+    return report
+
+
+def print_database_report():
+    """Startup report of the effective database settings"""
+    try:
+        report = describe_database()
+    except Exception as e:
+        print(f"⚠️  Could not read database settings: {e}")
+        return
+    print(f"🗄️  Database: {report['url']} ({report['pool']})")
+    if IS_SQLITE:
+        # synchronous: 0=OFF 1=NORMAL 2=FULL 3=EXTRA; temp_store: 0=DEFAULT 1=FILE 2=MEMORY
+        print(
+            f"   profile={report['profile']} journal_mode={report['journal_mode']} "
+            f"synchronous={report['synchronous']} busy_timeout={report['busy_timeout']}ms "
+            f"cache_size={report['cache_size']} mmap_size={report['mmap_size']} "
+            f"temp_store={report['temp_store']}"
+        )
+    print(f"   pool: {report['pool_status']}")
+    print(f"   async: {report['async_url']}")
+
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: attributes stay readable after commit without an implicit (sync) refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
@@ -39,3 +159,12 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """
+    Dependency for getting an async database session (for async def handlers)
+    Sync helpers taking a Session can run on it with `await db.run_sync(helper, ...)`.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
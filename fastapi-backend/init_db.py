@@ -3,16 +3,17 @@ Initialize database with sample data
 Run this script to create an admin user and sample data
 """
 
-from database import SessionLocal, engine, Base
-from models import User, Thread, Message, Invite, Settings
+from database import SessionLocal
+from migrations import upgrade_to_head
+from message_store import insert_message
+from models import User, Thread, Invite, Settings
 from auth_utils import get_password_hash
 import json
 
-# Create all tables
-Base.metadata.create_all(bind=engine)
-
 def init_db():
     """Initialize database with sample data"""
+    # Create / update all tables through the migration chain
+    upgrade_to_head()
     db = SessionLocal()
     
     try:
@@ -92,12 +93,12 @@ def init_db():
             db.commit()
             
             # Add initial message
-            initial_message = Message(
+            insert_message(
+                db,
                 thread_id=ai_thread.id,
                 sender="bot",
                 text="Hello! I'm your AI assistant. How can I help you today?"
             )
-            db.add(initial_message)
             print("✅ Created AI Assistant thread")
         
         # Create sample invite
@@ -5,8 +5,9 @@ Creates tables, default users, and system rooms.
 """
 
 import sys
-from database import engine, SessionLocal
-from models import Base, User, UserPermission, Room, RoomMember, Message
+from database import SessionLocal
+from migrations import upgrade_to_head
+from models import User, UserPermission, Room, RoomMember, Message
 from auth_utils import get_password_hash
 from datetime import datetime
 import json
@@ -65,7 +66,7 @@ def init_multi_user_system():
     
     # Create all tables
     print("\n[1/5] Creating database tables...")
-    Base.metadata.create_all(bind=engine)
+    upgrade_to_head()
     print("✓ Tables created")
     
     db = SessionLocal()
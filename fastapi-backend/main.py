@@ -11,38 +11,77 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
-from fastapi import FastAPI
+import asyncio
+from typing import Optional
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-from database import get_db, engine, Base
+from database import get_db, async_engine, SessionLocal, AsyncSessionLocal, print_database_report
+from migrations import ensure_schema
 from routers import auth, users, invites, chat, connections, storage, settings, system, devices, rooms
 from chat_routes import router as chat_router
-# from websocket_manager import ConnectionManager
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-# WebSocket connection manager
-# manager = ConnectionManager()
-
-
-# @asynccontextmanager
-# async def lifespan(app: FastAPI):
-#     """Application lifespan events"""
-#     # Startup
-#     print("🚀 Starting Admin Panel API Server...")
-#     yield
-#     # Shutdown
-#     print("👋 Shutting down Admin Panel API Server...")
+from ai_context import context_provider
+from metrics_sampler import metrics_sampler
+from metrics_store import metrics_store, RouteLatencyMiddleware
+from provider_clients import provider_clients
+from ollama_models import ollama_models
+from websocket_manager import manager
+from presence import presence_store
+from tailscale_state import tailscale_state
+from tailscale_watch import TAILSCALE_WATCH, tailscale_watcher, broadcast_peer_event
+from models import User
+from auth_utils import decode_token
+from auth.room_permissions import get_membership
+from tailscale_auth import get_user_by_tailscale_ip, get_client_ip
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifespan events"""
+    # Startup
+    print("🚀 Starting Admin Panel API Server...")
+    print_database_report()
+    # Schema comes from the Alembic chain (migrations.py); no DDL at import time
+    ensure_schema()
+    db = SessionLocal()
+    try:
+        provider_clients.warm_from_db(db)
+        ollama_models.configure_from_db(db)
+    finally:
+        db.close()
+    metrics_sampler.start()
+    metrics_store.start()
+    context_provider.start()
+    # Loads the default Ollama models in the background, then tracks /api/ps
+    ollama_models.start()
+    presence_store.start()
+    manager.bind_loop(asyncio.get_running_loop())
+    if TAILSCALE_WATCH:
+        # Live peer table: pushes peer transitions and replaces status polling while it runs
+        tailscale_watcher.subscribe(broadcast_peer_event)
+        tailscale_state.use_watcher(tailscale_watcher)
+        tailscale_watcher.start()
+    yield
+    # Shutdown
+    await tailscale_watcher.stop()
+    await context_provider.stop()
+    await metrics_store.stop()
+    await metrics_sampler.stop()
+    await presence_store.stop()
+    await ollama_models.stop()
+    await provider_clients.aclose()
+    await async_engine.dispose()
+    print("👋 Shutting down Admin Panel API Server...")
 
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Admin Panel API",
     description="Production-ready backend for admin panel with AI, storage, and real-time features",
-    version="1.0.0"
-    # lifespan=lifespan
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration - Allow all Tailscale and localhost origins
@@ -52,7 +91,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Before-Cursor", "X-After-Cursor", "X-Has-Newer", "X-Next-Cursor"],  # History and search pagination
 )
+# Per-route latency history (see metrics_store.py)
+app.add_middleware(RouteLatencyMiddleware)
 
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
@@ -93,50 +135,90 @@ def health_check():
         raise
 
 
-# @app.websocket("/ws")
-# async def websocket_endpoint(websocket: WebSocket, token: str = None):
-#     """
-#     WebSocket endpoint for real-time updates
-#     Connect: ws://localhost:8086/ws?token=YOUR_JWT_TOKEN
-#     """
-#     await manager.connect(websocket)
-#     try:
-#         while True:
-#             data = await websocket.receive_json()
-#             message_type = data.get("type")
-#             message_data = data.get("data")
-#             
-#             # Handle different message types
-#             if message_type == "message":
-#                 # Broadcast new message to all connected clients
-#                 await manager.broadcast({
-#                     "type": "new_message",
-#                     "data": message_data
-#                 })
-#             elif message_type == "user_status":
-#                 # Broadcast user status change
-#                 await manager.broadcast({
-#                     "type": "user_status_changed",
-#                     "data": message_data
-#                 })
-#             elif message_type == "notification":
-#                 # Broadcast notification
-#                 await manager.broadcast({
-#                     "type": "notification",
-#                     "data": message_data
-#                 })
-#             else:
-#                 # Echo back unknown message types
-#                 await websocket.send_json({
-#                     "type": "error",
-#                     "message": f"Unknown message type: {message_type}"
-#                 })
-#     except WebSocketDisconnect:
-#         manager.disconnect(websocket)
-#         await manager.broadcast({
-#             "type": "user_disconnected",
-#             "data": {"message": "A user disconnected"}
-#         })
+def _authenticate_websocket(db, websocket: WebSocket) -> Optional[User]:
+    """
+    Resolve the user for a WebSocket: a JWT in ?token= if given,
+    otherwise the Tailscale device the connection comes from.
+    """
+    token = websocket.query_params.get("token")
+    if token:
+        try:
+            payload = decode_token(token)
+        except HTTPException:
+            return None
+        email = payload.get("sub")
+        return db.query(User).filter(User.email == email).first() if email else None
+    return get_user_by_tailscale_ip(db, get_client_ip(websocket))
+
+
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket):
+    """
+    WebSocket endpoint for real-time room events
+    Connect: ws://<host>:8000/ws (Tailscale identity) or ws://<host>:8000/ws?token=YOUR_JWT_TOKEN
+
+    Client -> server: {"type": "subscribe" | "unsubscribe", "room_id": 1}, {"type": "ping"}
+    Server -> client: {"type": "new_message" | "member_added" | "member_removed" | "room_updated" | "room_deleted",
+                       "room_id": 1, "data": {...}}
+    Hub-wide, to every connection: {"type": "presence_changed" | "provider_status", "data": {...}}
+    """
+    # Sync helpers run on an AsyncSession so lookups never block the event loop
+    async with AsyncSessionLocal() as db:
+        user = await db.run_sync(_authenticate_websocket, websocket)
+        user_id = user.id if user else None
+
+    if user_id is None:
+        await websocket.close(code=4401)
+        return
+
+    await manager.connect(websocket, user_id)
+    try:
+        while True:
+            try:
+                data = await websocket.receive_json()
+            except (ValueError, KeyError):
+                # Not JSON, or a binary frame: report it and keep the connection
+                await manager.send_personal_message({"type": "error", "message": "Invalid JSON"}, websocket)
+                continue
+            if not isinstance(data, dict):
+                await manager.send_personal_message({"type": "error", "message": "Expected a JSON object"}, websocket)
+                continue
+            message_type = data.get("type")
+
+            if message_type in ("subscribe", "unsubscribe"):
+                try:
+                    room_id = int(data.get("room_id"))
+                except (TypeError, ValueError):
+                    await manager.send_personal_message({"type": "error", "message": "room_id required"}, websocket)
+                    continue
+
+                if message_type == "unsubscribe":
+                    manager.unsubscribe(websocket, room_id)
+                    await manager.send_personal_message({"type": "unsubscribed", "room_id": room_id}, websocket)
+                    continue
+
+                # Same rule as the REST API: only members receive room events
+                async with AsyncSessionLocal() as db:
+                    is_member = await db.run_sync(get_membership, user_id, room_id) is not None
+                if not is_member:
+                    await manager.send_personal_message({"type": "error", "room_id": room_id, "message": "Not a member of this room"}, websocket)
+                    continue
+
+                manager.subscribe(websocket, room_id)
+                await manager.send_personal_message({"type": "subscribed", "room_id": room_id}, websocket)
+            elif message_type == "ping":
+                await manager.send_personal_message({"type": "pong"}, websocket)
+            else:
+                # Echo back unknown message types
+                await manager.send_personal_message({
+                    "type": "error",
+                    "message": f"Unknown message type: {message_type}"
+                }, websocket)
+    except WebSocketDisconnect:
+        manager.disconnect(websocket)
+    except Exception:
+        manager.disconnect(websocket)
+        raise
 
 
 if __name__ == "__main__":
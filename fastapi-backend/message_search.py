@@ -0,0 +1,225 @@
+"""
+Full-text search over chat messages.
+
+Backed by the SQLite FTS5 table messages_fts (alembic revision 0004), which
+triggers keep in sync with messages. Results are limited to rooms the user
+is a member of, ranked by BM25 and paged with a (rank, id) keyset cursor.
+Very common words are ranked in windows of their newest matches.
+
+`python message_search.py rebuild` re-indexes every message (after a bulk
+import that bypassed the triggers, or to repair the index);
+`python message_search.py optimize` merges the index segments.
+"""
+
+import html
+import os
+import re
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database import IS_SQLITE, engine
+
+FTS_TABLE = "messages_fts"
+SEARCH_AVAILABLE = IS_SQLITE
+
+# Highlight markers: private-use characters that cannot collide with message
+# text, turned into <mark> tags once the snippet has been HTML-escaped
+_OPEN, _CLOSE = "\ue000", "\ue001"
+SNIPPET_TOKENS = 16
+
+# BM25 has to score every match before the best can be picked, which gets slow
+# for very common words. Matches are therefore ranked in windows of the newest
+# SEARCH_RANK_WINDOW visible matches (found by walking at most ten times as
+# many raw matches); words with fewer matches are ranked all at once.
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "500"))
+_SCAN_FACTOR = 10
+_MAX_ROWID = 2 ** 63 - 1
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# CROSS JOIN pins the join order: SQLite would otherwise start from a small
+# room's messages and probe the FTS index once per message, which is far slower.
+
+# Oldest of the newest :scan raw matches below :ceiling (no join, no scoring)
+_SCAN_FLOOR_SQL = """
+SELECT rowid FROM messages_fts
+WHERE messages_fts MATCH :match AND rowid < :ceiling
+ORDER BY rowid DESC
+LIMIT 1 OFFSET :offset
+"""
+
+# Oldest of the newest :window visible matches in [:floor, :ceiling)
+_WINDOW_FLOOR_SQL = """
+SELECT m.id
+FROM messages_fts
+CROSS JOIN messages m ON m.id = messages_fts.rowid
+CROSS JOIN room_members rm ON rm.thread_id = m.thread_id AND rm.user_id = :user_id
+WHERE messages_fts MATCH :match
+  AND messages_fts.rowid >= :floor AND messages_fts.rowid < :ceiling
+{filters}
+ORDER BY messages_fts.rowid DESC
+LIMIT 1 OFFSET :offset
+"""
+
+# bm25() rather than the rank column: it is only evaluated for rows that
+# survive the membership join, rank would score every match first
+_SEARCH_SQL = """
+SELECT m.id, m.thread_id, t.name AS room_name, m.user_id, m.sender, m.timestamp,
+       snippet(messages_fts, 0, :open, :close, '…', :tokens) AS snippet,
+       bm25(messages_fts) AS rank
+FROM messages_fts
+CROSS JOIN messages m ON m.id = messages_fts.rowid
+CROSS JOIN room_members rm ON rm.thread_id = m.thread_id AND rm.user_id = :user_id
+JOIN threads t ON t.id = m.thread_id
+WHERE messages_fts MATCH :match
+  AND messages_fts.rowid >= :floor AND messages_fts.rowid < :ceiling
+{filters}
+ORDER BY rank, m.id
+LIMIT :limit
+"""
+
+
+def build_match_query(query: str, prefix: bool = False) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query: every word must match; with `prefix`
+    the last one also matches as a prefix (search-as-you-type, costlier).
+    Words are quoted, so FTS5 operators and punctuation in user input are
+    never interpreted.
+    """
+    words = _WORD.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if prefix:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def render_snippet(snippet: str) -> str:
+    return html.escape(snippet or "").replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def _window_floor(db: Session, params: dict, filters: str, ceiling: int) -> int:
+    """Lowest message id of the rank window just below `ceiling`; 0 = every remaining match"""
+    bounds = {"ceiling": ceiling}
+    scan_floor = db.execute(
+        text(_SCAN_FLOOR_SQL), {**params, **bounds, "offset": SEARCH_RANK_WINDOW * _SCAN_FACTOR - 1}
+    ).scalar()
+    bounds["floor"] = scan_floor or 0
+    window_floor = db.execute(
+        text(_WINDOW_FLOOR_SQL.format(filters=filters)), {**params, **bounds, "offset": SEARCH_RANK_WINDOW - 1}
+    ).scalar()
+    return window_floor or bounds["floor"]
+
+
+def search_messages(
+    db: Session,
+    user_id: int,
+    query: str,
+    room_id: Optional[int] = None,
+    limit: int = 20,
+    after: Optional[Tuple[float, int, int, int]] = None,
+    prefix: bool = False,
+) -> Tuple[List[dict], Optional[Tuple[float, int, int, int]]]:
+    """
+    One page of matches: best first within each rank window, newer windows
+    first. `after` is the cursor returned with the previous page: (rank, id)
+    of its last result and that result's window (floor, ceiling).
+    Returns (results, next_after); next_after is None on the last page.
+    Async handlers call it via db.run_sync.
+    """
+    match = build_match_query(query, prefix=prefix)
+    if match is None:
+        return [], None
+
+    params = {"match": match, "user_id": user_id}
+    scope = ""
+    if room_id is not None:
+        scope = "AND m.thread_id = :room_id"
+        params["room_id"] = room_id
+
+    if after is not None:
+        after_key, (floor, ceiling) = after[:2], after[2:]
+    else:
+        after_key, ceiling = None, _MAX_ROWID
+        floor = _window_floor(db, params, scope, ceiling)
+
+    # (row, floor, ceiling); one extra row tells whether another page exists
+    rows = []
+    while True:
+        filters = scope
+        page_params = {
+            **params,
+            "floor": floor,
+            "ceiling": ceiling,
+            "open": _OPEN,
+            "close": _CLOSE,
+            "tokens": SNIPPET_TOKENS,
+            "limit": limit + 1 - len(rows),
+        }
+        if after_key is not None:
+            # bm25 scores are negative, more relevant first; ties broken by id
+            filters += (
+                "\nAND (bm25(messages_fts) > :after_rank "
+                "OR (bm25(messages_fts) = :after_rank AND m.id > :after_id))"
+            )
+            page_params["after_rank"], page_params["after_id"] = after_key
+        page = db.execute(text(_SEARCH_SQL.format(filters=filters)), page_params).mappings().all()
+        rows.extend((row, floor, ceiling) for row in page)
+        if len(rows) > limit or floor == 0:
+            break
+        # This window is used up: continue with the next older one
+        after_key, ceiling = None, floor
+        floor = _window_floor(db, params, scope, ceiling)
+
+    results = [
+        {
+            "id": row["id"],
+            "thread_id": row["thread_id"],
+            "room_name": row["room_name"],
+            "user_id": row["user_id"],
+            "sender": row["sender"],
+            "timestamp": row["timestamp"],
+            "snippet": render_snippet(row["snippet"]),
+            "rank": row["rank"],
+        }
+        for row, _floor, _ceiling in rows[:limit]
+    ]
+    next_after = None
+    if len(rows) > limit:
+        last, last_floor, last_ceiling = rows[limit - 1]
+        next_after = (last["rank"], last["id"], last_floor, last_ceiling)
+    return results, next_after
+
+
+def _fts_command(command: str):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('{command}')")
+
+
+def rebuild_index():
+    """Re-index every message from the messages table"""
+    _fts_command("rebuild")
+
+
+def optimize_index():
+    """Merge the index b-trees into one (faster queries after bulk writes)"""
+    _fts_command("optimize")
+
+
+if __name__ == "__main__":
+    if not SEARCH_AVAILABLE:
+        print("Message search needs SQLite (FTS5)")
+        sys.exit(1)
+    command = sys.argv[1] if len(sys.argv) > 1 else "rebuild"
+    actions = {"rebuild": rebuild_index, "optimize": optimize_index}
+    if command not in actions:
+        print("Usage: python message_search.py [rebuild|optimize]")
+        sys.exit(2)
+    started = time.perf_counter()
+    actions[command]()
+    print(f"Search index {command} done in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,64 @@
+"""
+Single write path for chat messages.
+
+Every writer (room posts, assistant replies, the legacy thread endpoints)
+goes through insert_message(), which inserts the row and, in the same
+transaction, bumps the room's denormalized activity counters with atomic
+`UPDATE threads SET total_messages = total_messages + 1 ...` and updates the
+members' read state. Nothing is read-modified-written in Python, so
+concurrent posts cannot lose increments and get_room_metrics stays a
+single-row read.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from models import Message, Thread
+from read_state import record_new_message
+
+
+def insert_message(
+    db: Session,
+    thread_id: int,
+    text: str,
+    sender: str,
+    user_id: Optional[int] = None,
+    ai_request: bool = False,
+    when: Optional[datetime] = None,
+) -> Message:
+    """
+    Insert a message and update its room's counters and read state.
+    `ai_request` counts the message toward Thread.total_ai_requests (assistant replies).
+    Does not commit; the caller commits once for the whole write.
+    Async handlers call it as `await db.run_sync(insert_message, ...)`.
+    """
+    when = when or datetime.utcnow()
+    message = Message(
+        thread_id=thread_id,
+        user_id=user_id,
+        sender=sender,
+        text=text,
+        timestamp=when,
+    )
+    db.add(message)
+    db.flush()
+
+    counters = {
+        "total_messages": func.coalesce(Thread.total_messages, 0) + 1,
+        "last_activity_at": when,
+        "updated_at": when,
+    }
+    if ai_request:
+        counters["total_ai_requests"] = func.coalesce(Thread.total_ai_requests, 0) + 1
+    db.execute(
+        update(Thread)
+        .where(Thread.id == thread_id)
+        .values(**counters)
+        .execution_options(synchronize_session=False)
+    )
+
+    record_new_message(db, message)
+    return message
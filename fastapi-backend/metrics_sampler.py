@@ -0,0 +1,213 @@
+"""
+Background sampler for host metrics.
+
+A single asyncio task samples CPU, memory, swap, disk and network counters
+every METRICS_SAMPLE_INTERVAL seconds (default 1) into a ring buffer holding
+METRICS_BUFFER_SECONDS of history (default 1h). psutil runs in a worker
+thread and cpu_percent(None) measures since the previous sample, so nothing
+sleeps on the event loop. The internet reachability probe (a TCP connect to
+a public DNS server) runs every METRICS_NETWORK_PROBE_INTERVAL seconds.
+
+The system endpoints read the latest sample, or min/avg/max over a window,
+without touching psutil themselves.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+METRICS_SAMPLE_INTERVAL = float(os.getenv("METRICS_SAMPLE_INTERVAL", "1"))
+METRICS_BUFFER_SECONDS = int(os.getenv("METRICS_BUFFER_SECONDS", "3600"))
+METRICS_NETWORK_PROBE_INTERVAL = float(os.getenv("METRICS_NETWORK_PROBE_INTERVAL", "30"))
+
+NETWORK_PROBE_ADDRESS = ("8.8.8.8", 53)
+NETWORK_PROBE_TIMEOUT = 1.5
+
+
+class MetricsSample(NamedTuple):
+    """One reading; rates are per second since the previous sample"""
+    timestamp: float  # time.time()
+    cpu: float
+    memory: float
+    memory_used: int
+    memory_available: int
+    swap: float
+    swap_used: int
+    disk: float
+    disk_used: int
+    disk_free: int
+    bytes_sent: int
+    bytes_recv: int
+    send_rate: float
+    recv_rate: float
+
+
+# Fields that min/avg/max can be asked for
+NUMERIC_FIELDS = tuple(name for name in MetricsSample._fields if name != "timestamp")
+DEFAULT_WINDOW_FIELDS = ("cpu", "memory", "disk", "send_rate", "recv_rate")
+
+
+def probe_network() -> Optional[float]:
+    """TCP connect time to a public DNS server in ms, None if unreachable (blocking; run in a thread)"""
+    started = time.perf_counter()
+    try:
+        socket.create_connection(NETWORK_PROBE_ADDRESS, timeout=NETWORK_PROBE_TIMEOUT).close()
+    except OSError:
+        return None
+    return (time.perf_counter() - started) * 1000
+
+
+class MetricsSampler:
+    """Samples host metrics on a fixed cadence into a ring buffer"""
+
+    def __init__(self, interval_seconds: Optional[float] = None, buffer_seconds: Optional[int] = None):
+        self.interval_seconds = interval_seconds if interval_seconds is not None else METRICS_SAMPLE_INTERVAL
+        buffer_seconds = buffer_seconds if buffer_seconds is not None else METRICS_BUFFER_SECONDS
+        self._samples: Deque[MetricsSample] = deque(maxlen=max(1, int(buffer_seconds / self.interval_seconds)))
+        # Totals and other slow-changing values, refreshed with the network probe
+        self.static: Dict[str, object] = {}
+        self.network_ok: Optional[bool] = None
+        self.network_latency_ms: Optional[float] = None
+        self._net_checked_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def _read(self) -> MetricsSample:
+        """Take one sample (blocking psutil calls; runs in a worker thread)"""
+        now = time.time()
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        disk = psutil.disk_usage('/')
+        net = psutil.net_io_counters()
+        send_rate = recv_rate = 0.0
+        previous = self._samples[-1] if self._samples else None
+        if previous is not None and now > previous.timestamp:
+            elapsed = now - previous.timestamp
+            # Counters can reset (interface restarted); don't report negative rates
+            send_rate = max(0, net.bytes_sent - previous.bytes_sent) / elapsed
+            recv_rate = max(0, net.bytes_recv - previous.bytes_recv) / elapsed
+        return MetricsSample(
+            timestamp=now,
+            cpu=psutil.cpu_percent(interval=None),
+            memory=memory.percent,
+            memory_used=memory.used,
+            memory_available=memory.available,
+            swap=swap.percent,
+            swap_used=swap.used,
+            disk=disk.percent,
+            disk_used=disk.used,
+            disk_free=disk.free,
+            bytes_sent=net.bytes_sent,
+            bytes_recv=net.bytes_recv,
+            send_rate=send_rate,
+            recv_rate=recv_rate,
+        )
+
+    def _read_static(self) -> Dict[str, object]:
+        cpu_freq = psutil.cpu_freq()
+        return {
+            "cpu_count": psutil.cpu_count(),
+            "cpu_freq_mhz": cpu_freq.current if cpu_freq else None,
+            "memory_total": psutil.virtual_memory().total,
+            "swap_total": psutil.swap_memory().total,
+            "disk_total": psutil.disk_usage('/').total,
+            "boot_time": psutil.boot_time(),
+        }
+
+    async def sample(self) -> MetricsSample:
+        """Take a sample now and append it to the buffer"""
+        sample = await asyncio.to_thread(self._read)
+        self._samples.append(sample)
+        return sample
+
+    async def _probe(self):
+        try:
+            self.static = await asyncio.to_thread(self._read_static)
+            self.network_latency_ms = await asyncio.to_thread(probe_network)
+            self.network_ok = self.network_latency_ms is not None
+        except Exception as e:
+            logger.warning(f"Metrics probe failed: {e}")
+        self._net_checked_at = time.monotonic()
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.sample()
+                probe_due = self._net_checked_at is None or started - self._net_checked_at >= METRICS_NETWORK_PROBE_INTERVAL
+                if probe_due and (self._probe_task is None or self._probe_task.done()):
+                    # Off the sampling path, so a slow probe doesn't delay samples
+                    self._net_checked_at = started
+                    self._probe_task = asyncio.create_task(self._probe())
+            except Exception as e:
+                logger.warning(f"Metrics sample failed: {e}")
+            # Fixed cadence: sleep what is left of the interval
+            await asyncio.sleep(max(0.0, self.interval_seconds - (time.monotonic() - started)))
+
+    def start(self):
+        """Start sampling (call from app startup)"""
+        if self._task is None or self._task.done():
+            # Prime psutil so the first cpu_percent(None) has a baseline
+            psutil.cpu_percent(interval=None)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the sampling loop (call from app shutdown)"""
+        for task in (self._task, self._probe_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._probe_task = None
+
+    def latest(self) -> Optional[MetricsSample]:
+        """Most recent sample, or None before the first one"""
+        return self._samples[-1] if self._samples else None
+
+    async def current(self) -> MetricsSample:
+        """Latest sample; takes one (and reads the totals) if the sampler has not run yet"""
+        if not self.static:
+            self.static = await asyncio.to_thread(self._read_static)
+        return self.latest() or await self.sample()
+
+    def samples(self, seconds: float) -> List[MetricsSample]:
+        """Samples from the last `seconds`, oldest first"""
+        cutoff = time.time() - seconds
+        recent = []
+        # Newest at the right; stop at the first sample outside the window
+        for sample in reversed(self._samples):
+            if sample.timestamp < cutoff:
+                break
+            recent.append(sample)
+        recent.reverse()
+        return recent
+
+    def window(self, seconds: float, fields: Iterable[str] = DEFAULT_WINDOW_FIELDS) -> dict:
+        """{"seconds", "samples", field: {"min", "avg", "max"}} over the last `seconds`"""
+        recent = self.samples(seconds)
+        result = {"seconds": seconds, "samples": len(recent)}
+        for field in fields:
+            values = [getattr(sample, field) for sample in recent]
+            result[field] = (
+                {"min": round(min(values), 2), "avg": round(sum(values) / len(values), 2), "max": round(max(values), 2)}
+                if values else None
+            )
+        return result
+
+    @property
+    def buffer_seconds(self) -> float:
+        return self._samples.maxlen * self.interval_seconds
+
+
+# Process-wide sampler, started in main.lifespan
+metrics_sampler = MetricsSampler()
@@ -0,0 +1,285 @@
+"""
+Tiered time-series history for host metrics and latencies.
+
+Points live in the metric_points table (alembic revision 0005), one row per
+series, resolution and time bucket holding count, total, minimum and maximum,
+so averages survive rollups exactly. Retention is tiered:
+
+    1 s buckets   kept for 1 hour
+    1 min buckets kept for 1 day
+    1 h buckets   kept for 1 year
+
+Series:
+    host.<field>           metrics sampler readings (cpu, memory, disk, send_rate, recv_rate)
+    route.<METHOD> <path>  HTTP request latency in ms, by route template
+    ai.<provider>.<stat>   AI response latency in ms (total_ms, ttft_ms)
+
+Latencies are recorded in memory in O(1). Every METRICS_FLUSH_INTERVAL seconds
+(default 10) a background task started in main.lifespan writes the pending
+second buckets and the new sampler readings in one transaction, rolls
+finished minutes and hours up into the coarser tiers and deletes what has
+aged out of each tier.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database import IS_SQLITE, SessionLocal
+from metrics_sampler import metrics_sampler
+
+logger = logging.getLogger(__name__)
+
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "10"))
+# Points returned per series by one range query, at most
+METRICS_HISTORY_MAX_POINTS = int(os.getenv("METRICS_HISTORY_MAX_POINTS", "1500"))
+
+# (resolution, retention) in seconds, finest first; each tier is rolled up from the previous one
+TIERS = ((1, 3600), (60, 86400), (3600, 365 * 86400))
+RESOLUTIONS = tuple(resolution for resolution, _retention in TIERS)
+
+HOST_FIELDS = ("cpu", "memory", "disk", "send_rate", "recv_rate")
+
+# A bucket is rolled up this long after it ends, so late observations still land in it
+ROLLUP_GRACE = 2
+
+# Two-argument min/max
+_LEAST, _GREATEST = ("MIN", "MAX") if IS_SQLITE else ("LEAST", "GREATEST")
+
+_UPSERT_SQL = f"""
+INSERT INTO metric_points (series, resolution, bucket, count, total, minimum, maximum)
+VALUES (:series, :resolution, :bucket, :count, :total, :minimum, :maximum)
+ON CONFLICT (series, resolution, bucket) DO UPDATE SET
+    count = metric_points.count + excluded.count,
+    total = metric_points.total + excluded.total,
+    minimum = {_LEAST}(metric_points.minimum, excluded.minimum),
+    maximum = {_GREATEST}(metric_points.maximum, excluded.maximum)
+"""
+
+# Recomputes the coarser buckets from scratch, so rolling a range twice is harmless
+_ROLLUP_SQL = """
+INSERT INTO metric_points (series, resolution, bucket, count, total, minimum, maximum)
+SELECT series, :resolution, (bucket / :resolution) * :resolution,
+       SUM(count), SUM(total), MIN(minimum), MAX(maximum)
+FROM metric_points
+WHERE resolution = :source AND bucket >= :start AND bucket < :end
+GROUP BY series, (bucket / :resolution) * :resolution
+ON CONFLICT (series, resolution, bucket) DO UPDATE SET
+    count = excluded.count,
+    total = excluded.total,
+    minimum = excluded.minimum,
+    maximum = excluded.maximum
+"""
+
+_RANGE_SQL = """
+SELECT bucket, count, total, minimum, maximum
+FROM metric_points
+WHERE series = :series AND resolution = :resolution AND bucket >= :start AND bucket <= :end
+ORDER BY bucket
+"""
+
+
+def _floor(timestamp: float, resolution: int) -> int:
+    return int(timestamp) // resolution * resolution
+
+
+def pick_resolution(start: float, end: float, now: Optional[float] = None) -> int:
+    """Finest tier that still holds `start` and needs at most METRICS_HISTORY_MAX_POINTS points"""
+    now = now if now is not None else time.time()
+    for resolution, retention in TIERS:
+        # A minute of slack: "the last 24h" computed by the client is a little older by now
+        if start >= now - retention - 60 and (end - start) / resolution <= METRICS_HISTORY_MAX_POINTS:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+class MetricsStore:
+    """Write-behind recorder and reader for the metric_points tiers"""
+
+    def __init__(self, flush_interval: Optional[float] = None):
+        self.flush_interval = flush_interval if flush_interval is not None else METRICS_FLUSH_INTERVAL
+        # (series, second) -> [count, total, minimum, maximum]
+        self._pending: Dict[Tuple[str, int], List[float]] = {}
+        self._lock = threading.Lock()
+        # Timestamp of the last sampler reading written
+        self._sampler_mark = 0.0
+        # resolution -> start of the next bucket to roll up (None = read from the table)
+        self._rolled: Dict[int, Optional[int]] = {resolution: None for resolution in RESOLUTIONS[1:]}
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"recorded": 0, "flushes": 0, "rows_written": 0, "rollups": 0, "rows_expired": 0}
+
+    def record(self, series: str, value: float, when: Optional[float] = None):
+        """Add one observation to its one-second bucket (no I/O; safe from any thread)"""
+        key = (series, int(when if when is not None else time.time()))
+        with self._lock:
+            point = self._pending.get(key)
+            if point is None:
+                self._pending[key] = [1, value, value, value]
+            else:
+                point[0] += 1
+                point[1] += value
+                if value < point[2]:
+                    point[2] = value
+                if value > point[3]:
+                    point[3] = value
+            self.counters["recorded"] += 1
+
+    def _take_pending(self) -> List[dict]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        rows = [
+            {"series": series, "resolution": 1, "bucket": second,
+             "count": count, "total": total, "minimum": minimum, "maximum": maximum}
+            for (series, second), (count, total, minimum, maximum) in pending.items()
+        ]
+        samples = [sample for sample in metrics_sampler.samples(metrics_sampler.buffer_seconds)
+                   if sample.timestamp > self._sampler_mark]
+        for sample in samples:
+            for field in HOST_FIELDS:
+                value = getattr(sample, field)
+                rows.append({"series": f"host.{field}", "resolution": 1, "bucket": int(sample.timestamp),
+                             "count": 1, "total": value, "minimum": value, "maximum": value})
+        if samples:
+            self._sampler_mark = samples[-1].timestamp
+        return rows
+
+    def _rollup(self, db: Session, now: float):
+        for (source, _retention), (resolution, _) in zip(TIERS, TIERS[1:]):
+            start = self._rolled[resolution]
+            if start is None:
+                # Resume after a restart: redo the newest rolled bucket, or start at the oldest source data
+                start = db.execute(
+                    text("SELECT MAX(bucket) FROM metric_points WHERE resolution = :resolution"),
+                    {"resolution": resolution},
+                ).scalar()
+                if start is None:
+                    oldest = db.execute(
+                        text("SELECT MIN(bucket) FROM metric_points WHERE resolution = :source"),
+                        {"source": source},
+                    ).scalar()
+                    start = _floor(oldest if oldest is not None else now, resolution)
+            # Only buckets that have ended (their source data is all written)
+            end = _floor(now - ROLLUP_GRACE, resolution)
+            if end > start:
+                db.execute(text(_ROLLUP_SQL), {"resolution": resolution, "source": source, "start": start, "end": end})
+                self.counters["rollups"] += 1
+                start = end
+            self._rolled[resolution] = start
+
+    def _expire(self, db: Session, now: float):
+        for index, (resolution, retention) in enumerate(TIERS):
+            # Whole buckets of the next tier, so a roll-up never sees half of one
+            step = TIERS[index + 1][0] if index + 1 < len(TIERS) else resolution
+            result = db.execute(
+                text("DELETE FROM metric_points WHERE resolution = :resolution AND bucket < :cutoff"),
+                {"resolution": resolution, "cutoff": _floor(now - retention, step)},
+            )
+            self.counters["rows_expired"] += result.rowcount or 0
+
+    def flush(self, db: Session) -> int:
+        """Write pending points, roll up finished buckets and expire old ones (one transaction)"""
+        now = time.time()
+        rows = self._take_pending()
+        try:
+            if rows:
+                db.execute(text(_UPSERT_SQL), rows)
+            self._rollup(db, now)
+            self._expire(db, now)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Re-read the roll-up positions next time; the points themselves are dropped
+            self._rolled = {resolution: None for resolution in RESOLUTIONS[1:]}
+            raise
+        self.counters["flushes"] += 1
+        self.counters["rows_written"] += len(rows)
+        return len(rows)
+
+    def flush_now(self) -> int:
+        db = SessionLocal()
+        try:
+            return self.flush(db)
+        finally:
+            db.close()
+
+    def query(self, db: Session, series: str, start: float, end: float, resolution: Optional[int] = None) -> dict:
+        """Points of one series in [start, end]; resolution picked from the tiers when not given"""
+        resolution = resolution or pick_resolution(start, end)
+        rows = db.execute(
+            text(_RANGE_SQL),
+            {"series": series, "resolution": resolution,
+             "start": _floor(start, resolution), "end": int(end)},
+        ).all()
+        return {
+            "series": series,
+            "resolution": resolution,
+            "points": [
+                {"t": bucket, "avg": round(total / count, 3), "min": minimum, "max": maximum, "count": count}
+                for bucket, count, total, minimum, maximum in rows
+            ],
+        }
+
+    def series_names(self, db: Session) -> List[str]:
+        return [row[0] for row in db.execute(text("SELECT DISTINCT series FROM metric_points ORDER BY series"))]
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {**self.counters, "pending": pending, "flush_interval": self.flush_interval}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush_now)
+            except Exception as e:
+                logger.warning(f"Metrics flush failed: {e}")
+
+    def start(self):
+        """Start the periodic flush (call from app startup)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush and write whatever is still pending (call from app shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await asyncio.to_thread(self.flush_now)
+        except Exception as e:
+            logger.warning(f"Final metrics flush failed: {e}")
+
+
+# Process-wide store, started in main.lifespan
+metrics_store = MetricsStore()
+
+
+class RouteLatencyMiddleware:
+    """ASGI middleware recording each HTTP request's latency as route.<METHOD> <path template>"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Set by FastAPI once a route matched; unmatched paths (404s, preflights) are not recorded
+            route = scope.get("route")
+            if route is not None:
+                metrics_store.record(f"route.{scope['method']} {route.path}", (time.perf_counter() - started) * 1000)
@@ -1,42 +1,14 @@
 """
-Migration: Add Tailscale device tracking to devices table
-Also seeds the three test devices for multi-user testing
+Seeds the three test devices for multi-user testing
+The Tailscale columns on devices are part of the Alembic chain (revision 0001).
 """
 
-from sqlalchemy import text
-from database import engine, SessionLocal
+from database import SessionLocal
+from migrations import upgrade_to_head
 from models import User, Device
 from datetime import datetime
 
 
-def migrate():
-    """Add Tailscale columns to devices table"""
-    with engine.connect() as conn:
-        # Add Tailscale columns
-        try:
-            conn.execute(text("ALTER TABLE devices ADD COLUMN tailscale_ip VARCHAR(50)"))
-            conn.execute(text("CREATE UNIQUE INDEX idx_devices_tailscale_ip ON devices(tailscale_ip)"))
-            print("✓ Added tailscale_ip column")
-        except Exception as e:
-            print(f"  tailscale_ip column may already exist: {e}")
-        
-        try:
-            conn.execute(text("ALTER TABLE devices ADD COLUMN tailscale_hostname VARCHAR(100)"))
-            print("✓ Added tailscale_hostname column")
-        except Exception as e:
-            print(f"  tailscale_hostname column may already exist: {e}")
-        
-        try:
-            conn.execute(text("ALTER TABLE devices ADD COLUMN is_tailscale_device BOOLEAN DEFAULT 0"))
-            print("✓ Added is_tailscale_device column")
-        except Exception as e:
-            print(f"  is_tailscale_device column may already exist: {e}")
-        
-        conn.commit()
-    
-    print("\n✓ Migration complete!")
-
-
 def seed_tailscale_devices():
     """Seed the three test devices for multi-user testing"""
     db = SessionLocal()
@@ -153,6 +125,6 @@ def seed_tailscale_devices():
 
 if __name__ == "__main__":
     print("=== Tailscale Device Migration ===\n")
-    migrate()
+    upgrade_to_head()
     print("\n=== Seeding Test Devices ===\n")
     seed_tailscale_devices()
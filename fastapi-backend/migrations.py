@@ -0,0 +1,74 @@
+"""
+Schema migrations (Alembic, see alembic/versions/).
+
+`python migrations.py` upgrades DATABASE_URL to the newest revision, the same
+as `alembic upgrade head`. At startup main.lifespan calls ensure_schema(),
+which costs one SELECT when the schema is current. Nothing runs at import.
+"""
+
+import os
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+
+from database import engine
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+# Upgrade a behind schema at startup. Set to false when several workers share
+# one database and migrations run as a deploy step (start.sh does both).
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+
+
+def alembic_config(configure_logger: bool = True) -> Config:
+    config = Config(ALEMBIC_INI)
+    # Inside the server the app's logging setup is kept as is
+    config.attributes["configure_logger"] = configure_logger
+    return config
+
+
+def upgrade_to_head(configure_logger: bool = True):
+    command.upgrade(alembic_config(configure_logger), "head")
+
+
+def schema_status() -> dict:
+    """Current and newest revision, without touching the schema"""
+    head = ScriptDirectory.from_config(alembic_config()).get_current_head()
+    with engine.connect() as conn:
+        current = MigrationContext.configure(conn).get_current_revision()
+    return {"current": current, "head": head, "up_to_date": current == head}
+
+
+def ensure_schema():
+    """
+    Startup check: upgrade when behind (DB_AUTO_MIGRATE), otherwise just warn.
+    A failed upgrade stops startup rather than serving a half-migrated schema.
+    """
+    try:
+        status = schema_status()
+    except Exception as e:
+        print(f"⚠️  Schema check failed: {e}")
+        return
+    if status["up_to_date"]:
+        print(f"🧱 Schema revision {status['current']} (current)")
+        return
+    if not DB_AUTO_MIGRATE:
+        print(
+            f"⚠️  Schema revision {status['current'] or 'none'}, code expects {status['head']}. "
+            "Run: alembic upgrade head"
+        )
+        return
+    print(f"🧱 Upgrading schema {status['current'] or 'none'} -> {status['head']}...")
+    try:
+        upgrade_to_head(configure_logger=False)
+    except Exception as e:
+        print(f"❌ Schema upgrade to {status['head']} failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    upgrade_to_head()
+    status = schema_status()
+    print(f"Schema at revision {status['current']} (head {status['head']})")
@@ -0,0 +1,133 @@
+"""
+Memoized OpenAI model catalogue.
+
+The account's model list is cached per API-key fingerprint for
+OPENAI_MODELS_TTL seconds (default 1h). Once stale, the old list keeps being
+served while a background task refreshes it. Models that recently came back
+"not found" are kept in a negative cache for OPENAI_MODEL_MISS_TTL seconds
+(default 10m) so the OPENAI_MODEL_PRIORITY fallback chain skips them.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from openai import AsyncOpenAI
+
+from provider_clients import key_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# A failed listing is retried sooner than a successful one is refreshed
+FAILED_LIST_TTL = 60.0
+
+
+def is_model_not_found_error(err_str: str) -> bool:
+    """Heuristic for OpenAI 'model does not exist / not found / not available' errors (lowercased input)"""
+    return "model" in err_str and "not" in err_str and ("found" in err_str or "exist" in err_str or "available" in err_str)
+
+
+class OpenAIModelCatalog:
+    """Per-key cache of available model ids plus a negative cache of missing models"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None, miss_ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("OPENAI_MODELS_TTL", "3600"))
+        self.miss_ttl_seconds = miss_ttl_seconds if miss_ttl_seconds is not None else float(os.getenv("OPENAI_MODEL_MISS_TTL", "600"))
+        # fingerprint -> (model ids, expires_at)
+        self._models: Dict[str, Tuple[FrozenSet[str], float]] = {}
+        # (fingerprint, model) -> expires_at
+        self._missing: Dict[Tuple[str, str], float] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "upstream_calls": 0,
+            "upstream_errors": 0,
+            "negative_hits": 0,
+        }
+
+    async def get_models(self, client: AsyncOpenAI, api_key: str) -> FrozenSet[str]:
+        """
+        Model ids visible to this key. Empty if the listing failed (callers treat
+        that as "unknown" and just try the model).
+        """
+        fingerprint = key_fingerprint(api_key)
+        entry = self._models.get(fingerprint)
+        now = time.monotonic()
+        if entry is not None:
+            models, expires_at = entry
+            if now < expires_at:
+                self.counters["hits"] += 1
+            else:
+                # Serve the stale list and refresh in the background
+                self.counters["stale_hits"] += 1
+                self._start_fetch(client, fingerprint)
+            return models
+
+        self.counters["misses"] += 1
+        return await asyncio.shield(self._start_fetch(client, fingerprint))
+
+    def is_missing(self, api_key: str, model: str) -> bool:
+        """True if `model` recently returned not-found for this key"""
+        key = (key_fingerprint(api_key), model)
+        expires_at = self._missing.get(key)
+        if expires_at is None:
+            return False
+        if time.monotonic() >= expires_at:
+            del self._missing[key]
+            return False
+        self.counters["negative_hits"] += 1
+        return True
+
+    def mark_missing(self, api_key: str, model: str):
+        """Remember that `model` is not available to this key"""
+        self._missing[(key_fingerprint(api_key), model)] = time.monotonic() + self.miss_ttl_seconds
+
+    def invalidate(self, api_key: Optional[str] = None):
+        """Forget cached listings (all keys, or just one)"""
+        if api_key is None:
+            self._models.clear()
+            self._missing.clear()
+            return
+        fingerprint = key_fingerprint(api_key)
+        self._models.pop(fingerprint, None)
+        for key in [k for k in self._missing if k[0] == fingerprint]:
+            del self._missing[key]
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "cached_keys": len(self._models),
+            "negative_entries": len(self._missing),
+        }
+
+    def _start_fetch(self, client: AsyncOpenAI, fingerprint: str) -> asyncio.Task:
+        """Single-flight: concurrent callers for the same key share one upstream listing"""
+        task = self._inflight.get(fingerprint)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._fetch(client, fingerprint))
+            self._inflight[fingerprint] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(fingerprint, None))
+        return task
+
+    async def _fetch(self, client: AsyncOpenAI, fingerprint: str) -> FrozenSet[str]:
+        self.counters["upstream_calls"] += 1
+        try:
+            page = await client.models.list()
+            models = frozenset(m.id for m in page.data if isinstance(getattr(m, "id", None), str))
+            ttl = self.ttl_seconds
+        except Exception as e:
+            logger.warning(f"OpenAI model list failed (non-fatal): {e}")
+            self.counters["upstream_errors"] += 1
+            previous = self._models.get(fingerprint)
+            models = previous[0] if previous else frozenset()
+            ttl = FAILED_LIST_TTL
+        self._models[fingerprint] = (models, time.monotonic() + ttl)
+        return models
+
+
+# Process-wide catalogue shared by chat and connection tests
+openai_model_catalog = OpenAIModelCatalog()
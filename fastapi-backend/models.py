@@ -2,7 +2,7 @@
 Database models for the admin panel
 """
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Float
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -54,6 +54,11 @@ class Device(Base):
     # Relationships
     user = relationship("User", back_populates="user_devices")
 
+    __table_args__ = (
+        # A user's most recent active device (user list, presence directory)
+        Index("ix_devices_user_id_is_active_last_active", "user_id", "is_active", "last_active"),
+    )
+
 
 class Invite(Base):
     """Invite code model"""
@@ -111,6 +116,11 @@ class Message(Base):
     thread = relationship("Thread", back_populates="messages")
     user = relationship("User", back_populates="messages")
 
+    __table_args__ = (
+        # Keyset pagination of room history (alembic revision 0003)
+        Index("ix_messages_thread_id_id", "thread_id", "id"),
+    )
+
 
 class RoomMember(Base):
     """Room membership model - links users to threads/rooms"""
@@ -122,10 +132,22 @@ class RoomMember(Base):
     role = Column(String(20), default="member")  # owner, admin, member
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Read state (see read_state.py)
+    last_read_message_id = Column(Integer, nullable=True)  # Newest message this member has read
+    unread_count = Column(Integer, default=0)  # Maintained incrementally on every insert
+
     # Relationships
     thread = relationship("Thread", back_populates="members")
     user = relationship("User", back_populates="memberships")
 
+    __table_args__ = (
+        # "My rooms" lookups (list_rooms, unread counts)
+        Index("ix_room_members_user_id", "user_id"),
+        # One row per member; also serves member lookups per room and the
+        # orphaned-room check in list_rooms
+        Index("ux_room_members_thread_id_user_id", "thread_id", "user_id", unique=True),
+    )
+
 
 class Connection(Base):
     """API Connections configuration"""
@@ -198,3 +220,26 @@ class Notification(Base):
     read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     from_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+
+    __table_args__ = (
+        # Unread notifications per user
+        Index("ix_notifications_user_id_read", "user_id", "read"),
+    )
+
+
+class MetricPoint(Base):
+    """Aggregated metric observations per series, resolution and time bucket (see metrics_store.py)"""
+    __tablename__ = "metric_points"
+
+    series = Column(String(200), primary_key=True)
+    resolution = Column(Integer, primary_key=True)  # bucket width in seconds: 1, 60, 3600
+    bucket = Column(Integer, primary_key=True)  # bucket start, unix seconds
+    count = Column(Integer, nullable=False)
+    total = Column(Float, nullable=False)
+    minimum = Column(Float, nullable=False)
+    maximum = Column(Float, nullable=False)
+
+    __table_args__ = (
+        # Roll-ups and retention work on one tier's time range
+        Index("ix_metric_points_resolution_bucket", "resolution", "bucket"),
+    )
@@ -0,0 +1,9 @@
+"""
+Ollama defaults shared by the schemas, the Connections routes and the model
+warm pool (ollama_models), so none of them imports the pool to read them.
+"""
+
+import os
+
+# Default model when neither the request nor Connections names one
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
@@ -0,0 +1,275 @@
+"""
+Ollama model warm pool.
+
+Ollama loads a model from disk on its first request and unloads it after
+five idle minutes, so the first chat after a quiet spell used to wait for the
+whole load. The configured default models (OLLAMA_MODEL, OLLAMA_WARM_MODELS
+and the model set in Connections) are loaded at startup with a long
+keep_alive, and loaded again whenever an endpoint comes back online (Ollama
+restarted by the tray, or started after the backend).
+
+A background task polls /api/ps every OLLAMA_PS_INTERVAL seconds (default 30)
+to know which models are resident, and announces an endpoint going offline
+or coming back as a provider_status event on the WebSocket hub. Requests that
+don't pin a model go to the endpoint's default if it is loaded, otherwise to
+a pool model that already is. Other resident models (embedding models, say)
+are never picked.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+import httpx
+from sqlalchemy.orm import Session
+
+from models import Connection
+from ollama_config import OLLAMA_MODEL
+from provider_clients import DEFAULT_OLLAMA_URL, normalize_url, provider_clients
+from websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+# Models kept resident on every managed endpoint (comma-separated; empty = only the Connections model)
+OLLAMA_WARM_MODELS = [
+    name.strip() for name in os.getenv("OLLAMA_WARM_MODELS", OLLAMA_MODEL).split(",") if name.strip()
+]
+OLLAMA_PS_INTERVAL = float(os.getenv("OLLAMA_PS_INTERVAL", "30"))
+
+
+def _keep_alive_setting(raw: str) -> Union[int, str]:
+    # Ollama takes a duration string ("30m") or a number of seconds (negative = no expiry)
+    try:
+        return int(raw)
+    except ValueError:
+        return raw
+
+
+# How long warm-pool models stay loaded after their last request
+# (-1 = until Ollama restarts or needs the memory for another model)
+OLLAMA_KEEP_ALIVE = _keep_alive_setting(os.getenv("OLLAMA_KEEP_ALIVE", "-1"))
+
+# Loading a large model from a cold disk can take minutes
+WARM_TIMEOUT = httpx.Timeout(300.0, connect=5.0)
+PS_TIMEOUT = 5.0
+
+
+def canonical_model(name: str) -> str:
+    """Ollama reports untagged models as name:latest"""
+    return name if ":" in name else f"{name}:latest"
+
+
+class EndpointState:
+    """Warm pool and last /api/ps result for one Ollama endpoint"""
+
+    def __init__(self, pool: List[str]):
+        self.pool = pool
+        self.online: Optional[bool] = None
+        # canonical name -> name as Ollama reports it
+        self.loaded: Dict[str, str] = {}
+        self.checked_at: Optional[float] = None
+
+    @property
+    def default_model(self) -> str:
+        return self.pool[0] if self.pool else OLLAMA_MODEL
+
+
+class OllamaModelManager:
+    """Keeps the default models loaded and routes unpinned requests to resident ones"""
+
+    def __init__(self, interval_seconds: Optional[float] = None):
+        self.interval_seconds = interval_seconds if interval_seconds is not None else OLLAMA_PS_INTERVAL
+        self._endpoints: Dict[str, EndpointState] = {}
+        self._warming: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            "ps_polls": 0,
+            "ps_errors": 0,
+            "warms": 0,
+            "warm_errors": 0,
+            "routed_to_loaded": 0,
+        }
+
+    def configure(self, base_url: Optional[str], model: Optional[str] = None):
+        """Manage an endpoint; `model` (its Connections model) goes first in its pool"""
+        url = normalize_url(base_url)
+        pool = []
+        for name in ([model] if model else []) + OLLAMA_WARM_MODELS:
+            if canonical_model(name) not in {canonical_model(p) for p in pool}:
+                pool.append(name)
+        state = self._endpoints.get(url)
+        if state is None:
+            self._endpoints[url] = EndpointState(pool)
+        else:
+            state.pool = pool
+            # Load a newly configured model right away if the endpoint is up
+            if state.online:
+                self._warm_pool(url, state)
+
+    def configure_from_db(self, db: Session):
+        """Manage the default endpoint and the one configured in Connections"""
+        self.configure(DEFAULT_OLLAMA_URL)
+        conn = db.query(Connection).filter(Connection.service == "ollama").first()
+        if conn is None or not conn.enabled:
+            return
+        try:
+            config = json.loads(conn.config) if conn.config else {}
+        except ValueError:
+            config = {}
+        self.configure(config.get("endpoint"), config.get("model"))
+
+    def forget(self, base_url: Optional[str]):
+        """Stop managing an endpoint (its Connections endpoint changed)"""
+        self._endpoints.pop(normalize_url(base_url), None)
+
+    def default_model(self, base_url: Optional[str]) -> str:
+        state = self._endpoints.get(normalize_url(base_url))
+        return state.default_model if state is not None else OLLAMA_MODEL
+
+    def resolve(self, base_url: Optional[str], pinned: Optional[str] = None) -> str:
+        """
+        Model for a request: the pinned one if given, else the endpoint's
+        default if it is loaded, else a loaded pool model. Falls back to the
+        default (Ollama loads it) when no pool model is loaded.
+        """
+        if pinned:
+            return pinned
+        state = self._endpoints.get(normalize_url(base_url))
+        if state is None:
+            return OLLAMA_MODEL
+        default = state.default_model
+        if not state.loaded or canonical_model(default) in state.loaded:
+            return default
+        for name in state.pool:
+            if canonical_model(name) in state.loaded:
+                self.counters["routed_to_loaded"] += 1
+                return name
+        return default
+
+    def payload(self, base_url: Optional[str], model: str, payload: dict) -> dict:
+        """
+        Add keep_alive to a request for a pool model. Every request resets the
+        model's expiry, so one sent without it would drop the model back to
+        Ollama's five minutes; other models keep Ollama's default.
+        """
+        state = self._endpoints.get(normalize_url(base_url))
+        if state is not None and canonical_model(model) in {canonical_model(p) for p in state.pool}:
+            payload["keep_alive"] = OLLAMA_KEEP_ALIVE
+        return payload
+
+    def mark_used(self, base_url: Optional[str], model: str):
+        """A request just succeeded on `model`, so Ollama has it loaded"""
+        state = self._endpoints.get(normalize_url(base_url))
+        if state is not None:
+            state.loaded.setdefault(canonical_model(model), model)
+
+    async def refresh(self, base_url: str):
+        """Read the resident models from /api/ps; warm the pool when the endpoint (re)appears"""
+        url = normalize_url(base_url)
+        state = self._endpoints.get(url)
+        if state is None:
+            return
+        self.counters["ps_polls"] += 1
+        try:
+            response = await provider_clients.http(url).get("/api/ps", timeout=PS_TIMEOUT)
+            response.raise_for_status()
+            models = response.json().get("models", [])
+        except Exception as e:
+            if state.online is not False:
+                logger.info(f"Ollama at {url} unreachable: {e}")
+                manager.emit_global("provider_status", {"provider": "ollama", "url": url, "status": "offline"})
+            self.counters["ps_errors"] += 1
+            state.online = False
+            state.loaded = {}
+            return
+
+        came_up = not state.online
+        state.online = True
+        names = [m.get("name") or m.get("model") for m in models]
+        state.loaded = {canonical_model(name): name for name in names if name}
+        state.checked_at = time.monotonic()
+        if came_up:
+            manager.emit_global("provider_status", {"provider": "ollama", "url": url, "status": "online"})
+            self._warm_pool(url, state)
+
+    def _warm_pool(self, url: str, state: EndpointState):
+        for name in state.pool:
+            if canonical_model(name) not in state.loaded:
+                self.warm(url, name)
+
+    def warm(self, base_url: Optional[str], model: str) -> asyncio.Task:
+        """Load `model` in the background (single flight per endpoint and model)"""
+        key = (normalize_url(base_url), canonical_model(model))
+        task = self._warming.get(key)
+        if task is None or task.done():
+            task = self._warming[key] = asyncio.create_task(self._warm(key[0], model))
+        return task
+
+    async def _warm(self, url: str, model: str):
+        # A generate request without a prompt only loads the model
+        started = time.perf_counter()
+        try:
+            response = await provider_clients.http(url).post(
+                "/api/generate",
+                json={"model": model, "keep_alive": OLLAMA_KEEP_ALIVE},
+                timeout=WARM_TIMEOUT,
+            )
+            response.raise_for_status()
+        except Exception as e:
+            self.counters["warm_errors"] += 1
+            logger.warning(f"Could not warm Ollama model {model} at {url}: {e}")
+            return
+        self.counters["warms"] += 1
+        self.mark_used(url, model)
+        logger.info(f"Ollama model {model} loaded at {url} in {time.perf_counter() - started:.1f}s")
+
+    async def _run(self):
+        while True:
+            for url in list(self._endpoints):
+                try:
+                    await self.refresh(url)
+                except Exception as e:
+                    logger.warning(f"Ollama model poll failed for {url}: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        """Start polling (and the first warm-up) (call from app startup)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the poll loop and any warm-up still running (call from app shutdown)"""
+        tasks = [task for task in [self._task, *self._warming.values()] if task is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._warming.clear()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "endpoints": {
+                url: {
+                    "online": state.online,
+                    "default_model": state.default_model,
+                    "pool": state.pool,
+                    "loaded": sorted(state.loaded.values()),
+                    "checked_seconds_ago": round(now - state.checked_at, 1) if state.checked_at is not None else None,
+                }
+                for url, state in self._endpoints.items()
+            },
+            **self.counters,
+        }
+
+
+# Process-wide manager, configured and started in main.lifespan
+ollama_models = OllamaModelManager()
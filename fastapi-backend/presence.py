@@ -0,0 +1,410 @@
+"""
+Write-behind presence store.
+
+Heartbeats, Tailscale identity hits and activity pings are recorded in memory
+in O(1) with no database access. Every PRESENCE_FLUSH_INTERVAL seconds
+(default 15) a background task started in main.lifespan writes the batched
+Device.last_active / User.status updates in one transaction. The user/device
+directory is reloaded after routes that add, edit or remove users and devices
+call invalidate(), and every PRESENCE_RELOAD_INTERVAL seconds (default 300)
+for changes made elsewhere. The presence endpoints (/active/tailscale,
+/{user_id}/presence, /admin/summary) are served from memory.
+
+After each flush, a presence_changed event goes out over the WebSocket hub
+when a user came online or went offline, or users or Tailscale devices were
+added or removed, so clients refetch only then instead of polling.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Device, User
+from websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+ONLINE_WINDOW = timedelta(minutes=5)
+AWAY_WINDOW = timedelta(hours=1)
+ACTIVE_WINDOW = timedelta(hours=24)
+
+
+class DevicePresence:
+    __slots__ = ("id", "user_id", "device_name", "device_type", "tailscale_ip",
+                 "tailscale_hostname", "is_tailscale_device", "is_active", "last_active")
+
+    def __init__(self, device: Device):
+        self.id = device.id
+        self.user_id = device.user_id
+        self.device_name = device.device_name
+        self.device_type = device.device_type
+        self.tailscale_ip = device.tailscale_ip
+        self.tailscale_hostname = device.tailscale_hostname
+        self.is_tailscale_device = bool(device.is_tailscale_device)
+        self.is_active = bool(device.is_active)
+        self.last_active = device.last_active
+
+
+class UserPresence:
+    __slots__ = ("id", "name", "handle", "email", "role", "last_active")
+
+    def __init__(self, user: User):
+        self.id = user.id
+        self.name = user.name
+        self.handle = user.handle
+        self.email = user.email
+        self.role = user.role
+        # Activity without a known device (e.g. /activity pings); in memory only
+        self.last_active: Optional[datetime] = None
+
+
+def last_seen_label(last_active: Optional[datetime], now: Optional[datetime] = None) -> str:
+    if not last_active:
+        return "Never"
+    time_diff = (now or datetime.utcnow()) - last_active
+    if time_diff < timedelta(minutes=1):
+        return "Just now"
+    if time_diff < timedelta(minutes=60):
+        return f"{int(time_diff.total_seconds() / 60)}m ago"
+    if time_diff < timedelta(hours=24):
+        return f"{int(time_diff.total_seconds() / 3600)}h ago"
+    return f"{int(time_diff.total_seconds() / 86400)}d ago"
+
+
+class PresenceStore:
+    """In-memory presence with batched write-behind to SQLite"""
+
+    def __init__(self, flush_interval: Optional[float] = None):
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.getenv("PRESENCE_FLUSH_INTERVAL", "15"))
+        self.reload_interval = float(os.getenv("PRESENCE_RELOAD_INTERVAL", "300"))
+        self._devices: Dict[int, DevicePresence] = {}
+        self._devices_by_user: Dict[int, List[DevicePresence]] = {}
+        self._users: Dict[int, UserPresence] = {}
+        # tailscale_ip -> device id, over every device (lowest id first) and over Tailscale devices only
+        self._device_by_ip: Dict[str, int] = {}
+        self._tailscale_device_by_ip: Dict[str, int] = {}
+        # Pending writes: device_id -> newest activity time, users to mark online
+        self._dirty_devices: Dict[int, datetime] = {}
+        self._dirty_users: Set[int] = set()
+        # Route handlers run in the threadpool
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.loaded = False
+        # Directory changed in the database since the last load
+        self._stale = False
+        self._loaded_at = 0.0
+        self.reloads = 0
+        # (user ids, Tailscale device ids, online user ids) last published
+        self._published: Optional[Tuple[FrozenSet[int], FrozenSet[int], FrozenSet[int]]] = None
+        self.heartbeats = 0
+        self.flushes = 0
+        self.rows_written = 0
+
+    # ---------- Writes (O(1), memory only) ----------
+
+    def touch(self, device_id: Optional[int], user_id: Optional[int] = None, when: Optional[datetime] = None):
+        """Record activity for a device (and mark its user online)"""
+        when = when or datetime.utcnow()
+        with self._lock:
+            self.heartbeats += 1
+            if device_id is not None:
+                previous = self._dirty_devices.get(device_id)
+                if previous is None or when > previous:
+                    self._dirty_devices[device_id] = when
+                device = self._devices.get(device_id)
+                if device is not None:
+                    device.is_active = True
+                    if device.last_active is None or when > device.last_active:
+                        device.last_active = when
+                    if user_id is None:
+                        user_id = device.user_id
+            if user_id is not None:
+                self._dirty_users.add(user_id)
+                user = self._users.get(user_id)
+                if user is not None and (user.last_active is None or when > user.last_active):
+                    user.last_active = when
+
+    def touch_user(self, user_id: int, when: Optional[datetime] = None):
+        """Record activity for a user without a specific device"""
+        self.touch(None, user_id, when)
+
+    # ---------- Reads (memory only) ----------
+
+    def device_for_ip(self, tailscale_ip: str, tailscale_only: bool = False) -> Optional[DevicePresence]:
+        """Device with this tailscale_ip; with tailscale_only, only rows flagged is_tailscale_device"""
+        index = self._tailscale_device_by_ip if tailscale_only else self._device_by_ip
+        with self._lock:
+            device_id = index.get(tailscale_ip)
+            return self._devices.get(device_id) if device_id is not None else None
+
+    def _user_last_active(self, user_id: int) -> Optional[datetime]:
+        user = self._users.get(user_id)
+        latest = user.last_active if user else None
+        for device in self._devices_by_user.get(user_id, ()):
+            if device.last_active is not None and (latest is None or device.last_active > latest):
+                latest = device.last_active
+        return latest
+
+    def active_tailscale(self) -> dict:
+        """Tailscale devices with their users and online state (was a query per device)"""
+        now = datetime.utcnow()
+        with self._lock:
+            devices = [d for d in self._devices.values() if d.is_tailscale_device]
+            devices.sort(key=lambda d: d.last_active or datetime.min, reverse=True)
+            active_users = []
+            for device in devices:
+                user = self._users.get(device.user_id)
+                if user is None:
+                    continue
+                active_users.append({
+                    "id": user.id,
+                    "handle": user.handle,
+                    "name": user.name,
+                    "email": user.email,
+                    "role": user.role,
+                    "isOnline": bool(device.last_active and now - device.last_active < ONLINE_WINDOW),
+                    "lastSeen": last_seen_label(device.last_active, now),
+                    "deviceName": device.tailscale_hostname or device.device_name,
+                    "deviceType": device.device_type,
+                    "tailscaleIp": device.tailscale_ip,
+                    "lastActive": device.last_active.isoformat() if device.last_active else None,
+                })
+        return {
+            "users": active_users,
+            "total": len(active_users),
+            "online": sum(1 for u in active_users if u["isOnline"]),
+        }
+
+    def user_presence(self, user_id: int) -> Optional[dict]:
+        """online/away/offline for one user, or None if the user is unknown"""
+        now = datetime.utcnow()
+        with self._lock:
+            if user_id not in self._users:
+                return None
+            last_active = self._user_last_active(user_id)
+            active_devices = sum(1 for d in self._devices_by_user.get(user_id, ()) if d.is_active)
+        status = "offline"
+        if last_active:
+            time_diff = now - last_active
+            if time_diff < ONLINE_WINDOW:
+                status = "online"
+            elif time_diff < AWAY_WINDOW:
+                status = "away"
+        return {
+            "user_id": user_id,
+            "online": status == "online",
+            "status": status,
+            "last_active_at": last_active,
+            "active_devices": active_devices,
+        }
+
+    def summary(self, preview: int = 4) -> dict:
+        """User totals for the ChatOps console (active = an active device seen in 24h)"""
+        now = datetime.utcnow()
+        with self._lock:
+            # Latest activity per user over active devices, in one pass
+            latest: Dict[int, datetime] = {}
+            for device in self._devices.values():
+                if device.is_active and device.last_active:
+                    current = latest.get(device.user_id)
+                    if current is None or device.last_active > current:
+                        latest[device.user_id] = device.last_active
+            users: List[UserPresence] = sorted(self._users.values(), key=lambda u: u.id)
+
+        def is_active(user_id: int) -> bool:
+            seen = latest.get(user_id)
+            return bool(seen and now - seen < ACTIVE_WINDOW)
+
+        return {
+            "total": len(users),
+            "active": sum(1 for u in users if is_active(u.id)),
+            "admins": sum(1 for u in users if u.role == "admin"),
+            "users": [
+                {"id": u.id, "name": u.name, "email": u.email, "role": u.role, "active": is_active(u.id)}
+                for u in users[:preview]
+            ],
+        }
+
+    def _presence_state(self) -> Tuple[FrozenSet[int], FrozenSet[int], FrozenSet[int]]:
+        now = datetime.utcnow()
+        with self._lock:
+            online = frozenset(
+                user_id for user_id in self._users
+                if (last_active := self._user_last_active(user_id)) is not None and now - last_active < ONLINE_WINDOW
+            )
+            return (
+                frozenset(self._users),
+                frozenset(d.id for d in self._devices.values() if d.is_tailscale_device),
+                online,
+            )
+
+    def publish_changes(self):
+        """Send presence_changed to WebSocket clients if anyone came online, went offline or was added/removed"""
+        state = self._presence_state()
+        previous, self._published = self._published, state
+        if previous is None or previous == state:
+            return
+        users, _devices, online = state
+        manager.emit_global("presence_changed", {"online": sorted(online), "total": len(users)})
+
+    # ---------- Database sync ----------
+
+    def load(self, db: Session):
+        """(Re)load the user/device directory, keeping newer in-memory activity"""
+        # Cleared first: an invalidate() during the load still triggers the next one
+        self._stale = False
+        users = {user.id: UserPresence(user) for user in db.query(User).all()}
+        devices = {device.id: DevicePresence(device) for device in db.query(Device).all()}
+        with self._lock:
+            for user_id, user in users.items():
+                previous = self._users.get(user_id)
+                if previous is not None:
+                    user.last_active = previous.last_active
+            for device_id, device in devices.items():
+                pending = self._dirty_devices.get(device_id)
+                if pending is not None and (device.last_active is None or pending > device.last_active):
+                    device.last_active = pending
+                    device.is_active = True
+            devices_by_user: Dict[int, List[DevicePresence]] = {}
+            for device in devices.values():
+                devices_by_user.setdefault(device.user_id, []).append(device)
+            self._users = users
+            self._devices = devices
+            self._devices_by_user = devices_by_user
+            device_by_ip: Dict[str, int] = {}
+            tailscale_device_by_ip: Dict[str, int] = {}
+            for device_id in sorted(devices):
+                device = devices[device_id]
+                if device.tailscale_ip:
+                    device_by_ip.setdefault(device.tailscale_ip, device_id)
+                    if device.is_tailscale_device:
+                        tailscale_device_by_ip.setdefault(device.tailscale_ip, device_id)
+            self._device_by_ip = device_by_ip
+            self._tailscale_device_by_ip = tailscale_device_by_ip
+            self.loaded = True
+            self._loaded_at = time.monotonic()
+            self.reloads += 1
+
+    def invalidate(self):
+        """Reload the directory at the next flush (users or devices were added, edited or removed)"""
+        self._stale = True
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            self.load(db)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._dirty_devices) + len(self._dirty_users)
+
+    def flush(self, db: Session) -> int:
+        """Write everything recorded since the last flush in one transaction; reload the directory if due"""
+        with self._lock:
+            devices, self._dirty_devices = self._dirty_devices, {}
+            users, self._dirty_users = self._dirty_users, set()
+
+        written = 0
+        if devices or users:
+            try:
+                if devices:
+                    # One executemany statement; devices deleted meanwhile just match no row
+                    devices_table = Device.__table__
+                    db.execute(
+                        update(devices_table)
+                        .where(devices_table.c.id == bindparam("b_id"))
+                        .values(last_active=bindparam("b_last_active"), is_active=True),
+                        [{"b_id": device_id, "b_last_active": when} for device_id, when in devices.items()],
+                    )
+                if users:
+                    db.execute(
+                        update(User)
+                        .where(User.id.in_(users), User.status != "online")
+                        .values(status="online")
+                        .execution_options(synchronize_session=False)
+                    )
+                db.commit()
+            except Exception:
+                db.rollback()
+                # Put the activity back so the next flush retries it
+                with self._lock:
+                    for device_id, when in devices.items():
+                        current = self._dirty_devices.get(device_id)
+                        if current is None or when > current:
+                            self._dirty_devices[device_id] = when
+                    self._dirty_users |= users
+                raise
+            written = len(devices) + len(users)
+            self.flushes += 1
+            self.rows_written += written
+
+        if self._stale or time.monotonic() - self._loaded_at >= self.reload_interval:
+            self.load(db)
+        self.publish_changes()
+        return written
+
+    def flush_now(self) -> int:
+        db = SessionLocal()
+        try:
+            return self.flush(db)
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._dirty_devices) + len(self._dirty_users)
+        return {
+            "heartbeats": self.heartbeats,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "reloads": self.reloads,
+            "pending": pending,
+            "flush_interval": self.flush_interval,
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush_now)
+            except Exception as e:
+                logger.warning(f"Presence flush failed: {e}")
+
+    def start(self):
+        """Load the directory and start the periodic flush (call from app startup)"""
+        db = SessionLocal()
+        try:
+            self.load(db)
+            # Baseline for presence_changed
+            self.publish_changes()
+        except Exception as e:
+            logger.warning(f"Presence load failed: {e}")
+        finally:
+            db.close()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush and write whatever is still pending (call from app shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await asyncio.to_thread(self.flush_now)
+        except Exception as e:
+            logger.warning(f"Final presence flush failed: {e}")
+
+
+# Process-wide store, started in main.lifespan
+presence_store = PresenceStore()
@@ -0,0 +1,253 @@
+"""
+Long-lived, pooled HTTP clients for the AI providers.
+
+AsyncOpenAI clients by API key fingerprint and httpx.AsyncClients by base
+URL (Ollama endpoints), with keep-alive, bounded pools and HTTP/2 when the
+`h2` package is installed. Built at app startup from the Connection table
+and closed on shutdown.
+
+Configured endpoints (Connections and the default URL) keep their client for
+the life of the process. Other URLs (passed by callers of the model list and
+health routes) share a small LRU, as do OpenAI clients by key. A client that
+is evicted or reset is retired: every client's transport counts the responses
+still being read, and a retired client is closed once that count drops to
+zero (a stream in progress finishes first), or PROVIDER_RETIRE_GRACE seconds
+after retirement at the latest.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import weakref
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+from sqlalchemy.orm import Session
+
+from models import Connection
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+# Clients kept for unconfigured base URLs and for OpenAI keys (least recently used dropped first)
+PROVIDER_ADHOC_CLIENTS = int(os.getenv("PROVIDER_ADHOC_CLIENTS", "4"))
+PROVIDER_OPENAI_CLIENTS = int(os.getenv("PROVIDER_OPENAI_CLIENTS", "4"))
+# Longest a retired client waits for its open responses before it is closed anyway
+PROVIDER_RETIRE_GRACE = float(os.getenv("PROVIDER_RETIRE_GRACE", "600"))
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Stable, non-reversible identifier for an API key (safe to log and use as a cache key)"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("PROVIDER_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("PROVIDER_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("PROVIDER_KEEPALIVE_EXPIRY", "60")),
+    )
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that reports back to its transport once closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class _CountingTransport(httpx.AsyncHTTPTransport):
+    """Counts requests whose response is still open, so a retired client waits for them"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.active = 0
+        self.on_idle: Optional[Callable[[], None]] = None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.active += 1
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self._release()
+            raise
+        response.stream = _ReleasingStream(response.stream, self._release)
+        return response
+
+    def _release(self):
+        self.active -= 1
+        if self.active == 0 and self.on_idle is not None:
+            on_idle, self.on_idle = self.on_idle, None
+            on_idle()
+
+
+# Transport of every client built here (weak: entries go with their client)
+_transports: "weakref.WeakKeyDictionary[httpx.AsyncClient, _CountingTransport]" = weakref.WeakKeyDictionary()
+
+
+def _new_http_client(base_url: Optional[str] = None) -> httpx.AsyncClient:
+    # Per-call timeouts override this default (health checks use short ones)
+    transport = _CountingTransport(limits=_pool_limits(), http2=HTTP2_AVAILABLE)
+    kwargs = {
+        "timeout": httpx.Timeout(60.0, connect=5.0),
+        "transport": transport,
+    }
+    if base_url:
+        kwargs["base_url"] = base_url
+    client = httpx.AsyncClient(**kwargs)
+    _transports[client] = transport
+    return client
+
+
+def normalize_url(base_url: Optional[str]) -> str:
+    return (base_url or DEFAULT_OLLAMA_URL).rstrip("/")
+
+
+class ProviderClients:
+    """Registry of shared provider clients"""
+
+    def __init__(self):
+        # key fingerprint -> (client, its httpx client), least recently used first
+        self._openai: "OrderedDict[str, Tuple[AsyncOpenAI, httpx.AsyncClient]]" = OrderedDict()
+        # Configured endpoints, never evicted
+        self._http: Dict[str, httpx.AsyncClient] = {}
+        # Any other base URL, least recently used first
+        self._adhoc: "OrderedDict[str, httpx.AsyncClient]" = OrderedDict()
+
+    def openai(self, api_key: str) -> AsyncOpenAI:
+        """Shared AsyncOpenAI client for this key"""
+        fingerprint = key_fingerprint(api_key)
+        entry = self._openai.get(fingerprint)
+        if entry is None:
+            http_client = _new_http_client()
+            entry = self._openai[fingerprint] = (AsyncOpenAI(api_key=api_key, http_client=http_client), http_client)
+            logger.info(f"OpenAI client built for key {fingerprint}")
+            while len(self._openai) > PROVIDER_OPENAI_CLIENTS:
+                _fingerprint, (_evicted, evicted_http) = self._openai.popitem(last=False)
+                self._retire(evicted_http)
+        else:
+            self._openai.move_to_end(fingerprint)
+        return entry[0]
+
+    def configure_http(self, base_url: Optional[str]) -> httpx.AsyncClient:
+        """Keep a client for a configured endpoint for the life of the process"""
+        url = normalize_url(base_url)
+        client = self._http.get(url)
+        if client is None or client.is_closed:
+            # Reuse the ad-hoc client if the endpoint was already in use
+            client = self._adhoc.pop(url, None)
+            if client is None or client.is_closed:
+                client = _new_http_client(url)
+            self._http[url] = client
+        return client
+
+    def http(self, base_url: Optional[str] = None) -> httpx.AsyncClient:
+        """Shared httpx client for a provider base URL (e.g. an Ollama endpoint)"""
+        url = normalize_url(base_url)
+        client = self._http.get(url)
+        if client is not None and not client.is_closed:
+            return client
+        client = self._adhoc.get(url)
+        if client is None or client.is_closed:
+            client = self._adhoc[url] = _new_http_client(url)
+            while len(self._adhoc) > PROVIDER_ADHOC_CLIENTS:
+                _url, evicted = self._adhoc.popitem(last=False)
+                self._retire(evicted)
+        else:
+            self._adhoc.move_to_end(url)
+        return client
+
+    def reset_openai(self):
+        """Drop the OpenAI clients (e.g. after the key was edited in Connections); running requests finish"""
+        entries = list(self._openai.values())
+        self._openai.clear()
+        for _client, http_client in entries:
+            self._retire(http_client)
+
+    def reset_http(self, base_url: Optional[str] = None):
+        """Drop the pooled client for a base URL (e.g. after the Ollama endpoint changed)"""
+        url = normalize_url(base_url)
+        for registry in (self._http, self._adhoc):
+            client = registry.pop(url, None)
+            if client is not None:
+                self._retire(client)
+
+    def warm_from_db(self, db: Session):
+        """Build clients for the providers configured in the Connection table"""
+        for conn in db.query(Connection).filter(Connection.service.in_(["openai", "ollama"])).all():
+            try:
+                config = json.loads(conn.config) if conn.config else {}
+            except ValueError:
+                config = {}
+            if conn.service == "openai":
+                api_key = config.get("apiKey") or os.getenv("OPENAI_API_KEY")
+                if api_key:
+                    self.openai(api_key)
+            elif conn.service == "ollama":
+                self.configure_http(config.get("endpoint"))
+        # The ChatOps console talks to the default Ollama URL even when unconfigured
+        self.configure_http(DEFAULT_OLLAMA_URL)
+
+    async def aclose(self):
+        """Close every pooled client (call from app shutdown)"""
+        openai_clients = list(self._openai.values())
+        clients = list(self._http.values()) + list(self._adhoc.values())
+        self._openai.clear()
+        self._http.clear()
+        self._adhoc.clear()
+        for openai_client, _http_client in openai_clients:
+            await openai_client.close()
+        for client in clients:
+            await client.aclose()
+
+    def _retire(self, client: httpx.AsyncClient):
+        """Close a client that left the registry once its open responses are done"""
+        transport = _transports.get(client)
+        if transport is None or transport.active == 0:
+            self._close_later(client.aclose())
+            return
+        transport.on_idle = lambda: self._close_if_open(client)
+        try:
+            # Responses nobody closes would otherwise keep it open for good
+            asyncio.get_running_loop().call_later(PROVIDER_RETIRE_GRACE, self._close_if_open, client)
+        except RuntimeError:
+            pass
+
+    def _close_if_open(self, client: httpx.AsyncClient):
+        if not client.is_closed:
+            self._close_later(client.aclose())
+
+    @staticmethod
+    def _close_later(coro):
+        try:
+            asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            # No running loop (sync caller); let the client be garbage collected
+            coro.close()
+
+
+# Process-wide registry, warmed in main.lifespan
+provider_clients = ProviderClients()
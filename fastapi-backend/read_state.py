@@ -0,0 +1,104 @@
+"""
+Per-member read cursors and unread counters.
+
+RoomMember.last_read_message_id is the newest message a member has read and
+RoomMember.unread_count is kept in step incrementally: every inserted message
+bumps the counter of the other members with one UPDATE, so listing rooms never
+has to COUNT messages.
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from models import Message, RoomMember
+
+
+def record_new_message(db: Session, message: Message):
+    """
+    Update read state for a freshly inserted message (call after flush, before commit).
+    Every other member gets +1 unread; the author has read their own message.
+    """
+    others = db.query(RoomMember).filter(RoomMember.thread_id == message.thread_id)
+    if message.user_id is not None:
+        others = others.filter(RoomMember.user_id != message.user_id)
+    others.update(
+        {RoomMember.unread_count: func.coalesce(RoomMember.unread_count, 0) + 1},
+        synchronize_session=False,
+    )
+
+    if message.user_id is not None:
+        db.query(RoomMember).filter(
+            RoomMember.thread_id == message.thread_id,
+            RoomMember.user_id == message.user_id,
+        ).update(
+            {RoomMember.last_read_message_id: message.id, RoomMember.unread_count: 0},
+            synchronize_session=False,
+        )
+
+
+def mark_read(db: Session, user_id: int, thread_id: int, message_id: Optional[int] = None) -> Optional[RoomMember]:
+    """
+    Move a member's read cursor forward to `message_id` (default: the newest message).
+    Cursors never move backwards. Returns the membership, or None if not a member.
+    Does not commit.
+    """
+    membership = (
+        db.query(RoomMember)
+        .filter(RoomMember.thread_id == thread_id, RoomMember.user_id == user_id)
+        .first()
+    )
+    if membership is None:
+        return None
+
+    latest_id = (
+        db.query(Message.id)
+        .filter(Message.thread_id == thread_id)
+        .order_by(Message.id.desc())
+        .limit(1)
+        .scalar()
+    )
+    if latest_id is None:
+        membership.unread_count = 0
+        return membership
+
+    target = latest_id if message_id is None else min(message_id, latest_id)
+    if membership.last_read_message_id is not None and target <= membership.last_read_message_id:
+        return membership
+
+    membership.last_read_message_id = target
+    if target == latest_id:
+        membership.unread_count = 0
+    else:
+        # Partial read: count only what is left past the cursor (index range scan)
+        membership.unread_count = (
+            db.query(func.count(Message.id))
+            .filter(
+                Message.thread_id == thread_id,
+                Message.id > target,
+                or_(Message.user_id.is_(None), Message.user_id != user_id),
+            )
+            .scalar()
+        )
+    return membership
+
+
+def mark_read_bulk(db: Session, user_id: int, positions: Iterable[Tuple[int, Optional[int]]]) -> Dict[int, int]:
+    """Apply mark_read for several (thread_id, message_id) pairs; returns {thread_id: unread_count}"""
+    result = {}
+    for thread_id, message_id in positions:
+        membership = mark_read(db, user_id, thread_id, message_id)
+        if membership is not None:
+            result[thread_id] = membership.unread_count or 0
+    return result
+
+
+def unread_counts(db: Session, user_id: int) -> Dict[int, int]:
+    """Unread count for every room the user belongs to (one indexed lookup, no message scan)"""
+    rows = (
+        db.query(RoomMember.thread_id, RoomMember.unread_count)
+        .filter(RoomMember.user_id == user_id)
+        .all()
+    )
+    return {thread_id: count or 0 for thread_id, count in rows}
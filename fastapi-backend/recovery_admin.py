@@ -20,7 +20,8 @@ import secrets
 import string
 from datetime import datetime
 
-from database import Base, engine, SessionLocal
+from database import SessionLocal
+from migrations import upgrade_to_head
 from models import User
 from auth_utils import get_password_hash
 
@@ -121,7 +122,7 @@ def main():
     args = parser.parse_args()
 
     # Ensure tables exist
-    Base.metadata.create_all(bind=engine)
+    upgrade_to_head()
 
     primary_pwd = args.password or generate_password()
     backup_pwd = args.backup_password or generate_password()
@@ -17,6 +17,7 @@ from auth_utils import (
     get_current_active_user,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from presence import presence_store
 
 router = APIRouter()
 
@@ -59,8 +60,13 @@ def track_device(user_id: int, ip_address: str, user_agent: str, db: Session):
         Device.user_agent == user_agent
     ).first()
     
+    if existing_device and existing_device.is_active:
+        # Known active device: record activity in memory, flushed in batches
+        presence_store.touch(existing_device.id, user_id)
+        return
+    
     if existing_device:
-        # Update last active time
+        # Reactivate the device (changes the active device count below)
         existing_device.last_active = datetime.utcnow()
         existing_device.is_active = True
     else:
@@ -76,6 +82,7 @@ def track_device(user_id: int, ip_address: str, user_agent: str, db: Session):
         db.add(new_device)
     
     db.commit()
+    presence_store.invalidate()
     
     # Update user's device count (count active devices)
     active_device_count = db.query(Device).filter(
@@ -212,6 +219,7 @@ async def register(
     
     db.add(new_user)
     db.commit()
+    presence_store.invalidate()
     db.refresh(new_user)
     
     # Track device on registration
@@ -3,21 +3,35 @@ Chat routes - Threads and Messages with AI integration
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
+from collections import deque
 from datetime import datetime
+import json
 import os
+import time
 from dotenv import load_dotenv
 from pydantic import BaseModel
 
-from database import get_db
-from models import User, Thread, Message, Connection
-from schemas import ThreadCreate, ThreadResponse, MessageCreate, MessageResponse
+from database import get_db, get_async_db, AsyncSessionLocal
+from models import User, Thread, Message, Connection, RoomMember
+from schemas import ThreadCreate, ThreadResponse, ThreadSummaryResponse, MessageCreate, MessageResponse
 from auth_utils import get_current_active_user
+from auth.current_user import get_current_user
+from auth.room_permissions import require_membership
+from ai_context import context_provider
+from provider_clients import provider_clients
+from model_catalog import openai_model_catalog, is_model_not_found_error
+from message_store import insert_message
+from conversation_memory import conversation_memory, estimate_tokens, history_budget, message_tokens
+from ollama_models import ollama_models
+from metrics_store import metrics_store
+from websocket_manager import manager, message_payload
 
 # AI imports
-import openai
-from openai import OpenAI
 import httpx
 
 load_dotenv()
@@ -32,19 +46,19 @@ async def get_ollama_models(base_url: str = "http://localhost:11434"):
     No authentication required.
     """
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(f"{base_url}/api/tags")
-            response.raise_for_status()
-            data = response.json()
+        client = provider_clients.http(base_url)
+        response = await client.get("/api/tags", timeout=10.0)
+        response.raise_for_status()
+        data = response.json()
             
-            # Extract model names
-            models = [model["name"] for model in data.get("models", [])]
+        # Extract model names
+        models = [model["name"] for model in data.get("models", [])]
             
-            return {
-                "models": models,
-                "base_url": base_url,
-                "count": len(models)
-            }
+        return {
+            "models": models,
+            "base_url": base_url,
+            "count": len(models)
+        }
     
     except httpx.ConnectError:
         raise HTTPException(
@@ -74,6 +88,18 @@ class SimpleChatRequest(BaseModel):
     temperature: float = 0.7
     config: Optional[ChatConfig] = None
     thread_id: Optional[int] = None  # Optional thread/room ID for message persistence
+    stream: Optional[str] = None  # "sse" or "ndjson" to stream tokens as they are generated
+
+
+class TokenUsage(BaseModel):
+    """Token accounting for one response (estimated when the provider reported no counts)"""
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    history_turns: int = 0  # Earlier turns of the thread sent verbatim
+    history_tokens: int = 0  # Their share of prompt_tokens, summary included
+    summarized_turns: int = 0  # Older turns folded into the running summary
+    estimated: bool = False
 
 
 class SimpleChatResponse(BaseModel):
@@ -85,75 +111,155 @@ class SimpleChatResponse(BaseModel):
     temperature: float
     authorTag: str = "TL"
     createdAt: str
+    ttft_ms: Optional[float] = None  # Time to first token
+    tokens_per_sec: Optional[float] = None  # Completion throughput
+    message_id: Optional[int] = None  # Persisted Message id when thread_id was given
+    usage: Optional[TokenUsage] = None
 
 
-async def _build_ai_context() -> str:
-    """Build real-time system context for AI responses"""
-    try:
-        # Get network snapshot
-        async with httpx.AsyncClient(timeout=3.0) as client:
-            try:
-                network_resp = await client.get("http://127.0.0.1:8000/api/system/tailscale/snapshot")
-                network_data = network_resp.json() if network_resp.status_code == 200 else {}
-            except Exception:
-                network_data = {}
-            
-            try:
-                system_resp = await client.get("http://127.0.0.1:8000/api/system/public/summary")
-                system_data = system_resp.json() if system_resp.status_code == 200 else {}
-            except Exception:
-                system_data = {}
-        
-        # Build context string
-        context_parts = []
-        
-        # Network context
-        if network_data.get("status") == "ok":
-            devices = network_data.get("devices", [])
-            online_devices = [d for d in devices if d.get("online")]
-            primary_hub = next((d for d in devices if d.get("role") == "primary-hub"), None)
-            dev_hub = next((d for d in devices if d.get("role") == "dev-hub"), None)
-            clients = [d for d in online_devices if d.get("role") == "client"]
-            
-            context_parts.append(f"NETWORK: {len(online_devices)} devices online (total: {len(devices)})")
-            if primary_hub:
-                status = "online" if primary_hub.get("online") else "offline"
-                context_parts.append(f"  - Primary Hub ({primary_hub.get('name')}): {status}")
-            if dev_hub:
-                status = "online" if dev_hub.get("online") else "offline"
-                context_parts.append(f"  - Dev Hub ({dev_hub.get('name')}): {status}")
-            if clients:
-                context_parts.append(f"  - Clients online: {', '.join(d.get('name', 'unknown') for d in clients)}")
-        else:
-            context_parts.append(f"NETWORK: Tailscale not available ({network_data.get('error', 'unknown error')})")
-        
-        # System context
-        if system_data:
-            context_parts.append(f"SYSTEM: CPU {system_data.get('cpu', 'N/A')}%, Memory {system_data.get('memory', 'N/A')}%, Disk {system_data.get('disk', 'N/A')}%")
-        
-        # Storage context (placeholder for future expansion)
-        context_parts.append("STORAGE: D:\\ drive accessible via local file system")
-        
-        return "\n".join(context_parts)
-    
-    except Exception as e:
-        return f"CONTEXT ERROR: {str(e)}"
+SYSTEM_PROMPT_TEMPLATE = """You are The Local, a helpful AI assistant for a Tailscale-powered home hub. Be friendly, concise, and helpful. You can answer questions about the system, help manage the network, or just chat.
+
+Current system context (use this for accurate answers):
+{context}
+
+When asked about the network, always use the real device data above. Never make up device counts or names."""
+
+
+async def _build_chat_messages(
+    request: SimpleChatRequest,
+    context: str,
+    db: AsyncSession,
+    provider: str,
+    model: str
+) -> tuple:
+    """
+    Assemble the provider message list for a ChatOps request: system prompt,
+    the thread's recent turns (when thread_id is given) fitted to the model's
+    token budget, then the new message.
+    Returns (messages, prompt) where prompt holds the token estimates for usage.
+    """
+    system_prompt = SYSTEM_PROMPT_TEMPLATE.format(context=context)
+    fixed_tokens = message_tokens(system_prompt) + message_tokens(request.message)
+    prompt = {"prompt_tokens": fixed_tokens, "history_turns": 0, "history_tokens": 0, "summarized_turns": 0}
+    history: List[dict] = []
+    if request.thread_id:
+        budget = history_budget(provider, model, fixed_tokens)
+        window = await conversation_memory.window(db, request.thread_id, budget, request.message)
+        history = window.pop("messages")
+        prompt.update(window)
+        prompt["prompt_tokens"] += window["history_tokens"]
+    messages = [
+        {"role": "system", "content": system_prompt},
+        *history,
+        {"role": "user", "content": request.message},
+    ]
+    return messages, prompt
+
+
+def _token_usage(prompt: dict, stats: "GenerationStats", reply_text: str) -> TokenUsage:
+    """Provider-reported token counts where available, estimates otherwise"""
+    prompt_tokens = stats.prompt_tokens if stats.prompt_tokens is not None else prompt["prompt_tokens"]
+    completion_tokens = stats.eval_tokens if stats.eval_tokens is not None else estimate_tokens(reply_text)
+    return TokenUsage(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+        history_turns=prompt["history_turns"],
+        history_tokens=prompt["history_tokens"],
+        summarized_turns=prompt["summarized_turns"],
+        estimated=stats.prompt_tokens is None or stats.eval_tokens is None,
+    )
+
+
+class GenerationStats:
+    """Timing for a single assistant response (time-to-first-token and throughput)"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.tokens = 0
+        # Provider-reported completion token count / generation time, when available
+        self.eval_tokens: Optional[int] = None
+        self.eval_seconds: Optional[float] = None
+        # Provider-reported prompt size, when available
+        self.prompt_tokens: Optional[int] = None
+
+    def mark_token(self, count: int = 1):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.tokens += count
+
+    def finish(self) -> dict:
+        self.finished_at = time.perf_counter()
+        first = self.first_token_at or self.finished_at
+        tokens = self.eval_tokens if self.eval_tokens is not None else self.tokens
+        seconds = self.eval_seconds
+        if seconds is None:
+            # Throughput is measured over the generation phase only (after first token)
+            seconds = self.finished_at - first if self.tokens > 1 else self.finished_at - self.started_at
+        return {
+            "ttft_ms": round((first - self.started_at) * 1000, 1),
+            "tokens_per_sec": round(tokens / seconds, 1) if tokens and seconds > 0 else None,
+            "completion_tokens": tokens,
+            "total_ms": round((self.finished_at - self.started_at) * 1000, 1),
+        }
+
+
+# Recent generation timings (bounded, in-memory) for /stats
+_generation_stats: deque = deque(maxlen=200)
+
+
+def _record_generation_stats(provider: str, model: str, stream: bool, timing: dict, usage: TokenUsage):
+    """Remember timing and token usage for one response and log it"""
+    _generation_stats.append({
+        "provider": provider,
+        "model": model,
+        "stream": stream,
+        "at": datetime.utcnow().isoformat(),
+        **timing,
+        "prompt_tokens": usage.prompt_tokens,
+        "history_turns": usage.history_turns,
+    })
+    metrics_store.record(f"ai.{provider}.total_ms", timing["total_ms"])
+    metrics_store.record(f"ai.{provider}.ttft_ms", timing["ttft_ms"])
+    print(
+        f"[chat] {provider}/{model} stream={stream} ttft={timing['ttft_ms']}ms "
+        f"tps={timing['tokens_per_sec']} tokens={timing['completion_tokens']} "
+        f"prompt={usage.prompt_tokens} history={usage.history_turns}"
+    )
+
+
+def _build_ai_context() -> str:
+    """Real-time system context for AI responses (cached snapshot, refreshed in the background)"""
+    return context_provider.get_context()
+
+
+def _require_thread_member(db: Session, thread_id: int) -> User:
+    """Current user, who must be a member of the room (403 otherwise)"""
+    current_user = get_current_user(db)
+    require_membership(db, current_user, thread_id)
+    return current_user
 
 
 @router.post("/chat", response_model=SimpleChatResponse)
-async def simple_chat(request: SimpleChatRequest, db: Session = Depends(get_db)):
+async def simple_chat(request: SimpleChatRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Simple chat endpoint for ChatOps console.
     No authentication required, supports OpenAI and Ollama with automatic fallback.
+    With a thread_id the room's history goes into the prompt, so the current
+    user must be a member of that room.
     Returns exactly one assistant response per request.
+    Set `stream` to "sse" or "ndjson" to receive tokens as they are generated.
     """
     
     # Phase 6: Check if AI is enabled for this room
     if request.thread_id:
-        thread = db.query(Thread).filter(Thread.id == request.thread_id).first()
+        await db.run_sync(_require_thread_member, request.thread_id)
+        thread = await db.get(Thread, request.thread_id)
         if thread and not thread.ai_enabled:
             # Return a polite message instead of an AI response
-            return SimpleChatResponse(
+            disabled = SimpleChatResponse(
                 role="assistant",
                 text="AI responses are disabled for this room. Enable them in room settings to chat with The Local.",
                 provider="disabled",
@@ -162,6 +268,12 @@ async def simple_chat(request: SimpleChatRequest, db: Session = Depends(get_db))
                 authorTag="TL",
                 createdAt=datetime.utcnow().isoformat()
             )
+            if request.stream:
+                return _stream_chat_response(request, disabled=disabled)
+            return disabled
+    
+    if request.stream:
+        return _stream_chat_response(request)
     
     # Single-provider routing - exactly one provider per request
     if request.provider == "openai":
@@ -174,13 +286,8 @@ async def simple_chat(request: SimpleChatRequest, db: Session = Depends(get_db))
             # If Ollama is unavailable (503) or model missing, fallback to OpenAI
             if e.status_code in [503, 404]:
                 print(f"Ollama unavailable ({e.detail}), falling back to OpenAI")
-                # Create OpenAI request with fallback metadata
-                openai_request = SimpleChatRequest(
-                    message=request.message,
-                    provider="openai",
-                    temperature=request.temperature,
-                    config=request.config
-                )
+                # Same request (thread history included) against OpenAI
+                openai_request = request.model_copy(update={"provider": "openai"})
                 response = await _chat_openai_simple(openai_request, db)
                 # Add fallback metadata
                 response.provider = "openai"
@@ -193,19 +300,17 @@ async def simple_chat(request: SimpleChatRequest, db: Session = Depends(get_db))
         raise HTTPException(status_code=400, detail=f"Unknown provider: {request.provider}")
 
 
-async def _chat_openai_simple(request: SimpleChatRequest, db: Session) -> SimpleChatResponse:
-    """Call OpenAI API for simple chat with graceful fallbacks.
-    Fallback order for models: user-specified -> gpt-4o -> gpt-4o-mini -> gpt-3.5-turbo
-    Provides clearer error messages for common failure modes (auth, quota, model not found).
-    """
+async def _get_connection(db: AsyncSession, service: str) -> Optional[Connection]:
+    result = await db.scalars(select(Connection).where(Connection.service == service).limit(1))
+    return result.first()
 
-    # Get API key from database first (priority), then environment variable
-    # DB key takes priority over env var
+
+async def _get_openai_api_key(db: AsyncSession) -> str:
+    """Resolve the OpenAI key: database connection first (priority), then environment"""
     db_key = None
     try:
-        openai_conn = db.query(Connection).filter(Connection.service == "openai").first()
+        openai_conn = await _get_connection(db, "openai")
         if openai_conn and getattr(openai_conn, 'config', None):
-            import json
             config_data = json.loads(openai_conn.config)
             db_key = config_data.get("apiKey")
     except Exception as e:
@@ -217,7 +322,11 @@ async def _chat_openai_simple(request: SimpleChatRequest, db: Session) -> Simple
             status_code=400,
             detail="OpenAI API key required. Set it in Connections > OpenAI or set OPENAI_API_KEY environment variable."
         )
+    return api_key
+
 
+def _openai_models_to_try(request: SimpleChatRequest) -> tuple:
+    """Return (requested_model, ordered fallback list without duplicates)"""
     # Updated priority list; allow env override OPENAI_MODEL_PRIORITY (comma-separated)
     requested_model = (request.config.model if request.config else None) or os.getenv("OPENAI_DEFAULT_MODEL", "gpt-4o-mini")
     env_priority = os.getenv("OPENAI_MODEL_PRIORITY", "gpt-4o-mini,gpt-4o,gpt-4.1-mini,gpt-4.1,gpt-3.5-turbo")
@@ -231,50 +340,74 @@ async def _chat_openai_simple(request: SimpleChatRequest, db: Session) -> Simple
         if m not in seen:
             seen.add(m)
             models_to_try.append(m)
+    return requested_model, models_to_try
+
+
+def _is_openai_fatal_error(err_str: str) -> bool:
+    """Auth and quota failures will not be fixed by trying another model"""
+    return any(k in err_str for k in ["incorrect api key", "invalid api key", "rate limit", "quota", "billing"])
+
+
+def _ollama_target(request: SimpleChatRequest) -> tuple:
+    """Return (base_url, model) for an Ollama request"""
+    base_url = (request.config.base_url if request.config else None) or "http://localhost:11434"
+    
+    # Use ollama_model if provided, otherwise fallback to model; unpinned
+    # requests go to a model Ollama already has loaded
+    pinned = None
+    if request.config:
+        pinned = request.config.ollama_model or request.config.model
+    return base_url, ollama_models.resolve(base_url, pinned)
 
-    # Build real-time context for AI
-    context = await _build_ai_context()
+
+async def _chat_openai_simple(request: SimpleChatRequest, db: AsyncSession) -> SimpleChatResponse:
+    """Call OpenAI API for simple chat with graceful fallbacks.
+    Fallback order for models: user-specified -> gpt-4o -> gpt-4o-mini -> gpt-3.5-turbo
+    Provides clearer error messages for common failure modes (auth, quota, model not found).
+    """
+
+    # Get API key from database first (priority), then environment variable
+    api_key = await _get_openai_api_key(db)
+    requested_model, models_to_try = _openai_models_to_try(request)
+
+    # Build real-time context for AI, plus the thread's history
+    context = _build_ai_context()
+    messages, prompt = await _build_chat_messages(request, context, db, "openai", requested_model)
 
     last_error = None
-    client = OpenAI(api_key=api_key)
-    # Try to get available models list once (non-fatal)
-    available_models = set()
-    try:
-        for mdl in client.models.list().data:
-            if hasattr(mdl, 'id'):
-                available_models.add(mdl.id)
-    except Exception as e:
-        print(f"[openai] model list failed (non-fatal): {e}")
+    client = provider_clients.openai(api_key)
+    # Cached account model list (empty if unknown - non-fatal)
+    available_models = await openai_model_catalog.get_models(client, api_key)
 
     for model in models_to_try:
+        if openai_model_catalog.is_missing(api_key, model):
+            continue
         try:
             if available_models and model not in available_models:
                 # Skip quickly if we know model not present
                 raise Exception(f"Model '{model}' not in account model list")
-            response = client.chat.completions.create(
+            stats = GenerationStats()
+            response = await client.chat.completions.create(
                 model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"""You are The Local, a helpful AI assistant for a Tailscale-powered home hub. Be friendly, concise, and helpful. You can answer questions about the system, help manage the network, or just chat.
-
-Current system context (use this for accurate answers):
-{context}
-
-When asked about the network, always use the real device data above. Never make up device counts or names."""
-                    },
-                    {"role": "user", "content": request.message}
-                ],
+                messages=messages,
                 temperature=request.temperature,
                 max_tokens=1000
             )
             reply_text = response.choices[0].message.content or "No response from OpenAI"
+            stats.mark_token()
+            if response.usage is not None:
+                stats.eval_tokens = response.usage.completion_tokens
+                stats.prompt_tokens = response.usage.prompt_tokens
+            timing = stats.finish()
+            usage = _token_usage(prompt, stats, reply_text)
+            _record_generation_stats("openai", model, False, timing, usage)
 
             update_ai_status("openai", "online")
             
             # Persist assistant response if thread_id provided (Phase 1)
+            saved = None
             if request.thread_id:
-                persist_assistant_message(
+                saved = await persist_assistant_message(
                     thread_id=request.thread_id,
                     text=reply_text,
                     db=db,
@@ -288,17 +421,22 @@ When asked about the network, always use the real device data above. Never make
                 model=model if model == requested_model else f"{model} (fallback)",
                 temperature=request.temperature,
                 authorTag="TL",
-                createdAt=datetime.utcnow().isoformat()
+                createdAt=datetime.utcnow().isoformat(),
+                ttft_ms=timing["ttft_ms"],
+                tokens_per_sec=timing["tokens_per_sec"],
+                message_id=saved.id if saved else None,
+                usage=usage
             )
         except Exception as e:
             last_error = e
             # If error clearly indicates auth or quota, stop early
             err_str = str(e).lower()
-            if any(k in err_str for k in ["incorrect api key", "invalid api key", "rate limit", "quota", "billing"]):
+            if _is_openai_fatal_error(err_str):
                 update_ai_status("openai", "offline")
                 raise HTTPException(status_code=502, detail=f"OpenAI auth/quota error: {str(e)}")
-            # For model not found, continue to next fallback
-            if ("model" in err_str and "not" in err_str and "found" in err_str) or ("model" in err_str and "not" in err_str and "exist" in err_str):
+            # For model not found, remember it and continue to next fallback
+            if is_model_not_found_error(err_str):
+                openai_model_catalog.mark_missing(api_key, model)
                 continue
             # Other errors try next model; if only one model, break
             continue
@@ -308,74 +446,67 @@ When asked about the network, always use the real device data above. Never make
     raise HTTPException(status_code=500, detail=f"OpenAI API error (all fallbacks failed): {repr(last_error)}")
 
 
-async def _chat_ollama_simple(request: SimpleChatRequest, db: Session) -> SimpleChatResponse:
+async def _chat_ollama_simple(request: SimpleChatRequest, db: AsyncSession) -> SimpleChatResponse:
     """Call Ollama API for simple chat with model selection"""
     
-    base_url = (request.config.base_url if request.config else None) or "http://localhost:11434"
+    base_url, model = _ollama_target(request)
     
-    # Use ollama_model if provided, otherwise fallback to model, then default
-    model = None
-    if request.config:
-        model = request.config.ollama_model or request.config.model
-    model = model or "llama3"
-    
-    # Build real-time context for AI
-    context = await _build_ai_context()
+    # Build real-time context for AI, plus the thread's history
+    context = _build_ai_context()
+    messages, prompt = await _build_chat_messages(request, context, db, "ollama", model)
     
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{base_url}/api/chat",
-                json={
-                    "model": model,
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": f"""You are The Local, a helpful AI assistant for a Tailscale-powered home hub. Be friendly, concise, and helpful. You can answer questions about the system, help manage the network, or just chat.
-
-Current system context (use this for accurate answers):
-{context}
-
-When asked about the network, always use the real device data above. Never make up device counts or names."""
-                        },
-                        {
-                            "role": "user",
-                            "content": request.message
-                        }
-                    ],
-                    "stream": False,
-                    "options": {
-                        "temperature": request.temperature,
-                    }
+        client = provider_clients.http(base_url)
+        stats = GenerationStats()
+        response = await client.post(
+            "/api/chat",
+            json=ollama_models.payload(base_url, model, {
+                "model": model,
+                "messages": messages,
+                "stream": False,
+                "options": {
+                    "temperature": request.temperature,
                 }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            reply_text = data["message"]["content"] or "No response from Ollama"
+            })
+        )
+        response.raise_for_status()
+        data = response.json()
             
-            # Update AI status cache
-            update_ai_status("ollama", "online")
+        reply_text = data["message"]["content"] or "No response from Ollama"
+        stats.mark_token()
+        _apply_ollama_eval_stats(stats, data)
+        timing = stats.finish()
+        usage = _token_usage(prompt, stats, reply_text)
+        _record_generation_stats("ollama", model, False, timing, usage)
             
-            # Persist assistant response if thread_id provided (Phase 1)
-            if request.thread_id:
-                persist_assistant_message(
-                    thread_id=request.thread_id,
-                    text=reply_text,
-                    db=db,
-                    sender="TL"
-                )
+        # Update AI status cache
+        update_ai_status("ollama", "online")
+        ollama_models.mark_used(base_url, model)
             
-            # Return with metadata - NO provider/model suffix in text
-            return SimpleChatResponse(
-                role="assistant",
+        # Persist assistant response if thread_id provided (Phase 1)
+        saved = None
+        if request.thread_id:
+            saved = await persist_assistant_message(
+                thread_id=request.thread_id,
                 text=reply_text,
-                provider="ollama",
-                model=model,
-                temperature=request.temperature,
-                authorTag="TL",
-                createdAt=datetime.utcnow().isoformat()
+                db=db,
+                sender="TL"
             )
+            
+        # Return with metadata - NO provider/model suffix in text
+        return SimpleChatResponse(
+            role="assistant",
+            text=reply_text,
+            provider="ollama",
+            model=model,
+            temperature=request.temperature,
+            authorTag="TL",
+            createdAt=datetime.utcnow().isoformat(),
+            ttft_ms=timing["ttft_ms"],
+            tokens_per_sec=timing["tokens_per_sec"],
+            message_id=saved.id if saved else None,
+            usage=usage
+        )
     
     except httpx.ConnectError:
         # Update AI status as offline
@@ -397,14 +528,283 @@ When asked about the network, always use the real device data above. Never make
         raise HTTPException(status_code=500, detail=f"Ollama call failed: {str(e)}")
 
 
-async def get_ai_response(message: str, thread_type: str, db: Session) -> str:
+def _apply_ollama_eval_stats(stats: GenerationStats, data: dict):
+    """Use Ollama's own eval_count / eval_duration (ns) and prompt_eval_count when reported"""
+    if data.get("prompt_eval_count") is not None:
+        stats.prompt_tokens = data["prompt_eval_count"]
+    eval_count = data.get("eval_count")
+    eval_duration = data.get("eval_duration")
+    if eval_count:
+        stats.eval_tokens = eval_count
+        if eval_duration:
+            stats.eval_seconds = eval_duration / 1e9
+
+
+def _apply_openai_stream_usage(stats: GenerationStats, usage):
+    """Usage from the last chunk of a stream (include_usage); a dict on this SDK version"""
+    if usage is None:
+        return
+    if not isinstance(usage, dict):
+        usage = usage.model_dump()
+    if usage.get("prompt_tokens") is not None:
+        stats.prompt_tokens = usage["prompt_tokens"]
+    if usage.get("completion_tokens") is not None:
+        stats.eval_tokens = usage["completion_tokens"]
+
+
+# ---------- Streaming (SSE / NDJSON) ----------
+
+async def _stream_openai_tokens(
+    request: SimpleChatRequest,
+    db: AsyncSession,
+    meta: dict,
+    stats: GenerationStats
+) -> AsyncIterator[str]:
+    """Yield OpenAI completion deltas, walking the model fallback chain until one starts"""
+    api_key = await _get_openai_api_key(db)
+    requested_model, models_to_try = _openai_models_to_try(request)
+    context = _build_ai_context()
+    messages, meta["prompt"] = await _build_chat_messages(request, context, db, "openai", requested_model)
+
+    client = provider_clients.openai(api_key)
+    available_models = await openai_model_catalog.get_models(client, api_key)
+    last_error = None
+    for model in models_to_try:
+        if openai_model_catalog.is_missing(api_key, model):
+            continue
+        if available_models and model not in available_models:
+            last_error = Exception(f"Model '{model}' not in account model list")
+            continue
+        try:
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=request.temperature,
+                max_tokens=1000,
+                stream=True,
+                # Final chunk carries the real usage (stream_options is not a keyword on this SDK version)
+                extra_body={"stream_options": {"include_usage": True}}
+            )
+        except Exception as e:
+            last_error = e
+            err_str = str(e).lower()
+            if _is_openai_fatal_error(err_str):
+                update_ai_status("openai", "offline")
+                raise HTTPException(status_code=502, detail=f"OpenAI auth/quota error: {str(e)}")
+            if is_model_not_found_error(err_str):
+                openai_model_catalog.mark_missing(api_key, model)
+            continue
+
+        meta["provider"] = "openai"
+        meta["model"] = model if model == requested_model else f"{model} (fallback)"
+        try:
+            async for chunk in stream:
+                _apply_openai_stream_usage(stats, getattr(chunk, "usage", None))
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    stats.mark_token()
+                    yield delta
+        except Exception as e:
+            # Failed mid-stream (API error, dropped connection): tokens already went out, so no fallback
+            update_ai_status("openai", "offline")
+            raise HTTPException(status_code=502, detail=f"OpenAI stream failed: {str(e)}")
+        update_ai_status("openai", "online")
+        return
+
+    update_ai_status("openai", "offline")
+    raise HTTPException(status_code=500, detail=f"OpenAI API error (all fallbacks failed): {repr(last_error)}")
+
+
+async def _stream_ollama_tokens(
+    request: SimpleChatRequest,
+    db: AsyncSession,
+    meta: dict,
+    stats: GenerationStats
+) -> AsyncIterator[str]:
+    """Yield Ollama /api/chat deltas from its newline-delimited JSON stream"""
+    base_url, model = _ollama_target(request)
+    context = _build_ai_context()
+    messages, meta["prompt"] = await _build_chat_messages(request, context, db, "ollama", model)
+
+    try:
+        client = provider_clients.http(base_url)
+        async with client.stream(
+            "POST",
+            "/api/chat",
+            json=ollama_models.payload(base_url, model, {
+                "model": model,
+                "messages": messages,
+                "stream": True,
+                "options": {
+                    "temperature": request.temperature,
+                }
+            })
+        ) as response:
+            if response.status_code == 404:
+                raise HTTPException(status_code=404, detail=f"Ollama model '{model}' not found")
+            if response.status_code >= 400:
+                body = (await response.aread()).decode(errors="replace")
+                raise HTTPException(status_code=response.status_code, detail=f"Ollama error: {body}")
+
+            meta["provider"] = "ollama"
+            meta["model"] = model
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise HTTPException(status_code=500, detail=f"Ollama error: {data['error']}")
+                delta = (data.get("message") or {}).get("content")
+                if delta:
+                    stats.mark_token()
+                    yield delta
+                if data.get("done"):
+                    _apply_ollama_eval_stats(stats, data)
+                    break
+        update_ai_status("ollama", "online")
+        ollama_models.mark_used(base_url, model)
+    except HTTPException:
+        update_ai_status("ollama", "offline")
+        raise
+    except httpx.ConnectError:
+        update_ai_status("ollama", "offline")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Cannot connect to Ollama at {base_url}. Make sure Ollama is running."
+        )
+    except Exception as e:
+        update_ai_status("ollama", "offline")
+        raise HTTPException(status_code=500, detail=f"Ollama call failed: {str(e)}")
+
+
+def _encode_stream_event(fmt: str, event: str, data: dict) -> str:
+    """Frame one event as Server-Sent Events or as a line of NDJSON"""
+    if fmt == "ndjson":
+        return json.dumps({"type": event, **data}) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream_chat_response(
+    request: SimpleChatRequest,
+    disabled: Optional[SimpleChatResponse] = None
+) -> StreamingResponse:
+    """
+    Relay provider tokens to the client as they arrive.
+    Emits `token` events ({"delta": ...}), then one `done` event carrying the full
+    SimpleChatResponse plus timing, or an `error` event ({"status", "detail"}).
+    The final text is persisted once the stream ends, like the non-streaming path.
+    """
+    fmt = "ndjson" if request.stream == "ndjson" else "sse"
+
+    async def event_stream():
+        if disabled is not None:
+            yield _encode_stream_event(fmt, "done", disabled.model_dump())
+            return
+
+        stats = GenerationStats()
+        meta = {"provider": request.provider, "model": ""}
+        parts: List[str] = []
+        # The request-scoped session is closed before a streaming body runs,
+        # so the generator owns its own session.
+        db = AsyncSessionLocal()
+        try:
+            try:
+                if request.provider == "openai":
+                    tokens = _stream_openai_tokens(request, db, meta, stats)
+                elif request.provider == "ollama":
+                    tokens = _stream_ollama_tokens(request, db, meta, stats)
+                else:
+                    raise HTTPException(status_code=400, detail=f"Unknown provider: {request.provider}")
+
+                try:
+                    async for delta in tokens:
+                        parts.append(delta)
+                        yield _encode_stream_event(fmt, "token", {"delta": delta})
+                except HTTPException as e:
+                    # Same fallback as the non-streaming path, but only before any token was sent
+                    if request.provider != "ollama" or parts or e.status_code not in [503, 404]:
+                        raise
+                    print(f"Ollama unavailable ({e.detail}), falling back to OpenAI")
+                    stats = GenerationStats()
+                    async for delta in _stream_openai_tokens(request, db, meta, stats):
+                        parts.append(delta)
+                        yield _encode_stream_event(fmt, "token", {"delta": delta})
+                    if not meta["model"].endswith("(fallback)"):
+                        meta["model"] = f"{meta['model']} (fallback)"
+            except HTTPException as e:
+                yield _encode_stream_event(fmt, "error", {"status": e.status_code, "detail": e.detail})
+                return
+
+            reply_text = "".join(parts) or f"No response from {meta['provider']}"
+            timing = stats.finish()
+            usage = _token_usage(meta["prompt"], stats, reply_text)
+            _record_generation_stats(meta["provider"], meta["model"], True, timing, usage)
+
+            # Persist assistant response once the stream is complete (Phase 1)
+            saved = None
+            if request.thread_id:
+                saved = await persist_assistant_message(
+                    thread_id=request.thread_id,
+                    text=reply_text,
+                    db=db,
+                    sender="TL"
+                )
+
+            done = SimpleChatResponse(
+                role="assistant",
+                text=reply_text,
+                provider=meta["provider"],
+                model=meta["model"],
+                temperature=request.temperature,
+                authorTag="TL",
+                createdAt=datetime.utcnow().isoformat(),
+                ttft_ms=timing["ttft_ms"],
+                tokens_per_sec=timing["tokens_per_sec"],
+                message_id=saved.id if saved else None,
+                usage=usage
+            )
+            yield _encode_stream_event(fmt, "done", done.model_dump())
+        finally:
+            await db.close()
+
+    media_type = "application/x-ndjson" if fmt == "ndjson" else "text/event-stream"
+    return StreamingResponse(
+        event_stream(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/stats")
+async def get_generation_stats(limit: int = 20):
+    """
+    Recent time-to-first-token, tokens-per-second and prompt size per response.
+    No authentication required.
+    """
+    recent = list(_generation_stats)
+    ttfts = [s["ttft_ms"] for s in recent if s["ttft_ms"] is not None]
+    rates = [s["tokens_per_sec"] for s in recent if s["tokens_per_sec"] is not None]
+    return {
+        "count": len(recent),
+        "avg_ttft_ms": round(sum(ttfts) / len(ttfts), 1) if ttfts else None,
+        "avg_tokens_per_sec": round(sum(rates) / len(rates), 1) if rates else None,
+        "openai_model_cache": openai_model_catalog.stats(),
+        "conversation_memory": conversation_memory.stats(),
+        "ollama_models": ollama_models.stats(),
+        "recent": recent[-max(1, min(limit, 200)):]
+    }
+
+
+async def get_ai_response(message: str, thread_type: str, db: AsyncSession) -> str:
     """
     Get AI response from OpenAI or Ollama based on configuration
     """
     import json
     
     # Check OpenAI connection
-    openai_conn = db.query(Connection).filter(Connection.service == "openai").first()
+    openai_conn = await _get_connection(db, "openai")
     if openai_conn is not None:
         if getattr(openai_conn, 'enabled', False):
             try:
@@ -413,8 +813,8 @@ async def get_ai_response(message: str, thread_type: str, db: Session) -> str:
                 api_key = config.get("apiKey") or os.getenv("OPENAI_API_KEY")
                 model = config.get("model", "gpt-4o-mini")
                 
-                client = openai.OpenAI(api_key=api_key)
-                response = client.chat.completions.create(
+                client = provider_clients.openai(api_key)
+                response = await client.chat.completions.create(
                     model=model,
                     messages=[
                         {"role": "system", "content": "You are a helpful AI assistant. Be concise and professional."},
@@ -427,28 +827,30 @@ async def get_ai_response(message: str, thread_type: str, db: Session) -> str:
                 print(f"OpenAI error: {e}")
     
     # Check Ollama connection
-    ollama_conn = db.query(Connection).filter(Connection.service == "ollama").first()
+    ollama_conn = await _get_connection(db, "ollama")
     if ollama_conn is not None:
         if getattr(ollama_conn, 'enabled', False):
             try:
                 config_str = getattr(ollama_conn, 'config', None)
                 config = json.loads(config_str) if config_str else {}
                 endpoint = config.get("endpoint", "http://localhost:11434")
-                model = config.get("model", "llama2")
+                # The Connections model is the endpoint's default, not a pin
+                model = ollama_models.resolve(endpoint)
                 
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        f"{endpoint}/api/generate",
-                        json={
-                            "model": model,
-                            "prompt": message,
-                            "stream": False
-                        },
-                        timeout=30.0
-                    )
-                    if response.status_code == 200:
-                        data = response.json()
-                        return data.get("response", "No response from Ollama")
+                client = provider_clients.http(endpoint)
+                response = await client.post(
+                    "/api/generate",
+                    json=ollama_models.payload(endpoint, model, {
+                        "model": model,
+                        "prompt": message,
+                        "stream": False
+                    }),
+                    timeout=30.0
+                )
+                if response.status_code == 200:
+                    ollama_models.mark_used(endpoint, model)
+                    data = response.json()
+                    return data.get("response", "No response from Ollama")
             except Exception as e:
                 print(f"Ollama error: {e}")
     
@@ -456,47 +858,75 @@ async def get_ai_response(message: str, thread_type: str, db: Session) -> str:
     return "AI services are not configured. Please set up OpenAI or Ollama in the Connections tab."
 
 
-@router.get("/threads", response_model=List[ThreadResponse])
+# Sidebar previews are truncated; full text comes from the paginated messages endpoint
+THREAD_PREVIEW_CHARS = 200
+
+
+@router.get("/threads", response_model=List[ThreadSummaryResponse])
 async def get_threads(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all chat threads"""
-    threads = db.query(Thread).all()
-    
-    # Format response with messages
-    response = []
-    for thread in threads:
-        messages = db.query(Message).filter(Message.thread_id == thread.id).all()
-        last_message = messages[-1].text if messages else None
-        
-        response.append({
-            "id": thread.id,
-            "type": thread.type,
-            "name": thread.name,
-            "avatar": thread.avatar,
-            "lastMessage": last_message,
-            "unread": 0,
-            "timestamp": thread.updated_at,
-            "messages": [
-                {
-                    "id": msg.id,
-                    "sender": msg.sender,
-                    "text": msg.text,
-                    "timestamp": msg.timestamp
-                }
-                for msg in messages
-            ]
-        })
-    
-    return response
+    """
+    Get all chat threads as sidebar summaries.
+    One query: each thread joined to its newest message, found with a
+    correlated (thread_id, id) index lookup, and to the user's membership for
+    the incrementally maintained unread counter. Message bodies are not
+    returned; use /api/rooms/{id}/messages for history.
+    """
+    last_message_id = (
+        select(Message.id)
+        .where(Message.thread_id == Thread.id)
+        .order_by(Message.id.desc())
+        .limit(1)
+        .correlate(Thread)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(
+            Thread.id,
+            Thread.type,
+            Thread.name,
+            Thread.avatar,
+            Thread.updated_at,
+            Message.id.label("last_id"),
+            Message.sender,
+            Message.timestamp,
+            func.substr(Message.text, 1, THREAD_PREVIEW_CHARS).label("preview"),
+            RoomMember.unread_count,
+        )
+        .select_from(Thread)
+        .outerjoin(Message, Message.id == last_message_id)
+        .outerjoin(
+            RoomMember,
+            (RoomMember.thread_id == Thread.id) & (RoomMember.user_id == current_user.id),
+        )
+        .order_by(Thread.id)
+    )
+    rows = result.all()
+
+    return [
+        {
+            "id": row.id,
+            "type": row.type,
+            "name": row.name,
+            "avatar": row.avatar,
+            "lastMessage": row.preview,
+            "lastMessageId": row.last_id,
+            "lastSender": row.sender,
+            "lastMessageAt": row.timestamp,
+            "unread": row.unread_count or 0,
+            "timestamp": row.updated_at,
+        }
+        for row in rows
+    ]
 
 
 @router.post("/threads", response_model=ThreadResponse)
 async def create_thread(
     thread_data: ThreadCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create new chat thread"""
     new_thread = Thread(
@@ -507,18 +937,18 @@ async def create_thread(
     )
     
     db.add(new_thread)
-    db.commit()
-    db.refresh(new_thread)
+    await db.flush()
     
     # Add initial AI message if it's an AI thread
     if thread_data.type == "ai":
-        initial_message = Message(
+        await db.run_sync(
+            insert_message,
             thread_id=new_thread.id,
             sender="bot",
             text="Hello! I'm your AI assistant. How can I help you today?"
         )
-        db.add(initial_message)
-        db.commit()
+    await db.commit()
+    await db.refresh(new_thread)
     
     return {
         "id": new_thread.id,
@@ -536,18 +966,18 @@ async def create_thread(
 async def get_messages(
     thread_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all messages for a thread"""
-    thread = db.query(Thread).filter(Thread.id == thread_id).first()
+    thread = await db.get(Thread, thread_id)
     if not thread:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Thread not found"
         )
     
-    messages = db.query(Message).filter(Message.thread_id == thread_id).all()
-    return messages
+    messages = await db.scalars(select(Message).where(Message.thread_id == thread_id))
+    return messages.all()
 
 
 @router.post("/threads/{thread_id}/messages", response_model=MessageResponse)
@@ -555,57 +985,57 @@ async def send_message(
     thread_id: int,
     message_data: MessageCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Send message to a thread"""
-    thread = db.query(Thread).filter(Thread.id == thread_id).first()
+    thread = await db.get(Thread, thread_id)
     if not thread:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Thread not found"
         )
     
-    # Create user message
-    user_message = Message(
+    # Create user message (also bumps the thread's activity counters)
+    user_message = await db.run_sync(
+        insert_message,
         thread_id=thread_id,
         user_id=current_user.id,
         sender="me",
         text=message_data.text
     )
     
-    db.add(user_message)
-    
-    # Update thread timestamp
-    setattr(thread, 'updated_at', datetime.utcnow())
-    
-    # Increment AI usage counter
-    setattr(current_user, 'ai_usage', (current_user.ai_usage or 0) + 1)
+    # Increment AI usage counter (current_user belongs to the auth dependency's session)
+    await db.execute(
+        update(User)
+        .where(User.id == current_user.id)
+        .values(ai_usage=func.coalesce(User.ai_usage, 0) + 1)
+    )
     
-    db.commit()
-    db.refresh(user_message)
+    await db.commit()
     
     # If it's an AI thread, get AI response
     thread_type = getattr(thread, 'type', None)
     if thread_type == "ai":
         ai_response_text = await get_ai_response(message_data.text, thread_type, db)
         
-        ai_message = Message(
+        ai_message = await db.run_sync(
+            insert_message,
             thread_id=thread_id,
             sender="bot",
-            text=ai_response_text
+            text=ai_response_text,
+            ai_request=True
         )
-        
-        db.add(ai_message)
-        db.commit()
-        db.refresh(ai_message)
+        await db.commit()
         
         return ai_message
     
     return user_message
 
 
+# Plain def: the ORM cascade loads messages/members lazily, so this runs on
+# the sync session in the threadpool rather than on the event loop
 @router.delete("/threads/{thread_id}")
-async def delete_thread(
+def delete_thread(
     thread_id: int,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -629,6 +1059,7 @@ async def delete_thread(
     
     db.delete(thread)
     db.commit()
+    conversation_memory.forget(thread_id)
     
     return {"message": "Thread deleted successfully"}
 
@@ -681,10 +1112,10 @@ def update_ai_status(provider: str, status: str):
     _last_ai_status = {"provider": provider, "status": status}
 
 
-def persist_assistant_message(
+async def persist_assistant_message(
     thread_id: int,
     text: str,
-    db: Session,
+    db: AsyncSession,
     sender: str = "TL"
 ) -> Optional[Message]:
     """
@@ -701,34 +1132,28 @@ def persist_assistant_message(
     """
     try:
         # Verify thread exists
-        thread = db.query(Thread).filter(Thread.id == thread_id).first()
+        thread = await db.get(Thread, thread_id)
         if not thread:
             print(f"[persist_message] Thread {thread_id} not found, skipping persistence")
             return None
         
-        # Create message with user_id=None for assistant messages
-        message = Message(
+        # Assistant messages have no user_id; counts as an AI request for the room
+        message = await db.run_sync(
+            insert_message,
             thread_id=thread_id,
-            user_id=None,  # Assistant messages have no user_id
             sender=sender,
             text=text.strip(),
-            timestamp=datetime.utcnow()
+            ai_request=True
         )
-        
-        db.add(message)
-        db.commit()
-        db.refresh(message)
-        
-        # Update thread's updated_at timestamp
-        thread.updated_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
         
         print(f"[persist_message] Saved assistant message {message.id} to thread {thread_id}")
+        manager.emit(thread_id, "new_message", message_payload(message))
         return message
     
     except Exception as e:
         print(f"[persist_message] Error saving message: {e}")
-        db.rollback()
+        await db.rollback()
         return None
 
 
@@ -738,7 +1163,7 @@ class ProviderHealthResponse(BaseModel):
 
 
 @router.get("/health")
-async def chat_health(ollama_url: str = "http://localhost:11434", db: Session = Depends(get_db)):
+async def chat_health(ollama_url: str = "http://localhost:11434", db: AsyncSession = Depends(get_async_db)):
     """Lightweight health endpoint for ChatOps console.
     Returns provider status codes without performing full chat calls.
     openai: 'key-missing' | 'ok'
@@ -749,7 +1174,7 @@ async def chat_health(ollama_url: str = "http://localhost:11434", db: Session =
     import json
     db_key = None
     try:
-        openai_conn = db.query(Connection).filter(Connection.service == "openai").first()
+        openai_conn = await _get_connection(db, "openai")
         if openai_conn and getattr(openai_conn, 'config', None):
             config_data = json.loads(openai_conn.config)
             db_key = config_data.get("apiKey")
@@ -761,10 +1186,10 @@ async def chat_health(ollama_url: str = "http://localhost:11434", db: Session =
 
     # Ollama status: attempt a quick version or tags request
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            resp = await client.get(f"{ollama_url}/api/version")
-            resp.raise_for_status()
-            ollama_status = "ok"
+        client = provider_clients.http(ollama_url)
+        resp = await client.get("/api/version", timeout=5.0)
+        resp.raise_for_status()
+        ollama_status = "ok"
     except httpx.ConnectError:
         ollama_status = "offline"
     except Exception:
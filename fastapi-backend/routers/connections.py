@@ -5,7 +5,6 @@ API Connections routes - Tailscale, OpenAI, Ollama
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 import json
-import subprocess
 import os
 from dotenv import load_dotenv
 
@@ -13,10 +12,15 @@ from database import get_db
 from models import User, Connection
 from schemas import TailscaleConfig, OpenAIConfig, OllamaConfig, ConnectionsResponse
 from auth_utils import get_current_active_user, require_admin
+from provider_clients import provider_clients, DEFAULT_OLLAMA_URL, normalize_url
+from ollama_config import OLLAMA_MODEL
+from ollama_models import ollama_models
+from tailscale_state import tailscale_state
+from model_catalog import openai_model_catalog, is_model_not_found_error
+from websocket_manager import manager
 
 # AI imports
 import openai
-from openai import OpenAI
 import httpx
 
 load_dotenv()
@@ -53,7 +57,7 @@ async def get_connections(
     ollama_config = {
         "enabled": False,
         "endpoint": "http://localhost:11434",
-        "model": "gemma:2b",
+        "model": OLLAMA_MODEL,
         "status": "unconfigured"
     }
     
@@ -123,61 +127,38 @@ async def test_tailscale(
             "message": "Tailscale is not configured. Please enable and configure it first."
         }
 
-    try:
-        json_status = subprocess.run(
-            ["tailscale", "status", "--json"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        if json_status.returncode == 0 and json_status.stdout.strip():
-            try:
-                data = json.loads(json_status.stdout)
-                self_node = data.get("Self", {})
-                ips = self_node.get("TailscaleIPs", [])
-                hostname = self_node.get("HostName") or self_node.get("DNSName")
-                conn.status = "connected"
-                db.commit()
-                return {
-                    "status": "connected",
-                    "message": "Tailscale is running",
-                    "hostname": hostname,
-                    "ips": ips,
-                    "peerCount": len(data.get("Peer", {}))
-                }
-            except Exception:
-                pass  # fall through to plain status
-
-        result = subprocess.run(
-            ["tailscale", "status"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        if result.returncode == 0:
-            conn.status = "connected"
-            db.commit()
-            return {"status": "connected", "message": "Tailscale is running", "raw": result.stdout}
-        else:
-            stderr_lower = (result.stderr or "").lower()
-            if "tailscaled" in stderr_lower or "not running" in stderr_lower:
-                conn.status = "disconnected"
-                db.commit()
-                return {
-                    "status": "disconnected",
-                    "message": "tailscaled daemon not running. Ensure daemon is started (TAILSCALE_ENABLED=true)."
-                }
-            conn.status = "error"
-            db.commit()
-            return {"status": "error", "message": f"Unexpected Tailscale status failure: {result.stderr.strip() or result.stdout.strip()}"}
-    except FileNotFoundError:
+    # Fresh status for an explicit test (joins a refresh already in flight)
+    ts_status = await tailscale_state.refresh()
+    if ts_status.ok:
+        self_node = ts_status.raw.get("Self", {})
+        conn.status = "connected"
+        db.commit()
+        return {
+            "status": "connected",
+            "message": "Tailscale is running",
+            "hostname": self_node.get("HostName") or self_node.get("DNSName"),
+            "ips": self_node.get("TailscaleIPs", []),
+            "peerCount": len(ts_status.raw.get("Peer") or {})
+        }
+
+    reason = ts_status.snapshot["status"]
+    if reason == "tailscale_not_installed":
         conn.status = "error"
         db.commit()
         return {"status": "error", "message": "Tailscale binary not found (not installed)"}
-    except Exception as e:
-        conn.status = "error"
+    error_lower = (ts_status.error or "").lower()
+    if reason == "tailscale_not_running" and ("tailscaled" in error_lower or "not running" in error_lower):
+        conn.status = "disconnected"
         db.commit()
-        return {"status": "error", "message": f"Error testing Tailscale: {str(e)}"}
+        return {
+            "status": "disconnected",
+            "message": "tailscaled daemon not running. Ensure daemon is started (TAILSCALE_ENABLED=true)."
+        }
+    conn.status = "error"
+    db.commit()
+    if reason == "tailscale_not_running":
+        return {"status": "error", "message": f"Unexpected Tailscale status failure: {ts_status.error}"}
+    return {"status": "error", "message": f"Error testing Tailscale: {ts_status.error}"}
 
 
 @router.put("/openai")
@@ -201,6 +182,9 @@ async def update_openai(
     conn.status = "configured" if config.enabled else "unconfigured"
     
     db.commit()
+    provider_clients.reset_openai()
+    openai_model_catalog.invalidate()
+    manager.emit_global("provider_status", {"provider": "openai", "status": conn.status})
     
     return {"message": "OpenAI configuration updated"}
 
@@ -240,25 +224,22 @@ async def test_openai(
         except Exception:
             pass
 
-        client = OpenAI(api_key=api_key)
+        client = provider_clients.openai(api_key)
         env_priority = os.getenv("OPENAI_MODEL_PRIORITY", "gpt-4o-mini,gpt-4o,gpt-4.1-mini,gpt-4.1,gpt-3.5-turbo")
         fallbacks = [model] + [m.strip() for m in env_priority.split(',') if m.strip()]
 
-        try:
-            for mdl in client.models.list().data:
-                if hasattr(mdl, 'id'):
-                    available_models.add(mdl.id)
-        except Exception as e:
-            print(f"[openai] models.list failed (non-fatal): {e}")
+        available_models.update(await openai_model_catalog.get_models(client, api_key))
 
         for m in fallbacks:
             if m in tried:
                 continue
             tried.append(m)
+            if openai_model_catalog.is_missing(api_key, m):
+                continue
             try:
                 if available_models and m not in available_models:
                     raise Exception(f"Model '{m}' not available to this key")
-                response = client.chat.completions.create(
+                response = await client.chat.completions.create(
                     model=m,
                     messages=[{"role": "user", "content": "Say 'test successful' if you receive this."}],
                     max_tokens=10
@@ -285,7 +266,8 @@ async def test_openai(
                     conn.status = "error"
                     db.commit()
                     return {"status": "error", "message": f"Quota/billing issue: {str(e)}", "tried": tried, "available_models_sample": list(available_models)[:25]}
-                if ("model" in err_lower and "not" in err_lower and "found" in err_lower) or ("model" in err_lower and "not" in err_lower and "exist" in err_lower) or ("model" in err_lower and "not" in err_lower and "available" in err_lower):
+                if is_model_not_found_error(err_lower):
+                    openai_model_catalog.mark_missing(api_key, m)
                     continue
                 continue
         conn.status = "error"
@@ -327,11 +309,8 @@ async def debug_openai(
     error_models = None
     if api_key_present:
         try:
-            client = OpenAI(api_key=api_key_val)
-            for mdl in client.models.list().data:
-                mid = getattr(mdl, 'id', None)
-                if isinstance(mid, str):
-                    available_models.append(mid)
+            client = provider_clients.openai(api_key_val)
+            available_models = sorted(await openai_model_catalog.get_models(client, api_key_val))
         except Exception as e:
             error_models = str(e)
     return {
@@ -343,7 +322,8 @@ async def debug_openai(
         "env_priority": priority_env,
         "available_models_count": len(available_models),
         "available_models_sample": available_models[:25],
-        "model_listing_error": error_models
+        "model_listing_error": error_models,
+        "model_cache": openai_model_catalog.stats()
     }
 
 
@@ -360,6 +340,7 @@ async def update_ollama(
         conn = Connection(service="ollama")
         db.add(conn)
     
+    old_endpoint = json.loads(conn.config).get("endpoint") if conn.config else None
     conn.enabled = config.enabled
     conn.config = json.dumps({
         "endpoint": config.endpoint,
@@ -368,6 +349,21 @@ async def update_ollama(
     conn.status = "configured" if config.enabled else "unconfigured"
     
     db.commit()
+    # The default URL keeps its client and warm pool (the ChatOps console uses it)
+    if old_endpoint and old_endpoint != config.endpoint and normalize_url(old_endpoint) != DEFAULT_OLLAMA_URL:
+        provider_clients.reset_http(old_endpoint)
+        ollama_models.forget(old_endpoint)
+    if config.enabled:
+        provider_clients.configure_http(config.endpoint)
+        # Keep the configured model loaded (warmed now if the endpoint is up)
+        ollama_models.configure(config.endpoint, config.model)
+    elif normalize_url(config.endpoint) == DEFAULT_OLLAMA_URL:
+        # Still managed without a Connections model, as at startup (configure_from_db)
+        ollama_models.configure(DEFAULT_OLLAMA_URL)
+    else:
+        # Disabled: no /api/ps polling or warm-up
+        ollama_models.forget(config.endpoint)
+    manager.emit_global("provider_status", {"provider": "ollama", "url": normalize_url(config.endpoint), "status": conn.status})
     
     return {"message": "Ollama configuration updated"}
 
@@ -389,41 +385,41 @@ async def test_ollama(
     try:
         config_data = json.loads(conn.config)
         endpoint = config_data.get("endpoint", "http://localhost:11434")
-        model = config_data.get("model", "gemma:2b")
+        model = config_data.get("model") or OLLAMA_MODEL
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{endpoint}/api/generate",
-                json={
-                    "model": model,
-                    "prompt": "Say 'test successful' if you receive this.",
-                    "stream": False
-                },
-                timeout=30.0
-            )
+        client = provider_clients.http(endpoint)
+        response = await client.post(
+            "/api/generate",
+            json=ollama_models.payload(endpoint, model, {
+                "model": model,
+                "prompt": "Say 'test successful' if you receive this.",
+                "stream": False
+            }),
+            timeout=30.0
+        )
             
-            if response.status_code == 200:
-                conn.status = "connected"
-                db.commit()
+        if response.status_code == 200:
+            conn.status = "connected"
+            db.commit()
                 
-                data = response.json()
-                return {
-                    "status": "connected",
-                    "message": "Ollama connection successful",
-                    "response": data.get("response", "")
-                }
-            else:
-                conn.status = "error"
-                db.commit()
-                error_detail = ""
-                try:
-                    error_detail = response.json()
-                except:
-                    error_detail = response.text
-                return {
-                    "status": "error", 
-                    "message": f"Ollama returned status {response.status_code}. Model: {model}. Error: {error_detail}"
-                }
+            data = response.json()
+            return {
+                "status": "connected",
+                "message": "Ollama connection successful",
+                "response": data.get("response", "")
+            }
+        else:
+            conn.status = "error"
+            db.commit()
+            error_detail = ""
+            try:
+                error_detail = response.json()
+            except:
+                error_detail = response.text
+            return {
+                "status": "error", 
+                "message": f"Ollama returned status {response.status_code}. Model: {model}. Error: {error_detail}"
+            }
     except httpx.TimeoutException:
         conn.status = "error"
         db.commit()
@@ -10,6 +10,8 @@ from datetime import datetime
 from database import get_db
 from models import User, Device
 from auth_utils import get_current_active_user, require_admin
+from auth.identity import identity_cache
+from presence import presence_store
 
 router = APIRouter()
 
@@ -84,6 +86,8 @@ async def remove_device(
     
     db.delete(device)
     db.commit()
+    presence_store.invalidate()
+    identity_cache.invalidate()
     
     # Update user's device count
     user = db.query(User).filter(User.id == device.user_id).first()
@@ -122,6 +126,8 @@ async def deactivate_device(
     
     device.is_active = False
     db.commit()
+    presence_store.invalidate()
+    identity_cache.invalidate()
     
     # Update user's device count
     user = db.query(User).filter(User.id == device.user_id).first()
@@ -1,13 +1,18 @@
 # fastapi-backend/routers/rooms.py
 
+import base64
+import json
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import exists, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
 
-from database import get_db
+from database import get_async_db, get_db
 from models import Thread, Message, User, RoomMember
 from auth.current_user import get_current_user
 from auth.room_permissions import (
@@ -15,6 +20,11 @@ from auth.room_permissions import (
     require_membership,
     can_add_members,
 )
+from conversation_memory import conversation_memory
+from message_search import SEARCH_AVAILABLE, search_messages
+from message_store import insert_message
+from read_state import mark_read_bulk
+from websocket_manager import manager, message_payload, room_payload
 
 router = APIRouter()
 
@@ -33,6 +43,8 @@ class RoomOut(BaseModel):
     total_messages: Optional[int] = 0  # Phase 6B
     total_ai_requests: Optional[int] = 0  # Phase 6B
     last_activity_at: Optional[datetime] = None  # Phase 6B
+    unread_count: Optional[int] = 0  # Current user's unread messages
+    last_read_message_id: Optional[int] = None  # Current user's read cursor
 
     class Config:
         from_attributes = True
@@ -88,6 +100,31 @@ class SelfDestructRequest(BaseModel):
     duration: str  # "7d", "30d", "90d", "never"
 
 
+class ReadPosition(BaseModel):
+    room_id: int
+    message_id: Optional[int] = None  # None = everything up to the newest message
+
+
+class MarkReadRequest(BaseModel):
+    rooms: List[ReadPosition]
+
+
+class ReadStateOut(BaseModel):
+    room_id: int
+    unread_count: int
+
+
+class SearchResultOut(BaseModel):
+    """A matching message; snippet is HTML-escaped with <mark> around the hits"""
+    id: int
+    thread_id: int
+    room_name: str
+    user_id: Optional[int] = None
+    sender: str
+    timestamp: Optional[datetime] = None
+    snippet: str
+
+
 # ---------- Helpers ----------
 
 def get_default_user(db: Session) -> User:
@@ -134,6 +171,45 @@ def get_or_create_default_room(db: Session) -> Thread:
     return room
 
 
+def member_out(membership: RoomMember, user: User) -> dict:
+    return {
+        "user_id": user.id,
+        "name": user.name,
+        "handle": user.handle,
+        "role": membership.role,
+        "joined_at": membership.created_at,
+    }
+
+
+def claim_orphaned_rooms(db: Session, user: User) -> int:
+    """
+    Add `user` as owner of every room that has no members.
+    One anti-join query (index on room_members.thread_id) and one executemany
+    insert in a single commit, instead of a COUNT + commit per room.
+    Concurrent loads (several tabs) can find the same orphans; the insert
+    skips rows the unique (thread_id, user_id) index already holds.
+    """
+    orphan_ids = [
+        row[0]
+        for row in db.query(Thread.id)
+        .filter(~exists().where(RoomMember.thread_id == Thread.id))
+        .all()
+    ]
+    if not orphan_ids:
+        return 0
+
+    now = datetime.utcnow()
+    db.execute(
+        sqlite_insert(RoomMember).on_conflict_do_nothing(index_elements=["thread_id", "user_id"]),
+        [
+            {"thread_id": thread_id, "user_id": user.id, "role": "owner", "created_at": now, "unread_count": 0}
+            for thread_id in orphan_ids
+        ],
+    )
+    db.commit()
+    return len(orphan_ids)
+
+
 def ensure_membership_for_current_user(db: Session, thread_id: int):
     """
     Self-heal membership for legacy rooms.
@@ -181,48 +257,119 @@ def ensure_membership_for_current_user(db: Session, thread_id: int):
         db.commit()
 
 
+def authorize_room_access(db: Session, room_id: int) -> User:
+    """Self-heal membership, then require it; returns the current user"""
+    ensure_membership_for_current_user(db, room_id)
+    current_user = get_current_user(db)
+    require_membership(db, current_user, room_id)
+    return current_user
+
+
 # ---------- Routes ----------
+# The hot read/write paths (listing, history, posting, read state, members)
+# are async handlers on an AsyncSession so a slow query never blocks the event
+# loop; sync helpers run on it through `await db.run_sync(...)`. Management
+# routes stay plain `def` handlers, which FastAPI runs in its threadpool.
 
 @router.get("/api/rooms", response_model=List[RoomOut])
-def list_rooms(db: Session = Depends(get_db)):
+async def list_rooms(db: AsyncSession = Depends(get_async_db)):
     """
     Return rooms where the current user is a member.
     Phase 6B: All users (including admins) only see rooms they're members of in main chat UI.
     Self-heals membership for legacy rooms with no members.
     """
-    current_user = get_current_user(db)
+    current_user = await db.run_sync(get_current_user)
     
     # Ensure at least one room exists
-    get_or_create_default_room(db)
+    await db.run_sync(get_or_create_default_room)
     
-    # Get all rooms to check for orphaned ones
-    all_rooms = db.query(Thread).all()
-    
-    # Self-heal: ensure membership for rooms with zero members
+    # Self-heal: claim rooms with zero members as owner, in one batched transaction
     # Skip for admins to prevent auto-joining all orphaned rooms
     if current_user.role != "admin":
-        for room in all_rooms:
-            member_count = db.query(RoomMember).filter(RoomMember.thread_id == room.id).count()
-            if member_count == 0:
-                ensure_membership_for_current_user(db, room.id)
-    
-    # Return only rooms where current user is a member
-    user_room_ids = (
-        db.query(RoomMember.thread_id)
-        .filter(RoomMember.user_id == current_user.id)
-        .all()
-    )
-    room_ids = [r[0] for r in user_room_ids]
-    
-    rooms = (
-        db.query(Thread)
-        .filter(Thread.id.in_(room_ids))
+        await db.run_sync(claim_orphaned_rooms, current_user)
+    
+    # Return only rooms where current user is a member, with the member's
+    # read state (unread counters are maintained on insert, never counted here)
+    result = await db.execute(
+        select(Thread, RoomMember.unread_count, RoomMember.last_read_message_id)
+        .join(RoomMember, RoomMember.thread_id == Thread.id)
+        .where(RoomMember.user_id == current_user.id)
         .order_by(Thread.updated_at.desc())
-        .all()
     )
+    rows = result.all()
+    rooms = []
+    for room, unread_count, last_read_message_id in rows:
+        out = RoomOut.model_validate(room)
+        out.unread_count = unread_count or 0
+        out.last_read_message_id = last_read_message_id
+        rooms.append(out)
     return rooms
 
 
+@router.post("/api/rooms/read", response_model=List[ReadStateOut])
+async def mark_rooms_read(payload: MarkReadRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Bulk "mark read": move the current user's read cursor in several rooms at once.
+    Rooms the user is not a member of are ignored.
+    """
+    current_user = await db.run_sync(get_current_user)
+    result = await db.run_sync(
+        mark_read_bulk,
+        current_user.id,
+        [(position.room_id, position.message_id) for position in payload.rooms],
+    )
+    await db.commit()
+    return [{"room_id": room_id, "unread_count": count} for room_id, count in result.items()]
+
+
+@router.get("/api/rooms/search", response_model=List[SearchResultOut])
+async def search_room_messages(
+    q: str,
+    response: Response,
+    room_id: Optional[int] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    prefix: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Full-text search over messages in the current user's rooms (FTS5, best match first).
+    Every word must match; prefix=true also matches the last word as a prefix (search-as-you-type).
+    room_id narrows the search to one room. X-Next-Cursor is set when more results exist.
+    """
+    if not SEARCH_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Message search requires SQLite (FTS5)")
+
+    current_user = await db.run_sync(get_current_user)
+    if room_id is not None:
+        await db.run_sync(authorize_room_access, room_id)
+
+    after = _decode_search_cursor(cursor) if cursor is not None else None
+    limit = min(max(limit, 1), 50)
+    results, next_after = await db.run_sync(
+        search_messages, current_user.id, q, room_id=room_id, limit=limit, after=after, prefix=prefix
+    )
+    if next_after is not None:
+        response.headers["X-Next-Cursor"] = _encode_search_cursor(*next_after)
+    return results
+
+
+def _encode_search_cursor(rank: float, message_id: int, floor: int, ceiling: int) -> str:
+    raw = json.dumps({"r": rank, "id": message_id, "w": [floor, ceiling]}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_search_cursor(token: str):
+    """Return (rank, id, window floor, window ceiling) for an opaque search cursor token"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+        floor, ceiling = data["w"]
+        return float(data["r"]), int(data["id"]), int(floor), int(ceiling)
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/api/admin/rooms/all", response_model=List[RoomOut])
 def list_all_rooms_admin(db: Session = Depends(get_db)):
     """
@@ -298,126 +445,189 @@ def create_room(payload: RoomCreateRequest, db: Session = Depends(get_db)):
     "/api/rooms/{room_id}/messages",
     response_model=List[MessageOut],
 )
-def get_room_messages(
+async def get_room_messages(
     room_id: int,
+    response: Response,
     limit: int = 50,
     before: Optional[int] = None,
-    db: Session = Depends(get_db),
+    after: Optional[int] = None,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
-    Return messages for a room ordered oldest->newest.
-    Supports simple 'before id' pagination.
+    Return one page of messages for a room, ordered oldest->newest.
+    Keyset-paginated on Message.id (index ix_messages_thread_id_id):
+      - no cursor: the latest `limit` messages
+      - before=<id>: the `limit` messages just older than <id>
+      - after=<id>: the `limit` messages just newer than <id>
+      - cursor=<token>: an opaque token from X-Before-Cursor / X-After-Cursor
+    X-Before-Cursor is set when older messages exist; X-After-Cursor resumes
+    from the newest message on the page. With after=, X-Has-Newer is "true"
+    when more than `limit` newer messages remained (fetch again right away)
+    and "false" once the page reached the newest message.
     Requires membership in the room.
     """
-    # Self-heal membership if needed
-    ensure_membership_for_current_user(db, room_id)
-    
-    # Require membership to view messages
-    current_user = get_current_user(db)
-    require_membership(db, current_user, room_id)
-    
-    query = db.query(Message).filter(Message.thread_id == room_id)
+    # Self-heal membership if needed, then require it to view messages
+    await db.run_sync(authorize_room_access, room_id)
+
+    if cursor is not None:
+        before, after = _decode_message_cursor(cursor)
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+
+    limit = min(max(limit, 1), 100)
+    query = select(Message).where(Message.thread_id == room_id)
+
+    # Fetch one extra row to know whether another page exists past this one
+    if after is not None:
+        result = await db.scalars(query.where(Message.id > after).order_by(Message.id.asc()).limit(limit + 1))
+        rows = result.all()
+        messages = rows[:limit]
+        has_older = True
+        response.headers["X-Has-Newer"] = "true" if len(rows) > limit else "false"
+    else:
+        if before is not None:
+            query = query.where(Message.id < before)
+        result = await db.scalars(query.order_by(Message.id.desc()).limit(limit + 1))
+        rows = result.all()
+        has_older = len(rows) > limit
+        messages = list(reversed(rows[:limit]))
+
+    if messages:
+        if has_older:
+            response.headers["X-Before-Cursor"] = _encode_message_cursor("before", messages[0].id)
+        response.headers["X-After-Cursor"] = _encode_message_cursor("after", messages[-1].id)
+    elif after is not None:
+        # Nothing newer yet; the caller can keep polling from the same point
+        response.headers["X-After-Cursor"] = _encode_message_cursor("after", after)
+    return messages
 
-    if before is not None:
-        query = query.filter(Message.id < before)
 
-    messages = (
-        query.order_by(Message.timestamp.asc())
-        .limit(min(max(limit, 1), 100))
-        .all()
-    )
-    return messages
+def _encode_message_cursor(direction: str, message_id: int) -> str:
+    raw = json.dumps({"d": direction, "id": message_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_message_cursor(token: str):
+    """Return (before, after) for an opaque cursor token"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+        direction, message_id = data["d"], int(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if direction == "before":
+        return message_id, None
+    if direction == "after":
+        return None, message_id
+    raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @router.post(
     "/api/rooms/{room_id}/messages",
     response_model=MessageOut,
 )
-def create_room_message(
+async def create_room_message(
     room_id: int,
     payload: MessageCreateRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Create a new *user* message in the given room.
     Requires membership in the room.
     """
-    # Self-heal membership if needed
-    ensure_membership_for_current_user(db, room_id)
-    
-    # Require membership to send messages
-    current_user = get_current_user(db)
-    require_membership(db, current_user, room_id)
+    # Self-heal membership if needed, then require it to send messages
+    await db.run_sync(authorize_room_access, room_id)
     
     text = (payload.text or "").strip()
     if not text:
         raise HTTPException(status_code=400, detail="Message text is required.")
 
-    user = get_default_user(db)
+    user = await db.run_sync(get_default_user)
 
-    now = datetime.utcnow()
-    message = Message(
+    # Row, room metrics (Phase 6B) and read state in one transaction
+    message = await db.run_sync(
+        insert_message,
         thread_id=room_id,
         user_id=user.id,
         sender="CC",  # Chance / current user tag
         text=text,
-        timestamp=now,
     )
-    db.add(message)
+    # expire_on_commit=False: the message keeps its attributes, no refresh query needed
+    await db.commit()
+    manager.emit(room_id, "new_message", message_payload(message))
+    return message
 
-    # Phase 6B: Update room metrics and activity
-    thread = db.query(Thread).filter(Thread.id == room_id).first()
-    if thread:
-        thread.updated_at = now
-        thread.last_activity_at = now
-        thread.total_messages = (thread.total_messages or 0) + 1
 
-    db.commit()
-    db.refresh(message)
-    return message
+@router.get("/api/rooms/members", response_model=Dict[int, List[RoomMemberOut]])
+async def get_members_for_rooms(room_ids: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    """
+    Members of many rooms in one response: {room_id: [members]}.
+    room_ids is a comma-separated list; omitted = every room the current user is in.
+    Non-admins only get rooms they are a member of (others are left out).
+    One joined query regardless of room and member count.
+    """
+    current_user = await db.run_sync(get_current_user)
+
+    query = (
+        select(RoomMember, User)
+        .join(User, User.id == RoomMember.user_id)
+        .order_by(RoomMember.thread_id, RoomMember.id)
+    )
+
+    requested = None
+    if room_ids:
+        try:
+            requested = {int(part) for part in room_ids.split(",") if part.strip()}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="room_ids must be comma-separated integers")
+        query = query.where(RoomMember.thread_id.in_(requested))
+
+    if current_user.role != "admin" or requested is None:
+        # Restrict to the current user's rooms
+        own = aliased(RoomMember)
+        my_rooms = select(own.thread_id).where(own.user_id == current_user.id)
+        query = query.where(RoomMember.thread_id.in_(my_rooms))
+
+    result: Dict[int, List[dict]] = {}
+    if requested is not None:
+        for room_id in requested:
+            result[room_id] = []
+    for membership, user in (await db.execute(query)).all():
+        result.setdefault(membership.thread_id, []).append(member_out(membership, user))
+    if requested is not None and current_user.role != "admin":
+        # Requested rooms the user cannot see are omitted rather than shown empty
+        result = {room_id: members for room_id, members in result.items() if members}
+    return result
 
 
 @router.get("/api/rooms/{room_id}/members", response_model=List[RoomMemberOut])
-def get_room_members(room_id: int, db: Session = Depends(get_db)):
+async def get_room_members(room_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get all members of a room with their user information.
     Requires membership in the room (or global admin).
     Phase 6B: Global admins can view members without being added to room.
     """
-    current_user = get_current_user(db)
+    current_user = await db.run_sync(get_current_user)
     is_global_admin = current_user.role == "admin"
     
     # Only self-heal membership for non-admins
     if not is_global_admin:
-        ensure_membership_for_current_user(db, room_id)
-        require_membership(db, current_user, room_id)
+        await db.run_sync(authorize_room_access, room_id)
     
     # Verify room exists
-    room = db.query(Thread).filter(Thread.id == room_id).first()
+    room = await db.get(Thread, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    # Get all memberships for this room
-    memberships = (
-        db.query(RoomMember)
-        .filter(RoomMember.thread_id == room_id)
-        .all()
+    # Memberships joined to their users in one query
+    result = await db.execute(
+        select(RoomMember, User)
+        .join(User, User.id == RoomMember.user_id)
+        .where(RoomMember.thread_id == room_id)
     )
-    
-    # Build response with user info
-    result = []
-    for membership in memberships:
-        user = db.query(User).filter(User.id == membership.user_id).first()
-        if user:
-            result.append({
-                "user_id": user.id,
-                "name": user.name,
-                "handle": user.handle,
-                "role": membership.role,
-                "joined_at": membership.created_at,
-            })
-    
-    return result
+    rows = result.all()
+    return [member_out(membership, user) for membership, user in rows]
 
 
 @router.post("/api/rooms/{room_id}/members", response_model=RoomMemberOut)
@@ -460,33 +670,33 @@ def add_room_member(room_id: int, payload: AddMemberRequest, db: Session = Depen
     )
     if existing:
         # Return existing membership info
-        return {
-            "user_id": user.id,
-            "name": user.name,
-            "handle": user.handle,
-            "role": existing.role,
-            "joined_at": existing.created_at,
-        }
+        return member_out(existing, user)
     
     # Create new membership with default role "member"
+    # New members start with the existing history marked as read
     now = datetime.utcnow()
+    latest_message_id = (
+        db.query(Message.id)
+        .filter(Message.thread_id == room_id)
+        .order_by(Message.id.desc())
+        .limit(1)
+        .scalar()
+    )
     new_membership = RoomMember(
         thread_id=room_id,
         user_id=user_id,
         role="member",  # Default role
         created_at=now,
+        last_read_message_id=latest_message_id,
+        unread_count=0,
     )
     db.add(new_membership)
     db.commit()
     db.refresh(new_membership)
     
-    return {
-        "user_id": user.id,
-        "name": user.name,
-        "handle": user.handle,
-        "role": new_membership.role,
-        "joined_at": new_membership.created_at,
-    }
+    member = member_out(new_membership, user)
+    manager.emit(room_id, "member_added", {**member, "joined_at": new_membership.created_at.isoformat()})
+    return member
 
 
 # ========== PHASE 6 & 6B: ROOM SETTINGS & ADVANCED MANAGEMENT ==========
@@ -527,6 +737,7 @@ def update_room(
     room.updated_at = now
     db.commit()
     db.refresh(room)
+    manager.emit(room_id, "room_updated", room_payload(room))
     
     return room
 
@@ -569,6 +780,7 @@ def set_self_destruct(
     room.updated_at = now
     db.commit()
     db.refresh(room)
+    manager.emit(room_id, "room_updated", room_payload(room))
     
     return {
         "success": True,
@@ -652,5 +864,7 @@ def delete_room(
     # Delete room (CASCADE will handle messages and memberships)
     db.delete(room)
     db.commit()
+    conversation_memory.forget(room_id)
+    manager.emit(room_id, "room_deleted", {"id": room_id})
     
     return {"success": True, "message": f"Room '{room.name}' deleted successfully"}
@@ -2,19 +2,25 @@
 System monitoring and management routes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import psutil
 import os
 import subprocess
 import requests
+import time
 from datetime import datetime, timedelta
 
 from database import get_db
 from models import User, SystemLog
 from schemas import SystemHealthResponse, SystemLogResponse
 from auth_utils import get_current_active_user, require_admin
+from metrics_sampler import metrics_sampler, METRICS_BUFFER_SECONDS, NUMERIC_FIELDS
+from metrics_store import metrics_store, RESOLUTIONS, TIERS
+from presence import last_seen_label
+from tailscale_state import tailscale_state
+from tailscale_watch import tailscale_watcher
 
 router = APIRouter()
 
@@ -68,9 +74,21 @@ async def get_tailscale_summary():
     Get Tailscale network summary.
     No authentication required for ChatOps console.
     
-    Note: Using simple process check instead of CLI parsing due to 
+    While the IPN watcher is live the counts come from its peer table (no CLI
+    call), and the console refetches on the hub's peer_* events.
+    Note: Otherwise using simple process check instead of CLI parsing due to 
     subprocess timeout issues when running tailscale status from uvicorn.
     """
+    if tailscale_watcher.live:
+        snapshot = await tailscale_state.snapshot()
+        return {
+            "devices_online": snapshot["online_count"],
+            "devices_total": snapshot["total_count"],
+            "exit_node": "none",
+            "last_check": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "status": "connected"
+        }
+
     # Simple process-based check (reliable)
     is_running = is_tailscale_running()
     
@@ -87,289 +105,41 @@ async def get_tailscale_summary():
 async def get_network_snapshot():
     """
     Get detailed network snapshot with device roles and real-time status.
-    Treats 'home-hub' as primary hub, 'home-hub-1' as dev hub.
+    Roles come from TAILSCALE_ROLE_RULES ('home-hub' is the primary hub,
+    'home-hub-1' the dev hub by default).
     No authentication required for AI context.
+    Served from the shared Tailscale status cache (see tailscale_state.py).
     """
-    try:
-        result = subprocess.run(
-            ["tailscale", "status", "--json"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        
-        if result.returncode == 0:
-            import json
-            status_data = json.loads(result.stdout)
-            
-            peers = status_data.get("Peer", {})
-            self_info = status_data.get("Self", {})
-            
-            # Build device list with roles
-            devices = []
-            primary_hub_online = False
-            dev_hub_online = False
-            
-            # Add self first
-            self_hostname = self_info.get("HostName", "unknown")
-            self_dnsname = self_info.get("DNSName", "unknown").rstrip(".")
-            self_ips = self_info.get("TailscaleIPs", [])
-            self_online = True  # Self is always "online" if we're running
-            
-            # Determine self role based on DNSName (more reliable than HostName)
-            self_role = "client"
-            dns_lower = self_dnsname.lower()
-            if "home-hub-1" in dns_lower:
-                self_role = "dev-hub"
-                dev_hub_online = True
-            elif "home-hub" in dns_lower:
-                self_role = "primary-hub"
-                primary_hub_online = True
-            
-            devices.append({
-                "id": self_info.get("PublicKey", "self")[:16],
-                "name": self_dnsname,
-                "ips": self_ips,
-                "online": True,
-                "role": self_role,
-                "is_self": True
-            })
-            
-            # Add peers
-            for peer_key, peer_data in peers.items():
-                peer_hostname = peer_data.get("HostName", "unknown")
-                peer_dnsname = peer_data.get("DNSName", "unknown").rstrip(".")
-                peer_ips = peer_data.get("TailscaleIPs", [])
-                peer_online = peer_data.get("Online", False)
-                
-                # Skip Tailscale infrastructure nodes (funnel-ingress-node)
-                if "funnel-ingress-node" in peer_hostname.lower():
-                    continue
-                
-                # Determine peer role based on DNSName
-                peer_role = "client"
-                dns_lower = peer_dnsname.lower()
-                if "home-hub-1" in dns_lower:
-                    peer_role = "dev-hub"
-                    if peer_online:
-                        dev_hub_online = True
-                elif "home-hub" in dns_lower:
-                    peer_role = "primary-hub"
-                    if peer_online:
-                        primary_hub_online = True
-                
-                devices.append({
-                    "id": peer_key[:16],
-                    "name": peer_dnsname,
-                    "ips": peer_ips,
-                    "online": peer_online,
-                    "role": peer_role,
-                    "is_self": False
-                })
-            
-            # Filter to online devices for summary
-            online_devices = [d for d in devices if d["online"]]
-            
-            return {
-                "devices": devices,
-                "online_count": len(online_devices),
-                "total_count": len(devices),
-                "primary_hub_online": primary_hub_online,
-                "dev_hub_online": dev_hub_online,
-                "timestamp": datetime.now().isoformat(),
-                "status": "ok"
-            }
-        else:
-            return {
-                "devices": [],
-                "online_count": 0,
-                "total_count": 0,
-                "primary_hub_online": False,
-                "dev_hub_online": False,
-                "timestamp": datetime.now().isoformat(),
-                "status": "tailscale_not_running",
-                "error": result.stderr.strip() or "Tailscale not running"
-            }
-    
-    except FileNotFoundError:
-        return {
-            "devices": [],
-            "online_count": 0,
-            "total_count": 0,
-            "primary_hub_online": False,
-            "dev_hub_online": False,
-            "timestamp": datetime.now().isoformat(),
-            "status": "tailscale_not_installed",
-            "error": "Tailscale binary not found"
-        }
-    except Exception as e:
-        return {
-            "devices": [],
-            "online_count": 0,
-            "total_count": 0,
-            "primary_hub_online": False,
-            "dev_hub_online": False,
-            "timestamp": datetime.now().isoformat(),
-            "status": "error",
-            "error": str(e)
-        }
+    return await tailscale_state.snapshot()
 
 
-@router.get("/tailscale/snapshot")
-async def get_network_snapshot():
-    """
-    Get detailed network snapshot with device roles and real-time status.
-    Treats 'home-hub' as primary hub, 'home-hub-1' as dev hub.
-    No authentication required for AI context.
-    """
-    try:
-        result = subprocess.run(
-            ["tailscale", "status", "--json"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        
-        if result.returncode == 0:
-            import json
-            status_data = json.loads(result.stdout)
-            
-            peers = status_data.get("Peer", {})
-            self_info = status_data.get("Self", {})
-            
-            # Build device list with roles
-            devices = []
-            primary_hub_online = False
-            dev_hub_online = False
-            
-            # Add self first
-            self_hostname = self_info.get("HostName", "unknown")
-            self_dnsname = self_info.get("DNSName", "unknown").rstrip(".")
-            self_ips = self_info.get("TailscaleIPs", [])
-            self_online = True  # Self is always "online" if we're running
-            
-            # Determine self role based on DNSName (more reliable than HostName)
-            self_role = "client"
-            dns_lower = self_dnsname.lower()
-            if "home-hub-1" in dns_lower:
-                self_role = "dev-hub"
-                dev_hub_online = True
-            elif "home-hub" in dns_lower:
-                self_role = "primary-hub"
-                primary_hub_online = True
-            
-            devices.append({
-                "id": self_info.get("PublicKey", "self")[:16],
-                "name": self_dnsname,
-                "ips": self_ips,
-                "online": True,
-                "role": self_role,
-                "is_self": True
-            })
-            
-            # Add peers
-            for peer_key, peer_data in peers.items():
-                peer_hostname = peer_data.get("HostName", "unknown")
-                peer_dnsname = peer_data.get("DNSName", "unknown").rstrip(".")
-                peer_ips = peer_data.get("TailscaleIPs", [])
-                peer_online = peer_data.get("Online", False)
-                
-                # Skip Tailscale infrastructure nodes (funnel-ingress-node)
-                if "funnel-ingress-node" in peer_hostname.lower():
-                    continue
-                
-                # Determine peer role based on DNSName
-                peer_role = "client"
-                dns_lower = peer_dnsname.lower()
-                if "home-hub-1" in dns_lower:
-                    peer_role = "dev-hub"
-                    if peer_online:
-                        dev_hub_online = True
-                elif "home-hub" in dns_lower:
-                    peer_role = "primary-hub"
-                    if peer_online:
-                        primary_hub_online = True
-                
-                devices.append({
-                    "id": peer_key[:16],
-                    "name": peer_dnsname,
-                    "ips": peer_ips,
-                    "online": peer_online,
-                    "role": peer_role,
-                    "is_self": False
-                })
-            
-            # Filter to online devices for summary
-            online_devices = [d for d in devices if d["online"]]
-            
-            return {
-                "devices": devices,
-                "online_count": len(online_devices),
-                "total_count": len(devices),
-                "primary_hub_online": primary_hub_online,
-                "dev_hub_online": dev_hub_online,
-                "timestamp": datetime.now().isoformat(),
-                "status": "ok"
-            }
-        else:
-            return {
-                "devices": [],
-                "online_count": 0,
-                "total_count": 0,
-                "primary_hub_online": False,
-                "dev_hub_online": False,
-                "timestamp": datetime.now().isoformat(),
-                "status": "tailscale_not_running",
-                "error": result.stderr.strip() or "Tailscale not running"
-            }
-    
-    except FileNotFoundError:
-        return {
-            "devices": [],
-            "online_count": 0,
-            "total_count": 0,
-            "primary_hub_online": False,
-            "dev_hub_online": False,
-            "timestamp": datetime.now().isoformat(),
-            "status": "tailscale_not_installed",
-            "error": "Tailscale binary not found"
-        }
-    except Exception as e:
-        return {
-            "devices": [],
-            "online_count": 0,
-            "total_count": 0,
-            "primary_hub_online": False,
-            "dev_hub_online": False,
-            "timestamp": datetime.now().isoformat(),
-            "status": "error",
-            "error": str(e)
-        }
+# Window for min/avg/max queries, in seconds (limited to what the sampler keeps)
+WindowParam = Query(None, ge=1, le=METRICS_BUFFER_SECONDS, description="min/avg/max over the last N seconds")
+
+
+def _network_status() -> str:
+    # None until the sampler's first probe finishes
+    return "Disconnected" if metrics_sampler.network_ok is False else "Connected"
+
 
 @router.get("/public/summary")
-async def get_public_system_summary():
-    """Lightweight unauthenticated summary for UI gauges (no sensitive data)."""
+async def get_public_system_summary(window: Optional[int] = WindowParam):
+    """Lightweight unauthenticated summary for UI gauges (no sensitive data).
+    Reads the background sampler; `window` adds min/avg/max over the last N seconds."""
     try:
-        cpu_percent = psutil.cpu_percent(interval=0.2)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        # Network quick check
-        network_status = "Connected"
-        try:
-            import socket
-            socket.create_connection(("8.8.8.8", 53), timeout=1.5)
-        except Exception:
-            network_status = "Disconnected"
-        net = psutil.net_io_counters()
-        return {
-            "cpu": cpu_percent,
-            "memory": memory.percent,
-            "disk": disk.percent,
+        sample = await metrics_sampler.current()
+        summary = {
+            "cpu": sample.cpu,
+            "memory": sample.memory,
+            "disk": sample.disk,
             "uptime": get_uptime(),
-            "networkStatus": network_status,
-            "bytes_sent": net.bytes_sent,
-            "bytes_recv": net.bytes_recv
+            "networkStatus": _network_status(),
+            "bytes_sent": sample.bytes_sent,
+            "bytes_recv": sample.bytes_recv
         }
+        if window:
+            summary["window"] = metrics_sampler.window(window)
+        return summary
     except Exception as e:
         return {"error": str(e)}
 
@@ -405,13 +175,32 @@ async def set_exit_node(payload: dict):
 
 def get_uptime() -> str:
     """Get system uptime"""
-    uptime_seconds = int((datetime.now() - datetime.fromtimestamp(psutil.boot_time())).total_seconds())
+    boot_time = metrics_sampler.static.get("boot_time") or psutil.boot_time()
+    uptime_seconds = int((datetime.now() - datetime.fromtimestamp(boot_time)).total_seconds())
     days = uptime_seconds // 86400
     hours = (uptime_seconds % 86400) // 3600
     minutes = (uptime_seconds % 3600) // 60
     return f"{days}d {hours}h {minutes}m"
 
 
+def get_last_backup() -> str:
+    """Age of the newest backup made by POST /backup"""
+    try:
+        backups = [entry for entry in os.scandir("backups") if entry.name.startswith("admin_panel_backup_")]
+    except OSError:
+        return "Never"
+    if not backups:
+        return "Never"
+    newest = max(entry.stat().st_mtime for entry in backups)
+    return last_seen_label(datetime.utcfromtimestamp(newest))
+
+
+def get_network_latency() -> str:
+    """Connect time of the sampler's last reachability probe"""
+    latency = metrics_sampler.network_latency_ms
+    return f"{latency:.0f}ms" if latency is not None else "n/a"
+
+
 def get_db_size() -> str:
     """Get database file size"""
     try:
@@ -429,35 +218,18 @@ def get_db_size() -> str:
 async def get_system_health(
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get system health metrics"""
-    # CPU usage
-    cpu_percent = psutil.cpu_percent(interval=1)
-    
-    # Memory usage
-    memory = psutil.virtual_memory()
-    memory_percent = memory.percent
-    
-    # Disk usage
-    disk = psutil.disk_usage('/')
-    disk_percent = disk.percent
-    
-    # Network status
-    network_status = "Connected"
-    try:
-        import socket
-        socket.create_connection(("8.8.8.8", 53), timeout=3)
-    except:
-        network_status = "Disconnected"
+    """Get system health metrics (latest background sample)"""
+    sample = await metrics_sampler.current()
     
     return {
-        "cpu": cpu_percent,
-        "memory": memory_percent,
-        "disk": disk_percent,
+        "cpu": sample.cpu,
+        "memory": sample.memory,
+        "disk": sample.disk,
         "uptime": get_uptime(),
         "dbSize": get_db_size(),
-        "lastBackup": "3h ago",  # You can implement actual backup tracking
-        "networkStatus": network_status,
-        "latency": "45ms"  # You can implement actual latency measurement
+        "lastBackup": get_last_backup(),
+        "networkStatus": _network_status(),
+        "latency": get_network_latency()
     }
 
 
@@ -537,45 +309,84 @@ async def create_backup(
 
 @router.get("/metrics")
 async def get_detailed_metrics(
+    window: Optional[int] = WindowParam,
     current_user: User = Depends(require_admin)
 ):
-    """Get detailed system metrics (admin only)"""
-    cpu_count = psutil.cpu_count()
-    cpu_freq = psutil.cpu_freq()
-    
-    memory = psutil.virtual_memory()
-    swap = psutil.swap_memory()
-    
-    disk = psutil.disk_usage('/')
+    """Get detailed system metrics (admin only); `window` adds min/avg/max over the last N seconds"""
+    sample = await metrics_sampler.current()
+    totals = metrics_sampler.static
+    cpu_freq = totals.get("cpu_freq_mhz")
     
-    network_io = psutil.net_io_counters()
-    
-    return {
+    metrics = {
         "cpu": {
-            "count": cpu_count,
-            "frequency": f"{cpu_freq.current:.0f} MHz" if cpu_freq else "Unknown",
-            "usage": psutil.cpu_percent(interval=1)
+            "count": totals.get("cpu_count"),
+            "frequency": f"{cpu_freq:.0f} MHz" if cpu_freq else "Unknown",
+            "usage": sample.cpu
         },
         "memory": {
-            "total": f"{memory.total / (1024**3):.2f} GB",
-            "available": f"{memory.available / (1024**3):.2f} GB",
-            "used": f"{memory.used / (1024**3):.2f} GB",
-            "percent": memory.percent
+            "total": f"{totals.get('memory_total', 0) / (1024**3):.2f} GB",
+            "available": f"{sample.memory_available / (1024**3):.2f} GB",
+            "used": f"{sample.memory_used / (1024**3):.2f} GB",
+            "percent": sample.memory
         },
         "swap": {
-            "total": f"{swap.total / (1024**3):.2f} GB",
-            "used": f"{swap.used / (1024**3):.2f} GB",
-            "percent": swap.percent
+            "total": f"{totals.get('swap_total', 0) / (1024**3):.2f} GB",
+            "used": f"{sample.swap_used / (1024**3):.2f} GB",
+            "percent": sample.swap
         },
         "disk": {
-            "total": f"{disk.total / (1024**3):.2f} GB",
-            "used": f"{disk.used / (1024**3):.2f} GB",
-            "free": f"{disk.free / (1024**3):.2f} GB",
-            "percent": disk.percent
+            "total": f"{totals.get('disk_total', 0) / (1024**3):.2f} GB",
+            "used": f"{sample.disk_used / (1024**3):.2f} GB",
+            "free": f"{sample.disk_free / (1024**3):.2f} GB",
+            "percent": sample.disk
         },
         "network": {
-            "bytes_sent": f"{network_io.bytes_sent / (1024**2):.2f} MB",
-            "bytes_recv": f"{network_io.bytes_recv / (1024**2):.2f} MB"
+            "bytes_sent": f"{sample.bytes_sent / (1024**2):.2f} MB",
+            "bytes_recv": f"{sample.bytes_recv / (1024**2):.2f} MB",
+            "send_rate": f"{sample.send_rate / 1024:.1f} KB/s",
+            "recv_rate": f"{sample.recv_rate / 1024:.1f} KB/s"
         },
         "uptime": get_uptime()
     }
+    if window:
+        metrics["window"] = metrics_sampler.window(window, NUMERIC_FIELDS)
+    return metrics
+
+
+@router.get("/metrics/series")
+def list_metric_series(
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Names of the recorded metric series (host.*, route.*, ai.*)"""
+    return {"series": metrics_store.series_names(db)}
+
+
+@router.get("/metrics/history")
+def get_metric_history(
+    series: List[str] = Query(..., description="Series name; repeat for several"),
+    start: Optional[float] = Query(None, description="Unix seconds (default: an hour before end)"),
+    end: Optional[float] = Query(None, description="Unix seconds (default: now)"),
+    resolution: Optional[int] = Query(None, description="Bucket width in seconds: 1, 60 or 3600 (default: picked from the range)"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Metric history for charts: avg/min/max/count per bucket.
+    Points reach the store every METRICS_FLUSH_INTERVAL seconds, so the newest few seconds may be missing.
+    """
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - 3600
+    if start >= end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be before end")
+    if resolution is not None and resolution not in RESOLUTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"resolution must be one of {', '.join(str(r) for r in RESOLUTIONS)}"
+        )
+    return {
+        "start": start,
+        "end": end,
+        "tiers": [{"resolution": r, "retention": retention} for r, retention in TIERS],
+        "series": [metrics_store.query(db, name, start, end, resolution) for name in series[:20]],
+    }
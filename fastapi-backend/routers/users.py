@@ -4,11 +4,13 @@ User management routes
 
 from fastapi import APIRouter, Depends, HTTPException, status, Body, Request
 from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from database import get_db
-from models import User, Device, Notification
+from database import get_async_db, get_db
+from models import User, Device, Notification, RoomMember
 from schemas import (
     UserResponse, UserCreate, UserUpdate,
     UserProfileResponse, UserProfileUpdate, UserProfileCreate,
@@ -17,12 +19,14 @@ from schemas import (
 from auth_utils import get_current_active_user, require_admin, require_moderator, get_password_hash
 from auth.current_user import get_current_user
 from tailscale_auth import get_user_by_tailscale_ip, get_client_ip
+from presence import presence_store
+from websocket_manager import manager
 
 router = APIRouter()
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_me(request: Request, db: Session = Depends(get_db)):
+async def get_me(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Get current user information via Tailscale IP detection.
     Falls back to default @chance if no Tailscale user found.
@@ -35,14 +39,14 @@ async def get_me(request: Request, db: Session = Depends(get_db)):
     logger.info(f"GET /me - Client IP: {client_ip}")
     
     # Try to find user by Tailscale IP
-    current_user = get_user_by_tailscale_ip(db, client_ip)
+    current_user = await db.run_sync(get_user_by_tailscale_ip, client_ip)
     
     if current_user:
         logger.info(f"GET /me - Found user by IP: {current_user.handle} (ID={current_user.id})")
     else:
         logger.warning(f"GET /me - No Tailscale user found for IP {client_ip}, using fallback")
         # Fallback to default user if no Tailscale match
-        current_user = get_current_user(db)
+        current_user = await db.run_sync(get_current_user)
         logger.info(f"GET /me - Fallback user: {current_user.handle} (ID={current_user.id})")
     
     return current_user
@@ -50,148 +54,51 @@ async def get_me(request: Request, db: Session = Depends(get_db)):
 
 
 @router.get("/admin/summary")
-async def get_user_summary(db: Session = Depends(get_db)):
+async def get_user_summary(db: AsyncSession = Depends(get_async_db)):
     """
     Get user summary for ChatOps console.
     No authentication required.
+    Served from the in-memory presence store (no per-user device queries).
     """
-    from datetime import datetime, timedelta
-    
-    # Get all users
-    all_users = db.query(User).all()
-    total_users = len(all_users)
-    
-    # Count active users (logged in within last 24 hours)
-    active_count = 0
-    for user in all_users:
-        latest_device = db.query(Device).filter(
-            Device.user_id == user.id,
-            Device.is_active == True
-        ).order_by(Device.last_active.desc()).first()
-        
-        if latest_device and latest_device.last_active:
-            time_diff = datetime.utcnow() - latest_device.last_active
-            if time_diff < timedelta(hours=24):
-                active_count += 1
-    
-    # Count admins
-    admin_count = db.query(User).filter(User.role == "admin").count()
-    
-    # Get first 4 users with details
-    user_list = []
-    for user in all_users[:4]:
-        # Check if active
-        latest_device = db.query(Device).filter(
-            Device.user_id == user.id,
-            Device.is_active == True
-        ).order_by(Device.last_active.desc()).first()
-        
-        is_active = False
-        if latest_device and latest_device.last_active:
-            time_diff = datetime.utcnow() - latest_device.last_active
-            is_active = time_diff < timedelta(hours=24)
-        
-        user_list.append({
-            "id": user.id,
-            "name": user.name,
-            "email": user.email,
-            "role": user.role,
-            "active": is_active
-        })
-    
-    return {
-        "total": total_users,
-        "active": active_count,
-        "admins": admin_count,
-        "users": user_list
-    }
+    await db.run_sync(presence_store.ensure_loaded)
+    return presence_store.summary()
 
 @router.get("/public/count")
-async def get_public_user_count(db: Session = Depends(get_db)):
+async def get_public_user_count(db: AsyncSession = Depends(get_async_db)):
     """Unauthenticated lightweight user count for drawer (no PII)."""
-    total = db.query(User).count()
+    total = await db.scalar(select(func.count(User.id)))
     return {"total": total}
 
 
 @router.get("/active/tailscale")
-async def get_active_tailscale_users(db: Session = Depends(get_db)):
+async def get_active_tailscale_users(db: AsyncSession = Depends(get_async_db)):
     """
     Get all active Tailscale users with their device info
     Shows online status, role, and Tailscale IP for multi-user testing
+    Served from the in-memory presence store.
     """
-    from datetime import datetime, timedelta
-    
-    # Get all Tailscale devices
-    tailscale_devices = db.query(Device).filter(
-        Device.is_tailscale_device == True
-    ).order_by(Device.last_active.desc()).all()
-    
-    active_users = []
-    for device in tailscale_devices:
-        user = db.query(User).filter(User.id == device.user_id).first()
-        if not user:
-            continue
-        
-        # Determine online status (active within last 5 minutes)
-        is_online = False
-        last_seen = "Never"
-        if device.last_active:
-            time_diff = datetime.utcnow() - device.last_active
-            is_online = time_diff < timedelta(minutes=5)
-            
-            if time_diff < timedelta(minutes=1):
-                last_seen = "Just now"
-            elif time_diff < timedelta(minutes=60):
-                mins = int(time_diff.total_seconds() / 60)
-                last_seen = f"{mins}m ago"
-            elif time_diff < timedelta(hours=24):
-                hours = int(time_diff.total_seconds() / 3600)
-                last_seen = f"{hours}h ago"
-            else:
-                days = int(time_diff.total_seconds() / 86400)
-                last_seen = f"{days}d ago"
-        
-        active_users.append({
-            "id": user.id,
-            "handle": user.handle,
-            "name": user.name,
-            "email": user.email,
-            "role": user.role,
-            "isOnline": is_online,
-            "lastSeen": last_seen,
-            "deviceName": device.tailscale_hostname or device.device_name,
-            "deviceType": device.device_type,
-            "tailscaleIp": device.tailscale_ip,
-            "lastActive": device.last_active.isoformat() if device.last_active else None
-        })
-    
-    return {
-        "users": active_users,
-        "total": len(active_users),
-        "online": sum(1 for u in active_users if u["isOnline"])
-    }
+    await db.run_sync(presence_store.ensure_loaded)
+    return presence_store.active_tailscale()
 
 
 @router.post("/heartbeat")
-async def user_heartbeat(db: Session = Depends(get_db)):
+async def user_heartbeat(db: AsyncSession = Depends(get_async_db)):
     """
     Update device last_active timestamp to show user is online
     Called periodically by frontend to maintain online status
+    Recorded in memory (O(1)); presence_store flushes to the database in batches.
     """
     from datetime import datetime
-    from fastapi import Request
     
     # For now, update the localhost device (home-hub)
     # In production, this would use IP-based auth from tailscale_auth.py
-    device = db.query(Device).filter(
-        Device.tailscale_ip == "100.88.23.90"  # home-hub
-    ).first()
+    await db.run_sync(presence_store.ensure_loaded)
+    device = presence_store.device_for_ip("100.88.23.90")  # home-hub
     
     if device:
-        device.last_active = datetime.utcnow()
-        device.is_active = True
-        db.commit()
-        return {"status": "ok", "device": device.device_name, "timestamp": device.last_active.isoformat()}
+        now = datetime.utcnow()
+        presence_store.touch(device.id, device.user_id, now)
+        return {"status": "ok", "device": device.device_name, "timestamp": now.isoformat()}
     
     return {"status": "no_device", "message": "No Tailscale device found"}
 
@@ -308,6 +215,7 @@ async def create_user(
     
     db.add(new_user)
     db.commit()
+    presence_store.invalidate()
     db.refresh(new_user)
     
     return new_user
@@ -337,6 +245,7 @@ async def update_user(
         user.role = user_data.role
     
     db.commit()
+    presence_store.invalidate()
     db.refresh(user)
     
     return user
@@ -363,8 +272,13 @@ async def delete_user(
             detail="Cannot delete your own account"
         )
     
+    # Memberships go with the user (cascade); tell the rooms' subscribers
+    room_ids = [row[0] for row in db.query(RoomMember.thread_id).filter(RoomMember.user_id == user_id).all()]
     db.delete(user)
     db.commit()
+    presence_store.invalidate()
+    for room_id in room_ids:
+        manager.remove_member(room_id, user_id)
     
     return {"message": "User deleted successfully"}
 
@@ -473,6 +387,7 @@ async def update_own_profile(
         current_user.handle = new_handle
     
     db.commit()
+    presence_store.invalidate()
     db.refresh(current_user)
     
     return current_user
@@ -612,6 +527,7 @@ async def update_my_profile(
         current_user.preferences = json.dumps(profile_data.preferences)
     
     db.commit()
+    presence_store.invalidate()
     db.refresh(current_user)
     
     return current_user
@@ -654,6 +570,7 @@ async def create_child_profile(
     
     db.add(new_user)
     db.commit()
+    presence_store.invalidate()
     db.refresh(new_user)
     
     return new_user
@@ -781,48 +698,30 @@ async def remove_user_permission(
 async def get_user_presence(
     user_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get online presence status for a user"""
-    from datetime import datetime, timedelta
-    
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    """Get online presence status for a user (from the in-memory presence store)"""
+    await db.run_sync(presence_store.ensure_loaded)
+    presence = presence_store.user_presence(user_id)
+    if presence is None and await db.scalar(select(User.id).where(User.id == user_id)):
+        # Created since the last directory refresh
+        await db.run_sync(presence_store.load)
+        presence = presence_store.user_presence(user_id)
+    if presence is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Get active devices
-    active_devices = db.query(Device).filter(
-        Device.user_id == user_id,
-        Device.is_active == True
-    ).all()
-    
-    # Determine online status based on last_active_at
-    status = "offline"
-    if user.last_active_at:
-        time_diff = datetime.utcnow() - user.last_active_at
-        if time_diff < timedelta(minutes=5):
-            status = "online"
-        elif time_diff < timedelta(hours=1):
-            status = "away"
-    
-    return {
-        "user_id": user_id,
-        "status": status,
-        "last_active_at": user.last_active_at,
-        "active_devices": len(active_devices)
-    }
+    return presence
 
 
 @router.post("/{user_id}/activity")
 async def update_user_activity(
     user_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user)
 ):
-    """Update last_active_at timestamp (called by clients periodically)"""
+    """Record user activity (called by clients periodically; batched by presence_store)"""
     
     # Only allow updating own activity
     if current_user.id != user_id:
@@ -831,9 +730,7 @@ async def update_user_activity(
             detail="Can only update own activity"
         )
     
-    from datetime import datetime
-    current_user.last_active_at = datetime.utcnow()
-    db.commit()
+    presence_store.touch_user(user_id)
     
     return {"message": "Activity updated"}
 
@@ -910,6 +807,7 @@ async def link_device_to_user(
         db.add(device)
     
     db.commit()
+    presence_store.invalidate()
     db.refresh(device)
     
     return {"message": f"Device {hostname} linked to user {user_id}", "device": device}
@@ -6,6 +6,8 @@ from pydantic import BaseModel, EmailStr, Field, ConfigDict
 from typing import Optional, List
 from datetime import datetime
 
+from ollama_config import OLLAMA_MODEL
+
 
 # ============================================
 # User Schemas
@@ -122,6 +124,20 @@ class ThreadResponse(BaseModel):
         from_attributes = True
 
 
+class ThreadSummaryResponse(BaseModel):
+    """Sidebar entry: thread plus a preview of its last message (no message bodies)"""
+    id: int
+    type: str
+    name: str
+    avatar: Optional[str]
+    lastMessage: Optional[str] = None
+    lastMessageId: Optional[int] = None
+    lastSender: Optional[str] = None
+    lastMessageAt: Optional[datetime] = None
+    unread: int = 0
+    timestamp: Optional[datetime] = None
+
+
 # ============================================
 # Connection Schemas
 # ============================================
@@ -141,7 +157,7 @@ class OpenAIConfig(BaseModel):
 class OllamaConfig(BaseModel):
     enabled: bool
     endpoint: str = "http://localhost:11434"
-    model: str = "llama2"
+    model: str = OLLAMA_MODEL
 
 
 class ConnectionsResponse(BaseModel):
@@ -293,6 +309,7 @@ class UserPresenceResponse(BaseModel):
     """User presence/online status"""
     user_id: int
     online: bool
+    status: Optional[str] = None  # online, away, offline
     last_active_at: Optional[datetime] = None
     active_devices: int
 
@@ -29,5 +29,8 @@ else
   echo "[start.sh] TAILSCALE_ENABLED not true; skipping tailscaled startup."
 fi
 
+# Bring the schema up to date before any worker starts
+python migrations.py
+
 # Run application
 exec uvicorn main:app --host 0.0.0.0 --port 8000 --log-level info
@@ -6,8 +6,10 @@ Auto-login users based on their Tailnet IP address
 from fastapi import Request, HTTPException, status
 from sqlalchemy.orm import Session
 from models import User, Device
-from datetime import datetime
-from typing import Optional
+from typing import Optional, Tuple
+from sqlalchemy.orm.attributes import set_committed_value
+from auth.identity import resolve_cached
+from presence import presence_store
 import logging
 
 logger = logging.getLogger(__name__)
@@ -49,7 +51,22 @@ def get_user_by_tailscale_ip(db: Session, ip_address: str) -> Optional[User]:
     """
     Get user by their Tailscale IP address
     Returns None if no matching device found
+    Memoized per request and cached per IP for a short TTL (auth.identity);
+    device last_active / user online writes are batched by presence.presence_store.
     """
+    user, device_id = resolve_cached(db, f"ip:{ip_address}", lambda: _lookup_user_by_ip(db, ip_address))
+
+    if device_id is not None:
+        presence_store.touch(device_id, user.id if user else None)
+        if user is not None and user.status != "online":
+            # Reflect the pending status in this response without a write
+            set_committed_value(user, "status", "online")
+
+    return user
+
+
+def _lookup_user_by_ip(db: Session, ip_address: str) -> Tuple[Optional[User], Optional[int]]:
+    """Uncached lookup: (user, tailscale device id or None)"""
     # Check if this is localhost (admin access from home-hub)
     if ip_address in ["127.0.0.1", "::1", "localhost"]:
         # Find the user linked to the home-hub device (100.88.23.90)
@@ -62,13 +79,13 @@ def get_user_by_tailscale_ip(db: Session, ip_address: str) -> Optional[User]:
             user = db.query(User).filter(User.id == home_hub_device.user_id).first()
             if user:
                 logger.info(f"Localhost access -> home-hub user: {user.handle}")
-                return user
+                return user, None
         
         # Fallback: return first admin user
         admin_user = db.query(User).filter(User.role == "admin").first()
         if admin_user:
             logger.info(f"Localhost access (fallback) -> Admin user: {admin_user.handle}")
-            return admin_user
+            return admin_user, None
     
     # Look up device by Tailscale IP
     device = db.query(Device).filter(
@@ -78,22 +95,14 @@ def get_user_by_tailscale_ip(db: Session, ip_address: str) -> Optional[User]:
     
     if not device:
         logger.warning(f"No Tailscale device found for IP: {ip_address}")
-        return None
-    
-    # Update device last_active timestamp
-    device.last_active = datetime.utcnow()
-    device.is_active = True
-    db.commit()
+        return None, None
     
     # Get associated user
     user = db.query(User).filter(User.id == device.user_id).first()
     if user:
-        # Update user status to online
-        user.status = "online"
-        db.commit()
         logger.info(f"Tailscale auth successful: {user.handle} ({ip_address})")
     
-    return user
+    return user, device.id
 
 
 async def get_current_user_from_ip(request: Request, db: Session) -> Optional[User]:
@@ -0,0 +1,302 @@
+"""
+Shared, cached view of `tailscale status --json`.
+
+The CLI runs as an asyncio subprocess (nothing blocks the event loop) and its
+parsed result is cached for TAILSCALE_STATUS_TTL seconds (default 10).
+Concurrent callers that find the cache stale share one in-flight CLI call
+(single flight) instead of each spawning their own process. The network
+snapshot route, the Connections test and the AI context all read from here.
+
+When the IPN watcher (tailscale_watch) is live, status() is served from its
+peer table instead, rebuilt only when the table changes; refresh() still runs
+the CLI.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import subprocess
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Pattern, Tuple
+
+logger = logging.getLogger(__name__)
+
+TAILSCALE_CLI = os.getenv("TAILSCALE_CLI", "tailscale")
+TAILSCALE_STATUS_TTL = float(os.getenv("TAILSCALE_STATUS_TTL", "10"))
+STATUS_TIMEOUT = 5.0
+
+
+def empty_snapshot(status: str, error: str) -> dict:
+    return {
+        "devices": [],
+        "online_count": 0,
+        "total_count": 0,
+        "primary_hub_online": False,
+        "dev_hub_online": False,
+        "timestamp": datetime.now().isoformat(),
+        "status": status,
+        "error": error
+    }
+
+
+def compile_role_rules(spec: str) -> List[Tuple[Pattern[str], str]]:
+    """"pattern=role,..." -> [(regex, role)]; patterns are case-insensitive regexes searched in the DNS name"""
+    rules = []
+    for item in spec.split(","):
+        pattern, _, role = item.strip().rpartition("=")
+        if pattern and role:
+            rules.append((re.compile(pattern, re.IGNORECASE), role.strip()))
+    return rules
+
+
+# Hostname patterns -> device role, first match wins (so home-hub-1 goes before home-hub)
+TAILSCALE_ROLE_RULES = compile_role_rules(
+    os.getenv("TAILSCALE_ROLE_RULES", "home-hub-1=dev-hub,home-hub=primary-hub")
+)
+DEFAULT_ROLE = "client"
+# Tailscale infrastructure nodes, matched on HostName, are left out of the snapshot
+INFRASTRUCTURE_HOSTS = re.compile("funnel-ingress-node", re.IGNORECASE)
+
+
+class NetworkDevice:
+    """One tailnet device in the network snapshot"""
+
+    __slots__ = ("id", "name", "ips", "online", "role", "is_self")
+
+    def __init__(self, id: str, name: str, ips: List[str], online: bool, role: str, is_self: bool):
+        self.id = id
+        self.name = name
+        self.ips = ips
+        self.online = online
+        self.role = role
+        self.is_self = is_self
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "ips": self.ips,
+            "online": self.online,
+            "role": self.role,
+            "is_self": self.is_self
+        }
+
+
+class SnapshotParser:
+    """
+    Network snapshots from `tailscale status --json` documents. Devices are
+    memoized per node on the raw fields they are built from, so between two
+    polls only nodes that changed are rebuilt (traffic counters and
+    handshake times always change and are ignored), and a status with no
+    changes reuses the previous device list as is. Roles are cached per
+    DNS name.
+    """
+
+    def __init__(self, rules: Optional[List[Tuple[Pattern[str], str]]] = None):
+        self.rules = TAILSCALE_ROLE_RULES if rules is None else rules
+        self._roles: Dict[str, str] = {}
+        # node key -> (raw fields, device or None for infrastructure nodes, device dict)
+        self._nodes: Dict[str, tuple] = {}
+        self._devices: List[NetworkDevice] = []
+        self._dicts: List[dict] = []
+        self._summary: dict = {}
+        self.counters = {"parsed": 0, "reused": 0, "nodes_built": 0}
+
+    def role(self, dns_name: str) -> str:
+        role = self._roles.get(dns_name)
+        if role is None:
+            role = next((role for pattern, role in self.rules if pattern.search(dns_name)), DEFAULT_ROLE)
+            self._roles[dns_name] = role
+        return role
+
+    def _build(self, key: str, fields: tuple, is_self: bool) -> tuple:
+        dns_name, host_name, online, ips = fields
+        self.counters["nodes_built"] += 1
+        # Skip Tailscale infrastructure nodes (funnel-ingress-node)
+        if not is_self and INFRASTRUCTURE_HOSTS.search(host_name or "unknown"):
+            return fields, None, None
+        # Role from DNSName (more reliable than HostName)
+        name = (dns_name or "unknown").rstrip(".")
+        device = NetworkDevice(key[:16], name, list(ips or []), is_self or bool(online), self.role(name), is_self)
+        return fields, device, device.to_dict()
+
+    def devices(self, status_data: dict) -> List[NetworkDevice]:
+        """Self first (always online if we're running), then the peers"""
+        self._parse(status_data)
+        return self._devices
+
+    def _parse(self, status_data: dict):
+        previous = self._nodes
+        nodes = {}
+        changed = False
+        self_info = status_data.get("Self") or {}
+        self_key = self_info.get("PublicKey", "self")
+        items = [(self_key, self_info)]
+        items.extend((status_data.get("Peer") or {}).items())
+        for key, data in items:
+            fields = (data.get("DNSName"), data.get("HostName"), data.get("Online"), data.get("TailscaleIPs"))
+            node = previous.get(key)
+            if node is None or node[0] != fields:
+                node = self._build(key, fields, key == self_key)
+                changed = True
+            nodes[key] = node
+        self._nodes = nodes
+        if not changed and len(nodes) == len(previous) and self._dicts:
+            self.counters["reused"] += 1
+            return
+        self.counters["parsed"] += 1
+        built = [node for node in nodes.values() if node[1] is not None]
+        self._devices = [node[1] for node in built]
+        self._dicts = [node[2] for node in built]
+        online = [device for device in self._devices if device.online]
+        self._summary = {
+            "devices": self._dicts,
+            "online_count": len(online),
+            "total_count": len(self._devices),
+            "primary_hub_online": any(device.role == "primary-hub" for device in online),
+            "dev_hub_online": any(device.role == "dev-hub" for device in online),
+        }
+
+    def snapshot(self, status_data: dict) -> dict:
+        """Device roles and online status from a parsed `tailscale status --json` document"""
+        self._parse(status_data)
+        return {**self._summary, "timestamp": datetime.now().isoformat(), "status": "ok"}
+
+
+# Process-wide parser shared by the CLI and watcher paths
+snapshot_parser = SnapshotParser()
+
+
+def parse_network_snapshot(status_data: dict) -> dict:
+    """Device roles and online status from a parsed `tailscale status --json` document"""
+    return snapshot_parser.snapshot(status_data)
+
+
+class TailscaleStatus:
+    """One `tailscale status --json` result: raw document (None on failure) and the derived snapshot"""
+
+    __slots__ = ("raw", "snapshot", "error", "fetched_at")
+
+    def __init__(self, raw: Optional[dict], snapshot: dict, error: Optional[str] = None):
+        self.raw = raw
+        self.snapshot = snapshot
+        self.error = error
+        self.fetched_at = time.monotonic()
+
+    @property
+    def ok(self) -> bool:
+        return self.raw is not None
+
+
+async def _run_cli(*args: str) -> Tuple[int, str, str]:
+    """(returncode, stdout, stderr) of a tailscale CLI call, killed after STATUS_TIMEOUT"""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            TAILSCALE_CLI, *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except NotImplementedError:
+        # Event loops without subprocess support (selector loop on Windows): use a worker thread
+        result = await asyncio.to_thread(
+            subprocess.run, [TAILSCALE_CLI, *args], capture_output=True, text=True, timeout=STATUS_TIMEOUT
+        )
+        return result.returncode, result.stdout, result.stderr
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), STATUS_TIMEOUT)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    return proc.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+
+class TailscaleState:
+    """TTL cache of the tailnet status with single-flight refreshes"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else TAILSCALE_STATUS_TTL
+        self._current: Optional[TailscaleStatus] = None
+        self._inflight: Optional[asyncio.Task] = None
+        # Live peer table (tailscale_watch.TailscaleWatcher), set in main.lifespan
+        self._watcher = None
+        self._watched: Optional[Tuple[int, TailscaleStatus]] = None
+        self.counters = {"hits": 0, "refreshes": 0, "joined": 0, "errors": 0, "from_watcher": 0}
+
+    def use_watcher(self, watcher):
+        """Serve status() from `watcher`'s peer table whenever it is live"""
+        self._watcher = watcher
+        self._watched = None
+
+    async def status(self, max_age: Optional[float] = None) -> TailscaleStatus:
+        """Cached status if younger than `max_age` (default: the TTL), otherwise a fresh one"""
+        watcher = self._watcher
+        if watcher is not None and watcher.live:
+            self.counters["from_watcher"] += 1
+            return self._from_watcher(watcher)
+        max_age = self.ttl_seconds if max_age is None else max_age
+        current = self._current
+        if current is not None and time.monotonic() - current.fetched_at < max_age:
+            self.counters["hits"] += 1
+            return current
+        return await self.refresh()
+
+    def _from_watcher(self, watcher) -> TailscaleStatus:
+        version = watcher.table.version
+        if self._watched is None or self._watched[0] != version:
+            raw = watcher.table.status_document()
+            self._watched = (version, TailscaleStatus(raw, parse_network_snapshot(raw)))
+        return self._watched[1]
+
+    async def snapshot(self) -> dict:
+        """Network snapshot (device roles, online counts) from the cached status"""
+        return (await self.status()).snapshot
+
+    async def refresh(self) -> TailscaleStatus:
+        """Run the CLI, or join the call already in flight"""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._fetch())
+        else:
+            self.counters["joined"] += 1
+        # shield: a cancelled caller must not cancel the call others are waiting on
+        return await asyncio.shield(self._inflight)
+
+    async def _fetch(self) -> TailscaleStatus:
+        self.counters["refreshes"] += 1
+        try:
+            returncode, stdout, stderr = await _run_cli("status", "--json")
+            if returncode == 0:
+                raw = json.loads(stdout)
+                status = TailscaleStatus(raw, parse_network_snapshot(raw))
+            else:
+                error = stderr.strip() or "Tailscale not running"
+                status = TailscaleStatus(None, empty_snapshot("tailscale_not_running", error), error)
+        except FileNotFoundError:
+            error = "Tailscale binary not found"
+            status = TailscaleStatus(None, empty_snapshot("tailscale_not_installed", error), error)
+        except (asyncio.TimeoutError, subprocess.TimeoutExpired):
+            error = f"tailscale status timed out after {STATUS_TIMEOUT:.0f}s"
+            status = TailscaleStatus(None, empty_snapshot("error", error), error)
+        except Exception as e:
+            status = TailscaleStatus(None, empty_snapshot("error", str(e)), str(e))
+        if not status.ok:
+            self.counters["errors"] += 1
+        self._current = status
+        return status
+
+    def stats(self) -> dict:
+        current = self._current
+        return {
+            **self.counters,
+            "ttl_seconds": self.ttl_seconds,
+            "parser": snapshot_parser.counters,
+            "watcher": self._watcher.stats() if self._watcher is not None else None,
+            "age_seconds": round(time.monotonic() - current.fetched_at, 1) if current is not None else None,
+        }
+
+
+# Process-wide state, shared by the system routes, Connections and the AI context
+tailscale_state = TailscaleState()
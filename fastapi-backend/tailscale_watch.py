@@ -0,0 +1,294 @@
+"""
+Live tailnet peer table from `tailscale debug watch-ipn`.
+
+One long-running CLI process streams IPN bus notifications. Each network map
+is diffed against the in-memory peer table: only peers that changed produce
+events (peer_added, peer_removed, peer_online, peer_offline), which go to the
+subscribers (the WebSocket hub broadcasts them, see main.lifespan). Devices of
+online peers are touched in the presence store, which writes
+Device.last_active in batches, on every network map and every
+TAILSCALE_WATCH_TOUCH_INTERVAL seconds (default 60).
+
+While the watcher is live, tailscale_state serves its snapshot from this table
+instead of running `tailscale status --json`. The process is restarted with
+backoff when it exits; without it (CLI missing, TAILSCALE_WATCH=false, or an
+event loop without subprocess support) tailscale_state keeps polling.
+
+tools/fake_tailscale.py replays recorded notifications for testing without a
+live tailnet.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from presence import presence_store
+import tailscale_state
+from websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+TAILSCALE_WATCH = os.getenv("TAILSCALE_WATCH", "true").lower() in ("1", "true", "yes")
+TAILSCALE_WATCH_TOUCH_INTERVAL = float(os.getenv("TAILSCALE_WATCH_TOUCH_INTERVAL", "60"))
+WATCH_ARGS = ("debug", "watch-ipn", "--netmap", "--initial")
+RESTART_BACKOFF_MAX = 60.0
+READ_CHUNK = 65536
+
+
+class PeerState:
+    """One node of the network map (self included)"""
+
+    __slots__ = ("key", "name", "hostname", "ips", "online", "last_seen", "is_self")
+
+    def __init__(self, node: dict, is_self: bool = False):
+        self.key = node.get("Key") or str(node.get("ID", ""))
+        self.name = (node.get("Name") or "unknown").rstrip(".")
+        self.hostname = (node.get("Hostinfo") or {}).get("Hostname") or node.get("ComputedName") or "unknown"
+        # Addresses are prefixes ("100.64.0.1/32")
+        self.ips = [address.split("/", 1)[0] for address in node.get("Addresses") or []]
+        self.online = True if is_self else bool(node.get("Online"))
+        self.last_seen = node.get("LastSeen")
+        self.is_self = is_self
+
+    def same_as(self, other: "PeerState") -> bool:
+        return (self.online, self.name, self.hostname, self.ips) == (other.online, other.name, other.hostname, other.ips)
+
+    def to_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "name": self.name,
+            "hostname": self.hostname,
+            "ips": self.ips,
+            "online": self.online,
+            "last_seen": self.last_seen,
+            "is_self": self.is_self,
+        }
+
+
+class PeerTable:
+    """Peers by node key, updated from successive network maps"""
+
+    def __init__(self):
+        self.peers: Dict[str, PeerState] = {}
+        self.self_key: Optional[str] = None
+        # Bumped on every change, so readers can memoize on it
+        self.version = 0
+
+    def apply_netmap(self, netmap: dict) -> List[dict]:
+        """Replace the table with this network map; returns the events for what changed"""
+        nodes: Dict[str, PeerState] = {}
+        self_node = netmap.get("SelfNode")
+        if self_node:
+            peer = PeerState(self_node, is_self=True)
+            nodes[peer.key] = peer
+            self.self_key = peer.key
+        for node in netmap.get("Peers") or []:
+            peer = PeerState(node)
+            nodes[peer.key] = peer
+
+        events = []
+        for key, peer in nodes.items():
+            previous = self.peers.get(key)
+            if previous is None:
+                events.append({"type": "peer_added", "peer": peer.to_dict()})
+            elif previous.online != peer.online:
+                events.append({"type": "peer_online" if peer.online else "peer_offline", "peer": peer.to_dict()})
+            elif not previous.same_as(peer):
+                events.append({"type": "peer_updated", "peer": peer.to_dict()})
+        for key, previous in self.peers.items():
+            if key not in nodes:
+                events.append({"type": "peer_removed", "peer": previous.to_dict()})
+
+        self.peers = nodes
+        if events:
+            self.version += 1
+        return events
+
+    def online_peers(self) -> List[PeerState]:
+        return [peer for peer in self.peers.values() if peer.online]
+
+    def status_document(self) -> dict:
+        """The table in the shape of `tailscale status --json` (Self, Peer by key)"""
+        def entry(peer: PeerState) -> dict:
+            return {
+                "PublicKey": peer.key,
+                "HostName": peer.hostname,
+                "DNSName": f"{peer.name}.",
+                "TailscaleIPs": peer.ips,
+                "Online": peer.online,
+                "LastSeen": peer.last_seen,
+            }
+        self_peer = self.peers.get(self.self_key) if self.self_key else None
+        return {
+            "BackendState": "Running",
+            "Self": entry(self_peer) if self_peer is not None else {},
+            "Peer": {key: entry(peer) for key, peer in self.peers.items() if not peer.is_self},
+        }
+
+
+class NotifyDecoder:
+    """Splits the CLI output (indented JSON objects, back to back) into notifications"""
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[dict]:
+        self._buffer += text
+        notifications = []
+        while True:
+            start = self._buffer.find("{")
+            if start < 0:
+                self._buffer = ""
+                break
+            try:
+                obj, end = self._decoder.raw_decode(self._buffer, start)
+            except ValueError:
+                # Incomplete object: wait for more output
+                self._buffer = self._buffer[start:]
+                break
+            notifications.append(obj)
+            self._buffer = self._buffer[end:]
+        return notifications
+
+
+async def cli_notifications() -> AsyncIterator[dict]:
+    """Notifications from a `tailscale debug watch-ipn` process, until it exits"""
+    proc = await asyncio.create_subprocess_exec(
+        tailscale_state.TAILSCALE_CLI, *WATCH_ARGS,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    decoder = NotifyDecoder()
+    try:
+        while True:
+            chunk = await proc.stdout.read(READ_CHUNK)
+            if not chunk:
+                break
+            for notify in decoder.feed(chunk.decode(errors="replace")):
+                yield notify
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+
+class TailscaleWatcher:
+    """Keeps the peer table current from a stream of IPN notifications"""
+
+    def __init__(self, source: Optional[Callable[[], AsyncIterator[dict]]] = None):
+        # Callable returning a fresh notification stream; restarted when it ends
+        self.source = source or cli_notifications
+        self.table = PeerTable()
+        self.live = False
+        self._subscribers: List[Callable[[dict], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._touch_task: Optional[asyncio.Task] = None
+        self.counters = {"notifications": 0, "netmaps": 0, "events": 0, "restarts": 0, "devices_touched": 0}
+
+    def subscribe(self, callback: Callable[[dict], None]):
+        """Call `callback(event)` for every peer change (on the event loop)"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[dict], None]):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def handle(self, notify: dict) -> List[dict]:
+        """Apply one notification; returns the events it produced"""
+        self.counters["notifications"] += 1
+        netmap = notify.get("NetMap")
+        if not netmap:
+            return []
+        self.counters["netmaps"] += 1
+        events = self.table.apply_netmap(netmap)
+        self.live = True
+        self.touch_online()
+        for event in events:
+            self.counters["events"] += 1
+            for callback in list(self._subscribers):
+                try:
+                    callback(event)
+                except Exception as e:
+                    logger.warning(f"Tailscale peer subscriber failed: {e}")
+        return events
+
+    def touch_online(self):
+        """Mark the registered devices of online peers active (batched to the DB by the presence store)"""
+        now = datetime.utcnow()
+        for peer in self.table.online_peers():
+            for ip in peer.ips:
+                device = presence_store.device_for_ip(ip, tailscale_only=True)
+                if device is not None:
+                    presence_store.touch(device.id, device.user_id, now)
+                    self.counters["devices_touched"] += 1
+                    break
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                async for notify in self.source():
+                    self.handle(notify)
+                    backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except (FileNotFoundError, NotImplementedError) as e:
+                # No CLI, or no subprocess support on this event loop: keep polling status instead
+                logger.info(f"Tailscale watcher not available ({type(e).__name__}: {e}); using status polling")
+                self.live = False
+                return
+            except Exception as e:
+                logger.warning(f"Tailscale watcher failed: {e}")
+            self.live = False
+            self.counters["restarts"] += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+
+    async def _touch_loop(self):
+        # Network maps only arrive on changes; keep long-online devices active
+        while True:
+            await asyncio.sleep(TAILSCALE_WATCH_TOUCH_INTERVAL)
+            if self.live:
+                self.touch_online()
+
+    def start(self):
+        """Start watching (call from app startup)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            self._touch_task = asyncio.create_task(self._touch_loop())
+
+    async def stop(self):
+        """Stop the watcher process and loops (call from app shutdown)"""
+        for task in (self._task, self._touch_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._touch_task = None
+        self.live = False
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "live": self.live,
+            "peers": len(self.table.peers),
+            "online": len(self.table.online_peers()),
+            "version": self.table.version,
+        }
+
+
+def broadcast_peer_event(event: dict):
+    """Subscriber sending peer transitions to every WebSocket client"""
+    peer = event["peer"]
+    # Only the latest pending state per peer matters to a slow client
+    manager.broadcast_text(json.dumps({"type": event["type"], "data": peer}), coalesce_key=f"peer:{peer['key']}")
+
+
+# Process-wide watcher, started in main.lifespan when TAILSCALE_WATCH is on
+tailscale_watcher = TailscaleWatcher()
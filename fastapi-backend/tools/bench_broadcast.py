@@ -0,0 +1,142 @@
+"""
+Benchmark room broadcast delivery latency
+Simulates N WebSocket subscribers (some deliberately slow) and compares the
+old one-at-a-time send_json fan-out with the queued ConnectionManager.
+
+Usage: python tools/bench_broadcast.py [--subscribers 500] [--slow 25] [--messages 400]
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import json
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from websocket_manager import ConnectionManager, WS_QUEUE_MAX
+
+ROOM_ID = 1
+
+
+class FakeWebSocket:
+    """Stand-in for a Starlette WebSocket that records delivery latency"""
+
+    def __init__(self, delay: float, slow: bool):
+        self.delay = delay
+        self.slow = slow
+        self.received = []
+        self.closed_code = None
+
+    async def accept(self):
+        pass
+
+    async def _deliver(self, text: str):
+        await asyncio.sleep(self.delay)
+        # Parsed after the run so measurement does not slow the fan-out
+        self.received.append((time.perf_counter(), text))
+
+    @property
+    def latencies(self):
+        return [at - json.loads(text)["data"]["sent_at"] for at, text in self.received]
+
+    async def send_text(self, text: str):
+        await self._deliver(text)
+
+    async def send_json(self, data: dict):
+        await self._deliver(json.dumps(data))
+
+    async def close(self, code: int = 1000):
+        self.closed_code = code
+
+
+def make_sockets(count: int, slow: int):
+    sockets = []
+    for i in range(count):
+        is_slow = i < slow
+        # Fast clients only yield (socket buffer has room); slow clients take 200ms per frame
+        sockets.append(FakeWebSocket(0.2 if is_slow else 0, is_slow))
+    return sockets
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(label: str, sockets, elapsed: float, dropped: int):
+    fast = [lat for ws in sockets if not ws.slow for lat in ws.latencies]
+    slow = [lat for ws in sockets if ws.slow for lat in ws.latencies]
+    print(f"\n{label}")
+    print("-" * 60)
+    print(f"  wall time            {elapsed:8.2f} s")
+    print(f"  fast deliveries      {len(fast):8d}")
+    print(f"  fast p50 / p99       {percentile(fast, 50) * 1000:8.1f} / {percentile(fast, 99) * 1000:.1f} ms")
+    print(f"  slow deliveries      {len(slow):8d}")
+    print(f"  slow clients dropped {dropped:8d}")
+
+
+async def bench_sequential(args):
+    """The previous fan-out: await send_json on each subscriber in turn"""
+    sockets = make_sockets(args.subscribers, args.slow)
+    start = time.perf_counter()
+    # Every publish waits on every slow client, so only a few messages are sent
+    for seq in range(args.sequential_messages):
+        message = {"type": "new_message", "room_id": ROOM_ID, "data": {"seq": seq, "sent_at": time.perf_counter()}}
+        for ws in sockets:
+            await ws.send_json(message)
+        await asyncio.sleep(args.interval)
+    report("sequential send_json (before)", sockets, time.perf_counter() - start, 0)
+
+
+async def bench_queued(args):
+    manager = ConnectionManager()
+    manager.bind_loop(asyncio.get_running_loop())
+    sockets = make_sockets(args.subscribers, args.slow)
+    for ws in sockets:
+        await manager.connect(ws, None)
+        manager.subscribe(ws, ROOM_ID)
+
+    start = time.perf_counter()
+    for seq in range(args.messages):
+        manager.emit(ROOM_ID, "new_message", {"seq": seq, "sent_at": time.perf_counter()})
+        await asyncio.sleep(args.interval)
+
+    # Let the fast writers drain
+    deadline = time.perf_counter() + 5
+    while time.perf_counter() < deadline:
+        if all(len(ws.received) >= args.messages for ws in sockets if not ws.slow):
+            break
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    for ws in list(manager.active_connections):
+        manager.disconnect(ws)
+    report(f"queued fan-out (after, queue={WS_QUEUE_MAX})", sockets, elapsed, manager.dropped_slow_clients)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Room broadcast latency benchmark")
+    parser.add_argument("--subscribers", type=int, default=500)
+    parser.add_argument("--slow", type=int, default=25, help="number of deliberately slow subscribers")
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--sequential-messages", type=int, default=3, help="messages for the (slow) sequential baseline")
+    parser.add_argument("--interval", type=float, default=0.01, help="seconds between publishes")
+    parser.add_argument("--skip-sequential", action="store_true", help="only run the queued fan-out")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"{args.subscribers} subscribers ({args.slow} slow), {args.messages} messages")
+    print("=" * 60)
+    if not args.skip_sequential:
+        asyncio.run(bench_sequential(args))
+    asyncio.run(bench_queued(args))
+
+
+if __name__ == "__main__":
+    main()
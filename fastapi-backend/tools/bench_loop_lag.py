@@ -0,0 +1,174 @@
+"""
+Benchmark event-loop lag under database load
+Seeds a scratch SQLite database, then drives concurrent requests at two
+versions of the same async endpoint while a ticker measures how late the
+event loop wakes up:
+  before - query on the sync Session (get_db), blocking the event loop
+  after  - query on the AsyncSession (get_async_db), awaited off the loop
+
+Keep --concurrency below DB_POOL_SIZE + DB_MAX_OVERFLOW: past it the "before"
+handlers wait for a pooled connection on the event loop thread itself, and
+the requests that would return one can never run (a deadlock until
+DB_POOL_TIMEOUT).
+
+Usage: python tools/bench_loop_lag.py [--messages 200000] [--requests 300] [--concurrency 16] [--query scan]
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import tempfile
+import time
+
+# Always run against a scratch database, never the real one
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="loop_lag_"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import Base, engine, async_engine, get_db, get_async_db
+from models import Message, Thread, User
+
+ROOM_ID = 1
+
+QUERIES = {
+    # A slow query: unindexed full scan of the message text
+    "scan": select(func.count(Message.id)).where(Message.text.like("%needle%")),
+    # The room history page (fast, index range scan)
+    "history": (
+        select(Message.id, Message.sender, Message.text, Message.timestamp)
+        .where(Message.thread_id == ROOM_ID)
+        .order_by(Message.id.desc())
+        .limit(50)
+    ),
+}
+
+
+def seed(messages: int):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"name": "Chance", "handle": "@chance", "email": "chance@example.com", "hashed_password": "x"}])
+        conn.execute(insert(Thread), [{"id": ROOM_ID, "name": "General", "type": "room"}])
+        batch = []
+        for i in range(messages):
+            batch.append({"thread_id": ROOM_ID, "user_id": 1, "sender": "CC", "text": f"message {i} lorem ipsum dolor sit amet"})
+            if len(batch) == 10000:
+                conn.execute(insert(Message), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Message), batch)
+
+
+def build_app(statement) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/before")
+    async def before(db: Session = Depends(get_db)):
+        return {"rows": len(db.execute(statement).all())}
+
+    @app.get("/after")
+    async def after(db: AsyncSession = Depends(get_async_db)):
+        return {"rows": len((await db.execute(statement)).all())}
+
+    return app
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def measure(client: httpx.AsyncClient, path: str, args) -> dict:
+    lags = []
+    latencies = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        # How late does a 10 ms sleep wake up? That delay hits every WebSocket and stream too.
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(args.tick)
+            lags.append((time.perf_counter() - start - args.tick) * 1000)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    # Warm the pools and page cache
+    await asyncio.gather(*(one() for _ in range(args.concurrency)))
+    latencies.clear()
+
+    tick_task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick_task
+
+    return {
+        "req_per_sec": args.requests / elapsed,
+        "lat_p50": percentile(latencies, 0.50),
+        "lat_p99": percentile(latencies, 0.99),
+        "lag_p50": percentile(lags, 0.50),
+        "lag_p99": percentile(lags, 0.99),
+        "lag_max": max(lags) if lags else 0.0,
+        "ticks": len(lags),
+    }
+
+
+def report(label: str, result: dict):
+    print(f"\n{label}")
+    print(f"  throughput: {result['req_per_sec']:.0f} req/s")
+    print(f"  request latency: p50={result['lat_p50']:.1f} ms  p99={result['lat_p99']:.1f} ms")
+    print(
+        f"  event-loop lag: p50={result['lag_p50']:.1f} ms  p99={result['lag_p99']:.1f} ms  "
+        f"max={result['lag_max']:.1f} ms  ({result['ticks']} ticks)"
+    )
+
+
+async def run(args):
+    app = build_app(QUERIES[args.query])
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        report("Before: sync Session inside async def", await measure(client, "/before", args))
+        report("After: AsyncSession (aiosqlite)", await measure(client, "/after", args))
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event-loop lag under database load")
+    parser.add_argument("--messages", type=int, default=200000, help="messages to seed")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--query", choices=sorted(QUERIES), default="scan")
+    parser.add_argument("--tick", type=float, default=0.01, help="ticker interval in seconds")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Seeding {args.messages} messages into {DB_FILE}...")
+    started = time.perf_counter()
+    seed(args.messages)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+    print(f"{args.requests} requests, concurrency {args.concurrency}, query '{args.query}'")
+    print("=" * 60)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark full-text message search
+Seeds a scratch SQLite database (schema via the alembic chain, so the FTS5
+table and its triggers are the real ones) with a synthetic corpus, then times
+message_search.search_messages for queries of different selectivity, as a
+member of a fraction of the rooms. Target: p95 under 50 ms per query.
+
+Words follow a Zipf distribution over a generated vocabulary, so there are
+rare, mid-frequency and very common terms, like real chat text.
+
+Usage: python tools/bench_search.py [--messages 1000000] [--rooms 100] [--member-of 20] [--runs 30]
+"""
+
+import sys
+import os
+import argparse
+import itertools
+import random
+import tempfile
+import time
+
+# Always run against a scratch database, never the real one
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="search_bench_"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+
+from database import SessionLocal, engine
+from message_search import optimize_index, search_messages
+from migrations import upgrade_to_head
+from models import Message, RoomMember, Thread, User
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "de", "ba", "po", "ze", "fu", "gi", "ha", "ju"]
+USER_ID = 1
+
+
+def make_vocabulary(size: int, rng: random.Random):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words, key=lambda _: rng.random())
+
+
+def seed(args, rng: random.Random):
+    upgrade_to_head(configure_logger=False)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    cum_weights = list(itertools.accumulate(1 / (rank ** 1.07) for rank in range(1, len(vocabulary) + 1)))
+
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": USER_ID, "name": "Chance", "handle": "@chance", "email": "chance@example.com", "hashed_password": "x"}])
+        conn.execute(insert(Thread), [{"id": room, "name": f"Room {room}", "type": "room"} for room in range(1, args.rooms + 1)])
+        conn.execute(
+            insert(RoomMember),
+            [{"thread_id": room, "user_id": USER_ID, "role": "member"} for room in range(1, args.member_of + 1)],
+        )
+        batch = []
+        for _ in range(args.messages):
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(5, 25))
+            batch.append({"thread_id": rng.randint(1, args.rooms), "user_id": USER_ID, "sender": "CC", "text": " ".join(words)})
+            if len(batch) == 10000:
+                conn.execute(insert(Message), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Message), batch)
+    optimize_index()
+    return vocabulary
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def build_queries(vocabulary, rng: random.Random) -> dict:
+    """
+    Query sets by selectivity (vocabulary is in Zipf rank order), as
+    {label: (queries, prefix)}; prefix sets are typed search-as-you-type
+    """
+    common = vocabulary[:10]
+    mid = vocabulary[100:1000]
+    rare = vocabulary[-5000:]
+    return {
+        "rare word": ([rng.choice(rare) for _ in range(50)], False),
+        "mid-frequency word": ([rng.choice(mid) for _ in range(50)], False),
+        "common word": (list(common), False),
+        "two words (mid + common)": ([f"{rng.choice(mid)} {rng.choice(common)}" for _ in range(50)], False),
+        "prefix (3 chars)": ([rng.choice(mid)[:3] for _ in range(50)], True),
+        "typing a rare word": ([rng.choice(rare)[:5] for _ in range(50)], True),
+    }
+
+
+def time_queries(queries, args, room_id=None, prefix=False):
+    timings = []
+    hits = []
+    with SessionLocal() as db:
+        for query in itertools.islice(itertools.cycle(queries), args.runs):
+            started = time.perf_counter()
+            results, _ = search_messages(db, USER_ID, query, room_id=room_id, limit=args.limit, prefix=prefix)
+            timings.append((time.perf_counter() - started) * 1000)
+            hits.append(len(results))
+    return timings, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text message search benchmark")
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--member-of", type=int, default=20, help="rooms the searching user belongs to")
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--runs", type=int, default=30, help="queries timed per query set")
+    parser.add_argument("--limit", type=int, default=20, help="results per page")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print("=" * 60)
+    print(f"Seeding {args.messages} messages into {DB_FILE}...")
+    started = time.perf_counter()
+    vocabulary = seed(args, rng)
+    print(f"Seeded and indexed in {time.perf_counter() - started:.1f}s "
+          f"({os.path.getsize(DB_FILE) / 1e6:.0f} MB)")
+    print(f"Member of {args.member_of}/{args.rooms} rooms, page size {args.limit}")
+    print("=" * 60)
+
+    queries = build_queries(vocabulary, rng)
+    with SessionLocal() as db:
+        search_messages(db, USER_ID, vocabulary[0])  # warm the page cache
+
+    for label, (query_set, prefix) in queries.items():
+        for scope, room_id in (("all my rooms", None), ("one room", 1)):
+            timings, hits = time_queries(query_set, args, room_id=room_id, prefix=prefix)
+            print(
+                f"{label:<26} {scope:<13} p50={percentile(timings, 0.50):6.1f} ms  "
+                f"p95={percentile(timings, 0.95):6.1f} ms  max={max(timings):6.1f} ms  "
+                f"avg hits={sum(hits) / len(hits):.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
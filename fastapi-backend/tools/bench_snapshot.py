@@ -0,0 +1,142 @@
+"""
+Benchmark the network snapshot parser
+Builds a synthetic `tailscale status --json` document with N peers (a few
+hubs, some funnel ingress nodes, a third offline) and times three cases:
+the previous inline parser, tailscale_state.SnapshotParser on a status where
+a peer changed, and on a repeated status where only the traffic counters
+moved (the common case between two polls).
+
+Usage: python tools/bench_snapshot.py [--peers 1000] [--runs 200]
+"""
+
+import sys
+import os
+import argparse
+import copy
+import random
+import time
+from datetime import datetime
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tailscale_state import SnapshotParser
+
+
+def make_status(peers: int, rng: random.Random) -> dict:
+    def node(index: int, name: str, host: str, online: bool) -> dict:
+        return {
+            "ID": f"n{index}CNTRL",
+            "PublicKey": f"nodekey:{index:064x}",
+            "HostName": host,
+            "DNSName": f"{name}.tail1234.ts.net.",
+            "OS": "linux",
+            "TailscaleIPs": [f"100.64.{index // 256}.{index % 256}", f"fd7a:115c:a1e0::{index:x}"],
+            "Online": online,
+            "RxBytes": rng.randint(0, 10 ** 9),
+            "TxBytes": rng.randint(0, 10 ** 9),
+            "LastHandshake": "2024-05-01T12:00:00Z",
+            "LastSeen": "2024-05-01T12:00:00Z",
+        }
+
+    status = {"BackendState": "Running", "Self": node(0, "home-hub", "home-hub", True), "Peer": {}}
+    for index in range(1, peers + 1):
+        if index == 1:
+            name = host = "home-hub-1"
+        elif index % 50 == 0:
+            name, host = f"ingress-{index}", "funnel-ingress-node"
+        else:
+            name = host = f"device-{index}"
+        peer = node(index, name, host, rng.random() > 0.33)
+        status["Peer"][peer["PublicKey"]] = peer
+    return status
+
+
+def legacy_snapshot(status_data: dict) -> dict:
+    """The previous parser: per-device .lower() substring checks and fresh dicts every call"""
+    self_info = status_data.get("Self", {})
+    devices = []
+    primary_hub_online = dev_hub_online = False
+    self_dnsname = self_info.get("DNSName", "unknown").rstrip(".")
+    self_role = "client"
+    dns_lower = self_dnsname.lower()
+    if "home-hub-1" in dns_lower:
+        self_role = "dev-hub"
+        dev_hub_online = True
+    elif "home-hub" in dns_lower:
+        self_role = "primary-hub"
+        primary_hub_online = True
+    devices.append({"id": self_info.get("PublicKey", "self")[:16], "name": self_dnsname,
+                    "ips": self_info.get("TailscaleIPs", []), "online": True, "role": self_role, "is_self": True})
+    for peer_key, peer_data in status_data.get("Peer", {}).items():
+        peer_dnsname = peer_data.get("DNSName", "unknown").rstrip(".")
+        peer_online = peer_data.get("Online", False)
+        if "funnel-ingress-node" in peer_data.get("HostName", "unknown").lower():
+            continue
+        peer_role = "client"
+        dns_lower = peer_dnsname.lower()
+        if "home-hub-1" in dns_lower:
+            peer_role = "dev-hub"
+            dev_hub_online = dev_hub_online or peer_online
+        elif "home-hub" in dns_lower:
+            peer_role = "primary-hub"
+            primary_hub_online = primary_hub_online or peer_online
+        devices.append({"id": peer_key[:16], "name": peer_dnsname, "ips": peer_data.get("TailscaleIPs", []),
+                        "online": peer_online, "role": peer_role, "is_self": False})
+    online_devices = [d for d in devices if d["online"]]
+    return {"devices": devices, "online_count": len(online_devices), "total_count": len(devices),
+            "primary_hub_online": primary_hub_online, "dev_hub_online": dev_hub_online,
+            "timestamp": datetime.now().isoformat(), "status": "ok"}
+
+
+def time_runs(label: str, runs: int, parse, documents):
+    timings = []
+    for run in range(runs):
+        document = documents[run % len(documents)]
+        started = time.perf_counter()
+        parse(document)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(f"  {label:<28} p50 {timings[len(timings) // 2]:7.3f} ms   p95 {timings[int(len(timings) * 0.95)]:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Network snapshot parser benchmark")
+    parser.add_argument("--peers", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    status = make_status(args.peers, rng)
+    # Same devices, new traffic counters: what two polls of an idle tailnet look like
+    polled = []
+    for _ in range(4):
+        document = copy.deepcopy(status)
+        for peer in document["Peer"].values():
+            peer["RxBytes"] += rng.randint(0, 10 ** 6)
+        polled.append(document)
+    # One peer flips online/offline between consecutive documents
+    flipping = []
+    for index in range(4):
+        document = copy.deepcopy(status)
+        peers = list(document["Peer"].values())
+        peer = peers[(10 + index) % len(peers)]
+        peer["Online"] = not peer["Online"]
+        flipping.append(document)
+
+    snapshot_parser = SnapshotParser()
+    legacy, compiled = legacy_snapshot(status), snapshot_parser.snapshot(status)
+    for key in ("devices", "online_count", "total_count", "primary_hub_online", "dev_hub_online"):
+        assert legacy[key] == compiled[key], f"parsers disagree on {key}"
+
+    print("=" * 60)
+    print(f"{args.peers} peers, {args.runs} runs")
+    print("=" * 60)
+    time_runs("legacy parser", args.runs, legacy_snapshot, polled)
+    time_runs("SnapshotParser, peer changed", args.runs, snapshot_parser.snapshot, flipping)
+    time_runs("SnapshotParser, unchanged", args.runs, snapshot_parser.snapshot, polled)
+    print(f"  parser counters              {snapshot_parser.counters}")
+
+
+if __name__ == "__main__":
+    main()
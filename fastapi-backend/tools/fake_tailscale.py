@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Fake tailscale CLI replaying recorded IPN bus notifications
+Stands in for the real binary so the watcher (tailscale_watch.py) and the
+status cache can be exercised without a live tailnet.
+
+    debug watch-ipn ...   prints the recording (indented JSON, like the real
+                          CLI) --delay seconds apart, then stays open
+    status --json         the status document after the whole recording
+
+The built-in RECORDING has four peers; phone goes offline, a laptop joins and
+phone comes back. Replay real output instead with --recording FILE or
+FAKE_TAILSCALE_RECORDING=FILE (captured with `tailscale debug watch-ipn
+--netmap --initial > FILE`).
+
+Usage: TAILSCALE_CLI=tools/fake_tailscale.py uvicorn main:app
+In-process: TailscaleWatcher(source=lambda: replay(delay=0))
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import json
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _node(node_id: int, name: str, ip: str, online: bool) -> dict:
+    return {
+        "ID": node_id,
+        "StableID": f"n{node_id}CNTRL",
+        "Name": f"{name}.tail1234.ts.net.",
+        "Key": f"nodekey:{node_id:064x}",
+        "Addresses": [f"{ip}/32"],
+        "Hostinfo": {"Hostname": name, "OS": "linux"},
+        "Online": online,
+        "LastSeen": "2024-05-01T12:00:00Z",
+    }
+
+
+def _netmap(peers: list) -> dict:
+    return {"NetMap": {"SelfNode": _node(1, "home-hub", "100.64.0.1", True), "Peers": peers}}
+
+
+_HUB_1 = _node(2, "home-hub-1", "100.64.0.2", True)
+_PHONE = _node(3, "phone", "100.64.0.3", True)
+_FUNNEL = _node(4, "funnel-ingress-node", "100.64.0.4", True)
+_LAPTOP = _node(5, "laptop", "100.64.0.5", True)
+
+# Notifications in the order the IPN bus sent them
+RECORDING = [
+    {"Version": "1.66.4", "State": 6},
+    _netmap([_HUB_1, _PHONE, _FUNNEL]),
+    _netmap([_HUB_1, {**_PHONE, "Online": False}, _FUNNEL]),
+    {"Engine": {"RBytes": 1024, "WBytes": 2048}},
+    _netmap([_HUB_1, {**_PHONE, "Online": False}, _FUNNEL, _LAPTOP]),
+    _netmap([_HUB_1, _PHONE, _FUNNEL, _LAPTOP]),
+]
+
+
+def load_recording(path: str = None) -> list:
+    """Notifications from a watch-ipn capture (concatenated JSON objects), or RECORDING"""
+    path = path or os.getenv("FAKE_TAILSCALE_RECORDING")
+    if not path:
+        return RECORDING
+    from tailscale_watch import NotifyDecoder
+    with open(path) as f:
+        return NotifyDecoder().feed(f.read())
+
+
+async def replay(recording: list = None, delay: float = 0.0):
+    """Async source for TailscaleWatcher: yields the recording, then ends"""
+    for notify in recording if recording is not None else load_recording():
+        yield notify
+        await asyncio.sleep(delay)
+
+
+def status_document(recording: list) -> dict:
+    """`tailscale status --json` as of the end of the recording"""
+    from tailscale_watch import PeerTable
+    table = PeerTable()
+    for notify in recording:
+        if notify.get("NetMap"):
+            table.apply_netmap(notify["NetMap"])
+    return table.status_document()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake tailscale CLI")
+    parser.add_argument("--recording", help="watch-ipn capture to replay")
+    parser.add_argument("--delay", type=float, default=float(os.getenv("FAKE_TAILSCALE_DELAY", "1")),
+                        help="seconds between notifications")
+    parser.add_argument("command", nargs="*")
+    args, _unknown = parser.parse_known_args()
+    recording = load_recording(args.recording)
+
+    if args.command[:2] == ["debug", "watch-ipn"]:
+        for notify in recording:
+            print(json.dumps(notify, indent="\t"), flush=True)
+            time.sleep(args.delay)
+        # The real command runs until interrupted
+        while True:
+            time.sleep(3600)
+    elif args.command[:1] == ["status"]:
+        print(json.dumps(status_document(recording), indent="\t"))
+    else:
+        print(f"fake tailscale: unsupported command {' '.join(args.command)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
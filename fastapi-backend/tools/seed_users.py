@@ -10,8 +10,9 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine
-from models import User, Base
+from database import SessionLocal
+from migrations import upgrade_to_head
+from models import User
 from auth_utils import get_password_hash
 
 
@@ -19,7 +20,7 @@ def seed_users():
     """Seed test users into the database"""
     
     # Create tables if they don't exist
-    Base.metadata.create_all(bind=engine)
+    upgrade_to_head()
     
     db: Session = SessionLocal()
     
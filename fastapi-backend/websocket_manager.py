@@ -1,37 +1,274 @@
 """
 WebSocket connection manager for real-time updates
+
+Per-room pub/sub hub: clients connect to /ws, subscribe to the rooms they
+are members of, and receive new messages, membership changes and room
+setting changes as they happen instead of polling. Hub-wide events (presence
+and provider status changes) go to every connection and carry no room_id.
+
+Each payload is serialized once per publish. Every connection has a bounded
+outbound queue drained by its own writer task, so a slow client never delays
+delivery to the others: when its queue is full it is disconnected (the
+client reconnects and reloads history), and repeated room_updated events
+for the same room are coalesced while still queued.
 """
 
+import asyncio
+import json
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
 from fastapi import WebSocket
-from typing import List
+
+# Outbound messages buffered per connection before it is considered too slow
+WS_QUEUE_MAX = int(os.getenv("WS_QUEUE_MAX", "256"))
+# A single send taking longer than this drops the connection
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+# Close code sent to clients that fell too far behind (1013 = try again later)
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+# Event types where only the latest pending copy per room matters
+COALESCED_EVENTS = {"room_updated"}
+# Hub-wide event types where only the latest pending copy matters
+COALESCED_GLOBAL_EVENTS = {"presence_changed"}
+
+
+def message_payload(message) -> dict:
+    """JSON-safe dict for a Message row (same fields as rooms.MessageOut)"""
+    return {
+        "id": message.id,
+        "thread_id": message.thread_id,
+        "user_id": message.user_id,
+        "sender": message.sender,
+        "text": message.text,
+        "timestamp": message.timestamp.isoformat() if message.timestamp else None,
+    }
+
+
+def room_payload(room) -> dict:
+    """JSON-safe dict for a Thread row (same fields as rooms.RoomOut)"""
+    def iso(value):
+        return value.isoformat() if value else None
+
+    return {
+        "id": room.id,
+        "name": room.name,
+        "type": room.type,
+        "created_at": iso(room.created_at),
+        "updated_at": iso(room.updated_at),
+        "ai_enabled": room.ai_enabled,
+        "notifications_enabled": room.notifications_enabled,
+        "self_destruct_at": iso(room.self_destruct_at),
+        "total_messages": room.total_messages,
+        "total_ai_requests": room.total_ai_requests,
+        "last_activity_at": iso(room.last_activity_at),
+    }
+
+
+class _Subscriber:
+    """One connection: its rooms and its bounded outbound queue"""
+
+    __slots__ = ("websocket", "user_id", "rooms", "pending", "wakeup", "task")
+
+    def __init__(self, websocket: WebSocket, user_id: Optional[int]):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.rooms: Set[int] = set()
+        # (coalesce_key or None, serialized text)
+        self.pending: Deque[Tuple[Optional[str], str]] = deque()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def offer(self, text: str, coalesce_key: Optional[str] = None) -> bool:
+        """Queue a frame; False if the queue is full (client too slow)"""
+        if coalesce_key is not None:
+            for i, (key, _) in enumerate(self.pending):
+                if key == coalesce_key:
+                    self.pending[i] = (coalesce_key, text)
+                    return True
+        if len(self.pending) >= WS_QUEUE_MAX:
+            return False
+        self.pending.append((coalesce_key, text))
+        self.wakeup.set()
+        return True
 
 
 class ConnectionManager:
-    """Manages WebSocket connections"""
+    """Manages WebSocket connections and their room subscriptions"""
 
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.subscribers: Dict[WebSocket, _Subscriber] = {}
+        self.room_subscribers: Dict[int, Set[WebSocket]] = {}
+        self.dropped_slow_clients = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.subscribers)
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """Remember the server event loop so sync route handlers can publish"""
+        self._loop = loop
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, user_id: Optional[int] = None):
         """Accept and store new WebSocket connection"""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        subscriber = _Subscriber(websocket, user_id)
+        subscriber.task = asyncio.create_task(self._writer(subscriber))
+        self.subscribers[websocket] = subscriber
 
     def disconnect(self, websocket: WebSocket):
-        """Remove WebSocket connection"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        """Remove WebSocket connection and all of its subscriptions"""
+        subscriber = self.subscribers.pop(websocket, None)
+        if subscriber is None:
+            return
+        for room_id in subscriber.rooms:
+            sockets = self.room_subscribers.get(room_id)
+            if sockets is not None:
+                sockets.discard(websocket)
+                if not sockets:
+                    del self.room_subscribers[room_id]
+        if subscriber.task is not None and subscriber.task is not asyncio.current_task():
+            subscriber.task.cancel()
+
+    def subscribe(self, websocket: WebSocket, room_id: int):
+        """Start delivering events for a room to this connection"""
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is None:
+            return
+        subscriber.rooms.add(room_id)
+        self.room_subscribers.setdefault(room_id, set()).add(websocket)
+
+    def unsubscribe(self, websocket: WebSocket, room_id: int):
+        """Stop delivering events for a room to this connection"""
+        sockets = self.room_subscribers.get(room_id)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self.room_subscribers[room_id]
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is not None:
+            subscriber.rooms.discard(room_id)
+
+    def has_subscribers(self, room_id: int) -> bool:
+        return bool(self.room_subscribers.get(room_id))
 
     async def send_personal_message(self, message: dict, websocket: WebSocket):
-        """Send message to specific WebSocket"""
-        await websocket.send_json(message)
+        """Send message to specific WebSocket (queued behind any pending events)"""
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is not None:
+            self._offer(subscriber, json.dumps(message))
+
+    def broadcast_text(self, text: str, coalesce_key: Optional[str] = None) -> int:
+        """Queue an already-serialized frame for every connection"""
+        return self._fan_out(list(self.subscribers.values()), text, coalesce_key)
+
+    def publish_text(self, room_id: int, text: str, coalesce_key: Optional[str] = None) -> int:
+        """Queue an already-serialized frame for every subscriber of a room"""
+        sockets = self.room_subscribers.get(room_id)
+        if not sockets:
+            return 0
+        targets = [self.subscribers[ws] for ws in sockets if ws in self.subscribers]
+        return self._fan_out(targets, text, coalesce_key)
 
     async def broadcast(self, message: dict):
         """Send message to all connected WebSockets"""
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                print(f"Error broadcasting to connection: {e}")
-                # Remove dead connections
-                self.disconnect(connection)
+        self.broadcast_text(json.dumps(message))
+
+    async def publish(self, room_id: int, message: dict):
+        """Send message to every connection subscribed to a room"""
+        self.publish_text(room_id, json.dumps(message))
+
+    def emit(self, room_id: int, event_type: str, data: dict):
+        """
+        Fire-and-forget publish of a room event. Safe to call from sync route
+        handlers (threadpool) and from code running on the event loop.
+        No-op when nobody is subscribed to the room.
+        """
+        if self._loop is None or not self.has_subscribers(room_id):
+            return
+        # Serialize once, in the caller's thread; fan-out happens on the loop
+        text = json.dumps({"type": event_type, "room_id": room_id, "data": data})
+        coalesce_key = f"{event_type}:{room_id}" if event_type in COALESCED_EVENTS else None
+        self._call_on_loop(self.publish_text, room_id, text, coalesce_key)
+
+    def emit_global(self, event_type: str, data: dict, coalesce_key: Optional[str] = None):
+        """
+        Fire-and-forget broadcast of a hub-wide event to every connection.
+        Safe to call from any thread; no-op before startup or with no clients.
+        """
+        if self._loop is None or not self.subscribers:
+            return
+        text = json.dumps({"type": event_type, "data": data})
+        if coalesce_key is None and event_type in COALESCED_GLOBAL_EVENTS:
+            coalesce_key = event_type
+        self._call_on_loop(self.broadcast_text, text, coalesce_key)
+
+    def remove_member(self, room_id: int, user_id: int):
+        """Publish member_removed for a room, then stop delivering it to that user's connections"""
+        self.emit(room_id, "member_removed", {"room_id": room_id, "user_id": user_id})
+        if self._loop is not None:
+            # Queued after the event, so the removed user's clients see it too
+            self._call_on_loop(self._unsubscribe_user, room_id, user_id)
+
+    def _unsubscribe_user(self, room_id: int, user_id: int):
+        for websocket, subscriber in list(self.subscribers.items()):
+            if subscriber.user_id == user_id and room_id in subscriber.rooms:
+                self.unsubscribe(websocket, room_id)
+
+    def _call_on_loop(self, callback, *args):
+        # Directly when already on the server loop, otherwise handed over thread-safely
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    def _fan_out(self, targets: List[_Subscriber], text: str, coalesce_key: Optional[str]) -> int:
+        delivered = 0
+        for subscriber in targets:
+            if self._offer(subscriber, text, coalesce_key):
+                delivered += 1
+        return delivered
+
+    def _offer(self, subscriber: _Subscriber, text: str, coalesce_key: Optional[str] = None) -> bool:
+        if subscriber.offer(text, coalesce_key):
+            return True
+        # Too far behind: drop it rather than buffer without bound
+        print(f"Dropping slow WebSocket client (user {subscriber.user_id}): {len(subscriber.pending)} frames queued")
+        self.dropped_slow_clients += 1
+        self.disconnect(subscriber.websocket)
+        asyncio.ensure_future(self._close(subscriber.websocket, SLOW_CLIENT_CLOSE_CODE))
+        return False
+
+    async def _writer(self, subscriber: _Subscriber):
+        """Drain one connection's queue; runs as its own task"""
+        try:
+            while True:
+                await subscriber.wakeup.wait()
+                while subscriber.pending:
+                    _, text = subscriber.pending.popleft()
+                    await asyncio.wait_for(subscriber.websocket.send_text(text), WS_SEND_TIMEOUT)
+                subscriber.wakeup.clear()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error sending to WebSocket connection: {e}")
+            # Remove dead connections
+            self.disconnect(subscriber.websocket)
+            await self._close(subscriber.websocket, 1011)
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+
+# Process-wide hub shared by the /ws endpoint and the routers that publish events
+manager = ConnectionManager()